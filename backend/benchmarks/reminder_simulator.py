@@ -0,0 +1,424 @@
+"""
+Reminder workload simulator.
+
+Generates synthetic users with random deadlines and push subscriptions, mocks
+the push service with configurable latency and failures, then fast-forwards a
+virtual clock through the scheduler's reminder ticks and reports per-tick
+latency, database operations, sends, duplicates and misses.
+
+The application code runs unchanged: SchedulerService's reminder job and
+outbox dispatcher are invoked once per virtual tick, against either a local
+MongoDB (--mongo-url) or an in-memory stand-in (mongomock-motor, the default).
+
+Run from the backend directory:
+    pip install mongomock-motor   # only for the in-memory stand-in
+    python -m benchmarks.reminder_simulator --users 1000 --push-latency-ms 5
+    python -m benchmarks.reminder_simulator --mongo-url mongodb://localhost:27017/los_sim --users 100000
+
+The in-memory stand-in scans collections on every query and evaluates
+$lookup stages document by document, so it suits a few thousand users; use a
+real MongoDB for 100k-user runs.
+
+All deadlines are entered in the app's fixed reminder time zone (UTC+8); the
+tree has no per-user time zone, so spread across the day comes from the
+random deadlines alone.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017/los_sim")
+
+import database
+import services.delivery_ledger_service as delivery_ledger_module
+import services.notification_service as notification_module
+import services.outbox_service as outbox_module
+import services.reminder_service as reminder_module
+from services.delivery_ledger_service import DeliveryLedgerService
+from services.notification_service import NotificationService
+from services.outbox_service import OutboxService
+from services.reminder_service import LOCAL_UTC_OFFSET, ReminderService
+from services.scheduler_service import SchedulerService
+from services.vapid_service import vapid_cache
+from benchmarks.vapid_signing import make_private_key
+
+PUSH_ORIGINS = [
+    "https://fcm.googleapis.com/fcm/send",
+    "https://updates.push.services.mozilla.com/wpush/v2",
+    "https://web.push.apple.com",
+]
+
+# Modules whose datetime.utcnow() should follow the virtual clock
+CLOCKED_MODULES = [reminder_module, outbox_module, delivery_ledger_module, notification_module]
+
+DB_OPERATIONS = {
+    "find", "find_one", "find_one_and_update", "insert_one", "insert_many", "update_one",
+    "update_many", "delete_one", "delete_many", "count_documents", "aggregate", "bulk_write",
+}
+
+
+class VirtualClock:
+    def __init__(self, start: datetime):
+        self.now = start
+
+    def advance(self, delta: timedelta):
+        self.now += delta
+
+
+def make_clocked_datetime(clock: VirtualClock):
+    class ClockedDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return clock.now
+
+    return ClockedDatetime
+
+
+class ListCursor:
+    """Async cursor over an already computed result, for the in-memory stand-in"""
+
+    def __init__(self, docs: list):
+        self._docs = iter(docs)
+        self._all = docs
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return list(self._all)
+
+
+def _substitute(value, variables: dict):
+    if isinstance(value, str) and value.startswith("$$") and value[2:] in variables:
+        return variables[value[2:]]
+    if isinstance(value, dict):
+        return {key: _substitute(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, variables) for item in value]
+    return value
+
+
+def emulate_let_lookups(collection, pipeline: list) -> list:
+    """
+    mongomock cannot run $lookup stages with let/pipeline. Run the stages
+    before such a lookup normally, evaluate the lookup per document, then
+    continue with the rest of the pipeline on the intermediate results.
+    """
+    from mongomock.aggregate import _Parser
+
+    split = next((index for index, stage in enumerate(pipeline)
+                  if "$lookup" in stage and "let" in stage["$lookup"]), None)
+    if split is None:
+        return list(collection.aggregate(pipeline))
+
+    docs = list(collection.aggregate(pipeline[:split]))
+    lookup = pipeline[split]["$lookup"]
+    foreign = collection.database[lookup["from"]]
+    for doc in docs:
+        variables = {name: _Parser(doc).parse(expression) for name, expression in lookup["let"].items()}
+        doc[lookup["as"]] = list(foreign.aggregate(_substitute(lookup["pipeline"], variables)))
+
+    scratch = collection.database[f"_simulator_{uuid.uuid4().hex}"]
+    try:
+        if docs:
+            scratch.insert_many(docs)
+        return emulate_let_lookups(scratch, pipeline[split + 1:])
+    finally:
+        scratch.drop()
+
+
+class CountingCollection:
+    """Wraps a Motor collection and counts the operations issued through it"""
+
+    def __init__(self, collection, counter: Counter, in_memory: bool):
+        self._collection = collection
+        self._counter = counter
+        self._in_memory = in_memory
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name == "aggregate" and self._in_memory:
+            sync_collection = self._collection.database.delegate[self._collection.name]
+            attr = lambda pipeline, **kwargs: ListCursor(emulate_let_lookups(sync_collection, pipeline))
+        if name in DB_OPERATIONS and callable(attr):
+            def counted(*args, **kwargs):
+                self._counter[name] += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class CountingDatabase:
+    def __init__(self, db, in_memory: bool):
+        self._db = db
+        self._in_memory = in_memory
+        self.counter: Counter = Counter()
+
+    def __getattr__(self, name):
+        return CountingCollection(getattr(self._db, name), self.counter, self._in_memory)
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self.counter, self._in_memory)
+
+
+class MockPushService:
+    """Stands in for pywebpush.webpush with latency and failure injection"""
+
+    class Response:
+        def __init__(self, status_code: int, headers: dict = None):
+            self.status_code = status_code
+            self.headers = headers or {}
+            self.reason = ""
+            self.text = ""
+
+    def __init__(self, clock: VirtualClock, latency_ms: float, failure_rate: float,
+                 throttle_rate: float, gone_rate: float, rng: random.Random):
+        self.clock = clock
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.gone_rate = gone_rate
+        self.rng = rng
+        self.attempts = 0
+        self.deliveries = []  # (endpoint, tag, utc instant)
+
+    def __call__(self, subscription_info, data=None, **kwargs):
+        # Runs in a worker thread, like the real blocking HTTP call
+        self.attempts += 1
+        if self.latency:
+            time.sleep(self.latency)
+        roll = self.rng.random()
+        if roll < self.gone_rate:
+            status_code, headers = 410, {}
+        elif roll < self.gone_rate + self.throttle_rate:
+            status_code, headers = 429, {"Retry-After": "60"}
+        elif roll < self.gone_rate + self.throttle_rate + self.failure_rate:
+            status_code, headers = 503, {}
+        else:
+            self.deliveries.append((subscription_info["endpoint"], json.loads(data)["tag"], self.clock.now))
+            return self.Response(201)
+        raise notification_module.WebPushException(
+            f"Push failed: {status_code}", response=self.Response(status_code, headers)
+        )
+
+
+def random_deadline(rng: random.Random, afternoon: bool) -> str:
+    hour = rng.randrange(12, 24) if afternoon else rng.randrange(5, 12)
+    minute = rng.randrange(60)
+    display_hour = hour % 12 or 12
+    return f"{display_hour:02d}:{minute:02d} {'PM' if afternoon else 'AM'}"
+
+
+async def generate_users(db, count: int, notifications_rate: float, subscription_rate: float,
+                         rng: random.Random, start: datetime) -> dict:
+    """Insert synthetic users, subscriptions, goals and tasks; returns endpoint -> user"""
+    endpoints = {}
+    users, subscriptions, goals, tasks = [], [], [], []
+    for index in range(count):
+        users.append({
+            "email": f"sim{index}@example.com",
+            "name": f"Sim User {index}",
+            "hashed_password": "x",
+            "disabled": False,
+            "refresh_tokens": [],
+            "morning_deadline": random_deadline(rng, afternoon=False),
+            "evening_deadline": random_deadline(rng, afternoon=True),
+            "notifications_enabled": rng.random() < notifications_rate,
+            "language": rng.choice(["en", "zh"]),
+            "role": "User",
+        })
+    for offset in range(0, count, 5000):
+        result = await db.users.insert_many(users[offset:offset + 5000])
+        for user, user_id in zip(users[offset:offset + 5000], result.inserted_ids):
+            user["_id"] = user_id
+
+    for user in users:
+        user_id = str(user["_id"])
+        for goal in range(rng.randrange(4)):
+            goals.append({"user_id": user_id, "title": f"Goal {goal + 1}", "category": "Personal",
+                          "status": "active", "target_date": start + timedelta(days=30),
+                          "created_at": start - timedelta(days=goal + 1), "updated_at": start})
+        for task in range(rng.randrange(6)):
+            tasks.append({"user_id": user_id, "goal_id": "", "title": f"Task {task + 1}",
+                          "status": rng.choice(["completed", "incomplete"]),
+                          "created_at": start + timedelta(minutes=rng.randrange(12 * 60))})
+        if rng.random() >= subscription_rate:
+            continue
+        for device in range(rng.choice([1, 1, 1, 2, 2, 3])):
+            endpoint = f"{rng.choice(PUSH_ORIGINS)}/{user['_id']}-{device}"
+            endpoints[endpoint] = user
+            subscriptions.append({
+                "user_id": str(user["_id"]),
+                "endpoint": endpoint,
+                "p256dh": "BNcRdreALRFXTkOOUHK1EtK2wtaz5Ry4YfYCA_0QTpQtUbVlUls0VJXg7A8u-Ts1XbjhazAkj7I99e8QcYP7DkM",
+                "auth": "tBHItJI5svbpez7KI4CCXg",
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            })
+    for collection, docs in ((db.push_subscriptions, subscriptions), (db.goals, goals), (db.tasks, tasks)):
+        for offset in range(0, len(docs), 5000):
+            await collection.insert_many(docs[offset:offset + 5000])
+    return endpoints
+
+
+def expected_reminders(users: list, start: datetime, end: datetime) -> set:
+    """(user_id, tag, local_date) for every reminder instant from start up to the last tick at end"""
+    expected = set()
+    for user in users:
+        if not user["notifications_enabled"]:
+            continue
+        for field, tag in (("morning_deadline", "morning-reminder"), ("evening_deadline", "evening-reminder")):
+            deadline = datetime.strptime(user[field], "%I:%M %p").time()
+            local_day = (start + LOCAL_UTC_OFFSET).date() - timedelta(days=1)
+            while local_day <= (end + LOCAL_UTC_OFFSET).date():
+                instant = datetime.combine(local_day, deadline) - LOCAL_UTC_OFFSET - timedelta(minutes=15)
+                if start <= instant <= end:
+                    expected.add((str(user["_id"]), tag, local_day.isoformat()))
+                local_day += timedelta(days=1)
+    return expected
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def open_database(mongo_url: str):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url)
+        db = client.get_default_database()
+        await client.drop_database(db.name)
+        return client, db
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("The in-memory stand-in needs mongomock-motor (pip install mongomock-motor), or pass --mongo-url")
+    client = AsyncMongoMockClient()
+    return client, client["los_sim"]
+
+
+async def prepare_database():
+    """Same setup the API performs at startup"""
+    await OutboxService.ensure_indexes()
+    await DeliveryLedgerService.ensure_indexes()
+    await NotificationService.ensure_indexes()
+    await ReminderService.ensure_indexes()
+    await ReminderService.backfill_reminder_fields()
+
+
+async def simulate(args):
+    rng = random.Random(args.seed)
+    client, raw_db = await open_database(args.mongo_url)
+    db = CountingDatabase(raw_db, in_memory=not args.mongo_url)
+    database.client, database.db = client, db
+
+    start = datetime.strptime(args.start, "%Y-%m-%d") - LOCAL_UTC_OFFSET  # local midnight in UTC
+    clock = VirtualClock(start)
+    clocked_datetime = make_clocked_datetime(clock)
+    for module in CLOCKED_MODULES:
+        module.datetime = clocked_datetime
+
+    push = MockPushService(clock, args.push_latency_ms, args.failure_rate, args.throttle_rate, args.gone_rate, rng)
+    notification_module.webpush = push
+    vapid_cache.load(private_key=make_private_key(), claim_email="simulator@example.com")
+
+    print(f"Generating {args.users} users...")
+    endpoints = await generate_users(raw_db, args.users, args.notifications_rate, args.subscription_rate, rng, start)
+    await prepare_database()
+    users = await raw_db.users.find({}, {"morning_deadline": 1, "evening_deadline": 1, "notifications_enabled": 1}).to_list(None)
+
+    scheduler = SchedulerService()
+    tick = timedelta(minutes=args.tick_minutes)
+    end = start + timedelta(hours=args.hours)
+    tick_stats = []
+
+    while clock.now < end:
+        db.counter.clear()
+        attempts_before, deliveries_before = push.attempts, len(push.deliveries)
+        started = time.perf_counter()
+        await scheduler._check_and_send_reminders()
+        elapsed = time.perf_counter() - started
+        tick_stats.append({
+            "at": clock.now,
+            "seconds": elapsed,
+            "db_ops": sum(db.counter.values()),
+            "attempts": push.attempts - attempts_before,
+            "delivered": len(push.deliveries) - deliveries_before,
+        })
+        if args.verbose and tick_stats[-1]["attempts"]:
+            stat = tick_stats[-1]
+            print(f"{stat['at']:%H:%M} UTC  {stat['seconds'] * 1000:8.1f} ms  db_ops={stat['db_ops']:<6} "
+                  f"attempts={stat['attempts']:<5} delivered={stat['delivered']}")
+        clock.advance(tick)
+
+    # Reminders per (user, reminder, local day, device) actually accepted by the push service
+    per_device = Counter()
+    for endpoint, tag, instant in push.deliveries:
+        user = endpoints[endpoint]
+        local_date = (instant + LOCAL_UTC_OFFSET).date().isoformat()
+        per_device[(str(user["_id"]), tag, local_date, endpoint)] += 1
+    delivered = {key[:3] for key in per_device}
+    duplicates = sum(count - 1 for count in per_device.values() if count > 1)
+
+    subscribed = {str(user["_id"]) for user in endpoints.values()}
+    last_tick = tick_stats[-1]["at"]
+    expected = {key for key in expected_reminders(users, start, last_tick) if key[0] in subscribed}
+    missed = expected - delivered
+    dead_letters = await raw_db.notification_outbox.count_documents({"status": "dead"})
+
+    latencies = [stat["seconds"] * 1000 for stat in tick_stats]
+    busy = [stat for stat in tick_stats if stat["attempts"]]
+    print()
+    print(f"users: {args.users}, subscribed: {len(subscribed)}, devices: {len(endpoints)}")
+    print(f"ticks: {len(tick_stats)} x {args.tick_minutes} min, {len(busy)} with sends")
+    print(f"tick latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} "
+          f"p99={percentile(latencies, 99):.1f} max={max(latencies):.1f} mean={statistics.mean(latencies):.1f}")
+    print(f"db operations: total={sum(s['db_ops'] for s in tick_stats)} "
+          f"per tick p50={percentile([s['db_ops'] for s in tick_stats], 50):.0f} "
+          f"max={max(s['db_ops'] for s in tick_stats)}")
+    print(f"push attempts: {push.attempts}, delivered: {len(push.deliveries)}, dead letters: {dead_letters}")
+    print(f"expected reminders: {len(expected)}, delivered: {len(expected & delivered)}, "
+          f"missed: {len(missed)}, duplicate deliveries: {duplicates}")
+    by_type = defaultdict(int)
+    for _, tag, _ in missed:
+        by_type[tag] += 1
+    if missed:
+        print(f"missed by type: {dict(by_type)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--mongo-url", default="", help="Local MongoDB URL; the database is dropped first")
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--tick-minutes", type=int, default=5, help="Matches the scheduler's */5 cron")
+    parser.add_argument("--start", default=datetime.utcnow().strftime("%Y-%m-%d"), help="Local date to start at")
+    parser.add_argument("--notifications-rate", type=float, default=0.8)
+    parser.add_argument("--subscription-rate", type=float, default=0.7)
+    parser.add_argument("--push-latency-ms", type=float, default=5.0)
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="Share of pushes answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.01, help="Share of pushes answered with 429")
+    parser.add_argument("--gone-rate", type=float, default=0.005, help="Share of pushes answered with 410")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Print every tick that sent pushes")
+    asyncio.run(simulate(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
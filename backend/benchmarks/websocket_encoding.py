@@ -0,0 +1,129 @@
+"""
+Micro-benchmark: bytes on the wire and CPU per WebSocket message, per encoding.
+
+Encodes a stream of typical messages (task/goal change events, auth updates)
+as the old default JSON, compact JSON and MessagePack. Each encoding is
+measured raw and under permessage-deflate, both with context takeover (what
+uvicorn negotiates by default: one compressor per connection) and without it.
+Wire bytes include the WebSocket frame header. It also compares serializing a
+broadcast once per socket against once per broadcast.
+
+Run from the backend directory:
+    python -m benchmarks.websocket_encoding --messages 20000 --sockets 5
+"""
+import argparse
+import json
+import os
+import time
+import zlib
+from datetime import datetime
+from fastapi.encoders import jsonable_encoder
+from services.websocket_connections import encode_message, msgpack
+
+def sample_messages() -> list:
+    now = datetime.utcnow()
+    task = {
+        "goal_id": "6650f1c2a7b3e41d2c9a0f11", "title": "Run 5 km before work", "status": "incomplete",
+        "id": "6650f1c2a7b3e41d2c9a0f42", "user_id": "6650f0aaa7b3e41d2c9a0e01",
+        "created_at": now, "version": 1
+    }
+    return [jsonable_encoder(message) for message in (
+        {"type": "change", "entity": "task", "id": task["id"], "op": "updated", "version": 4,
+         "fields": {"status": "completed"}},
+        {"type": "change", "entity": "goal", "id": task["goal_id"], "op": "updated", "version": 9,
+         "fields": {"title": "Marathon in October", "updated_at": now}},
+        {"type": "change", "entity": "task", "id": task["id"], "op": "created", "version": 1, "fields": task},
+        {"type": "change", "entity": "task", "id": task["id"], "op": "deleted", "version": 5},
+        {"type": "auth_update", "userId": task["user_id"], "authenticated": False},
+    )]
+
+ENCODERS = {
+    "json (old default)": lambda payload: json.dumps(payload).encode(),
+    "json (compact)": lambda payload: encode_message(payload, "json").encode(),
+}
+if msgpack is not None:
+    ENCODERS["msgpack"] = lambda payload: encode_message(payload, "msgpack")
+
+def frame_header(length: int) -> int:
+    """Server-to-client frames are unmasked: 2 bytes, plus 2 or 8 for longer payloads"""
+    return 2 if length < 126 else 4 if length < 65536 else 10
+
+def deflate(data: bytes, compressor) -> bytes:
+    """permessage-deflate (RFC 7692): sync flush, then drop the trailing 00 00 ff ff"""
+    return (compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+
+def measure(encode, stream: list) -> dict:
+    start = time.process_time()
+    encoded = [encode(payload) for payload in stream]
+    encode_cpu = time.process_time() - start
+
+    raw = sum(len(data) + frame_header(len(data)) for data in encoded)
+
+    start = time.process_time()
+    compressor = zlib.compressobj(wbits=-15)
+    takeover = [deflate(data, compressor) for data in encoded]
+    takeover_cpu = time.process_time() - start
+
+    start = time.process_time()
+    no_takeover = [deflate(data, zlib.compressobj(wbits=-15)) for data in encoded]
+    no_takeover_cpu = time.process_time() - start
+
+    return {
+        "raw": raw,
+        "takeover": sum(len(data) + frame_header(len(data)) for data in takeover),
+        "no_takeover": sum(len(data) + frame_header(len(data)) for data in no_takeover),
+        "encode_us": encode_cpu / len(stream) * 1e6,
+        "takeover_us": takeover_cpu / len(stream) * 1e6,
+        "no_takeover_us": no_takeover_cpu / len(stream) * 1e6,
+    }
+
+def fan_out(encode, stream: list, sockets: int) -> tuple:
+    """CPU to serialize every message for every socket, versus once per broadcast"""
+    start = time.process_time()
+    for payload in stream:
+        for _ in range(sockets):
+            encode(payload)
+    per_socket = time.process_time() - start
+
+    # Every socket's writer is then handed the same encoded object
+    start = time.process_time()
+    for payload in stream:
+        encode(payload)
+    once = time.process_time() - start
+    return per_socket, once
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--sockets", type=int, default=5, help="Sockets per user for the fan-out comparison")
+    args = parser.parse_args()
+
+    samples = sample_messages()
+    # Fresh ids and versions so deflate cannot just repeat earlier messages
+    stream = [
+        {**samples[i % len(samples)], "id": os.urandom(12).hex(), "version": i}
+        if "id" in samples[i % len(samples)] else samples[i % len(samples)]
+        for i in range(args.messages)
+    ]
+    if msgpack is None:
+        print("msgpack not installed; MessagePack rows are skipped (pip install msgpack)")
+
+    print(f"messages: {args.messages} ({len(samples)} message shapes, round-robin)")
+    print(f"{'encoding':<20} {'bytes/msg':>10} {'deflate':>9} {'deflate, no ctx':>16} "
+          f"{'encode us':>10} {'+deflate us':>12} {'+deflate no ctx us':>19}")
+    for name, encode in ENCODERS.items():
+        result = measure(encode, stream)
+        print(
+            f"{name:<20} {result['raw'] / args.messages:>10.1f} {result['takeover'] / args.messages:>9.1f} "
+            f"{result['no_takeover'] / args.messages:>16.1f} {result['encode_us']:>10.2f} "
+            f"{result['takeover_us']:>12.2f} {result['no_takeover_us']:>19.2f}"
+        )
+
+    print(f"\nfan-out to {args.sockets} sockets per broadcast (serialization CPU only)")
+    for name, encode in ENCODERS.items():
+        per_socket, once = fan_out(encode, stream, args.sockets)
+        print(f"{name:<20} per socket: {per_socket / args.messages * 1e6:.2f}us/broadcast, "
+              f"once: {once / args.messages * 1e6:.2f}us/broadcast")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+WebSocket load generator for a running backend.
+
+Seeds throwaway users straight into the server's database, mints their access
+tokens with create_access_token (so it must run with the server's SECRET_KEY
+and MONGODB_URL, e.g. from the same .env), opens many sockets to
+/ws/{user_id} and answers the server's heartbeat pings. It then triggers
+broadcasts through the HTTP API: each one renames a goal with PUT /goals/{id},
+which pushes a change event to every socket of that user, on every worker.
+
+Reported: connection setup rate and latency, server memory per connection
+(with --server-pid, summed over the process and its children, so pass the
+gunicorn master), protocol-level ping RTT while idle and under broadcast load,
+and end-to-end broadcast delivery latency (HTTP request sent to event
+received on each socket).
+
+Run from the backend directory, against a server started separately:
+    gunicorn main:app -k uvicorn.workers.UvicornWorker -w 4 &
+    python -m benchmarks.websocket_load --url http://localhost:8000 --connections 5000 \\
+        --sockets-per-user 2 --broadcasts 2000 --rate 200 --server-pid $(pgrep -o gunicorn)
+
+Thousands of sockets need a matching open-file limit on both sides
+(ulimit -n); the soft limit of this process is raised to its hard limit.
+"""
+import argparse
+import asyncio
+import random
+import resource
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import requests
+import websockets
+from bson import ObjectId
+from database import get_db
+from services.auth_service import create_access_token
+from services.reminder_service import ReminderService
+from services.user_search_service import UserSearchService
+from services.websocket_connections import decode_message
+
+EMAIL_DOMAIN = "loadtest.example.com"
+
+def percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "no samples"
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return (f"n={len(ordered)} p50={at(0.5):.1f}ms p95={at(0.95):.1f}ms "
+            f"p99={at(0.99):.1f}ms max={ordered[-1]:.1f}ms")
+
+def process_rss_kb(pid: int) -> int:
+    """Resident memory of a process and, recursively, its children"""
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        with open(f"/proc/{pid}/task/{pid}/children") as children_file:
+            children = [int(child) for child in children_file.read().split()]
+    except FileNotFoundError:
+        return total
+    return total + sum(process_rss_kb(child) for child in children)
+
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+class LoadUser:
+    def __init__(self, user_id: str, token: str):
+        self.user_id = user_id
+        self.token = token
+        self.goal_id: Optional[str] = None
+
+
+class LoadSocket:
+    """One client socket: answers heartbeat pings and timestamps broadcasts"""
+
+    def __init__(self, user: LoadUser, run: "LoadRun"):
+        self.user = user
+        self.run = run
+        self.websocket = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self, ws_url: str, subprotocol: Optional[str], compression: Optional[str]):
+        self.websocket = await websockets.connect(
+            f"{ws_url}/ws/{self.user.user_id}?token={self.user.token}",
+            subprotocols=[subprotocol] if subprotocol else None,
+            compression=compression,
+            ping_interval=None,  # Protocol pings are sent explicitly to measure RTT
+            open_timeout=30,
+            max_queue=None
+        )
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for frame in self.websocket:
+                if frame == "ping":
+                    self.run.counters["heartbeat_pings"] += 1
+                    await self.websocket.send("pong")
+                    continue
+                message = decode_message(frame)
+                title = (message.get("fields") or {}).get("title", "")
+                if message.get("type") == "change" and title.startswith("load "):
+                    self.run.record_delivery(int(title.split()[1]))
+        except websockets.ConnectionClosed as e:
+            self.run.counters["closed_by_server"] += 1
+            self.run.close_codes[e.code] = self.run.close_codes.get(e.code, 0) + 1
+
+    async def ping_rtt(self) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            pong = await self.websocket.ping()
+            await asyncio.wait_for(pong, 30)
+        except Exception:
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self._reader is not None:
+            await self._reader
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = args.url.rstrip("/")
+        self.ws_url = self.base_url.replace("http", "ws", 1)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.users: List[LoadUser] = []
+        self.sockets: List[LoadSocket] = []
+        self.sent_at: Dict[int, float] = {}
+        self.delivery_ms: List[float] = []
+        self.counters = {"heartbeat_pings": 0, "closed_by_server": 0, "connect_failures": 0,
+                         "http_failures": 0, "deliveries": 0, "expected_deliveries": 0}
+        self.close_codes: Dict[int, int] = {}
+
+    def record_delivery(self, sequence: int):
+        sent_at = self.sent_at.get(sequence)
+        if sent_at is not None:
+            self.counters["deliveries"] += 1
+            self.delivery_ms.append((time.perf_counter() - sent_at) * 1000)
+
+    def server_rss_kb(self) -> Optional[int]:
+        return process_rss_kb(self.args.server_pid) if self.args.server_pid else None
+
+    async def http(self, method: str, path: str, user: LoadUser, body: Optional[dict] = None) -> Optional[dict]:
+        response = await asyncio.to_thread(
+            requests.request, method, f"{self.base_url}{path}", json=body, timeout=30,
+            headers={"Authorization": f"Bearer {user.token}"}
+        )
+        if response.status_code >= 400:
+            self.counters["http_failures"] += 1
+            return None
+        return response.json() if response.content else {}
+
+    async def seed(self, user_count: int):
+        db = await get_db()
+        docs = []
+        for i in range(user_count):
+            user_obj_id = ObjectId()
+            docs.append({
+                "_id": user_obj_id,
+                "email": f"load-{self.run_id}-{i}@{EMAIL_DOMAIN}",
+                "name": f"Load {i}",
+                "hashed_password": "!",  # Cannot log in; the harness mints tokens directly
+                "disabled": False,
+                "refresh_tokens": [],
+                "morning_deadline": "09:00 AM",
+                "evening_deadline": "10:00 PM",
+                "notifications_enabled": False,
+                "language": "en",
+                "role": "User",
+                **ReminderService.compute_reminder_fields("09:00 AM", "10:00 PM"),
+                "reminder_slot": ReminderService.reminder_slot(user_obj_id),
+                **UserSearchService.search_fields(f"load-{self.run_id}-{i}@{EMAIL_DOMAIN}", f"Load {i}", "User")
+            })
+        await db.users.insert_many(docs)
+        expires = timedelta(minutes=self.args.token_minutes)
+        self.users = [LoadUser(str(doc["_id"]), create_access_token({"sub": str(doc["_id"])}, expires)) for doc in docs]
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def create_goal(user: LoadUser):
+            async with semaphore:
+                goal = await self.http("POST", "/goals/", user, {
+                    "title": "load 0", "category": "Work",
+                    "target_date": (datetime.utcnow() + timedelta(days=30)).isoformat()
+                })
+            user.goal_id = goal["id"] if goal else None
+
+        await asyncio.gather(*[create_goal(user) for user in self.users])
+
+    async def connect_all(self):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        setup_ms: List[float] = []
+
+        async def connect(socket: LoadSocket):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await socket.connect(self.ws_url, self.args.subprotocol, self.args.compression)
+                except Exception as e:
+                    self.counters["connect_failures"] += 1
+                    if self.counters["connect_failures"] <= 5:
+                        print(f"  connect failed: {e!r}")
+                    return
+                setup_ms.append((time.perf_counter() - start) * 1000)
+                self.sockets.append(socket)
+
+        candidates = [
+            LoadSocket(self.users[i // self.args.sockets_per_user], self)
+            for i in range(self.args.connections)
+        ]
+        rss_before = self.server_rss_kb()
+        start = time.perf_counter()
+        await asyncio.gather(*[connect(socket) for socket in candidates])
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(2)  # Let the server settle before reading its memory
+        rss_after = self.server_rss_kb()
+
+        print(f"connected {len(self.sockets)}/{len(candidates)} sockets in {elapsed:.1f}s "
+              f"({len(self.sockets) / elapsed:.0f}/s), failures: {self.counters['connect_failures']}")
+        print(f"  setup latency: {percentiles(setup_ms)}")
+        if rss_before is not None and self.sockets:
+            print(f"  server RSS {rss_before / 1024:.1f} -> {rss_after / 1024:.1f} MiB, "
+                  f"{(rss_after - rss_before) / len(self.sockets):.1f} KiB per connection")
+
+    async def ping_round(self, label: str) -> List[float]:
+        results = await asyncio.gather(*[socket.ping_rtt() for socket in self.sockets])
+        rtts = [rtt for rtt in results if rtt is not None]
+        print(f"ping RTT ({label}): {percentiles(rtts)}, lost: {len(results) - len(rtts)}")
+        return rtts
+
+    async def broadcast(self):
+        sockets_per_user: Dict[str, int] = {}
+        for socket in self.sockets:
+            sockets_per_user[socket.user.user_id] = sockets_per_user.get(socket.user.user_id, 0) + 1
+        targets = [user for user in self.users if user.goal_id and user.user_id in sockets_per_user]
+        if not targets:
+            print("no users with both a goal and a socket; skipping broadcasts")
+            return
+
+        http_ms: List[float] = []
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def trigger(sequence: int, user: LoadUser):
+            async with semaphore:
+                self.sent_at[sequence] = time.perf_counter()
+                self.counters["expected_deliveries"] += sockets_per_user[user.user_id]
+                if await self.http("PUT", f"/goals/{user.goal_id}", user, {"title": f"load {sequence}"}) is not None:
+                    http_ms.append((time.perf_counter() - self.sent_at[sequence]) * 1000)
+
+        interval = 1 / self.args.rate
+        start = time.perf_counter()
+        triggers, ping_rounds = [], []
+        for sequence in range(1, self.args.broadcasts + 1):
+            triggers.append(asyncio.create_task(trigger(sequence, random.choice(targets))))
+            await asyncio.sleep(max(0.0, start + sequence * interval - time.perf_counter()))
+            if sequence % max(1, self.args.broadcasts // 4) == 0:
+                # In the background, so pinging does not slow the broadcast rate
+                ping_rounds.append(asyncio.create_task(
+                    self.ping_round(f"during broadcasts, {sequence}/{self.args.broadcasts}")
+                ))
+        await asyncio.gather(*triggers, *ping_rounds)
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(self.args.drain_seconds)  # Stragglers from other workers and slow queues
+
+        print(f"broadcasts: {self.args.broadcasts} in {elapsed:.1f}s ({self.args.broadcasts / elapsed:.0f}/s), "
+              f"HTTP failures: {self.counters['http_failures']}")
+        print(f"  HTTP PUT latency: {percentiles(http_ms)}")
+        print(f"  delivered {self.counters['deliveries']}/{self.counters['expected_deliveries']} socket messages")
+        print(f"  delivery latency: {percentiles(self.delivery_ms)}")
+
+    async def cleanup(self):
+        await asyncio.gather(*[socket.close() for socket in self.sockets], return_exceptions=True)
+        db = await get_db()
+        user_ids = [user.user_id for user in self.users]
+        await db.goals.delete_many({"user_id": {"$in": user_ids}})
+        await db.users.delete_many({"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}})
+        print(f"removed {len(user_ids)} load-test users and their goals")
+
+    async def execute(self):
+        user_count = -(-self.args.connections // self.args.sockets_per_user)
+        print(f"run {self.run_id}: {self.args.connections} sockets over {user_count} users against {self.base_url}")
+        try:
+            await self.seed(user_count)
+            await self.connect_all()
+            await self.ping_round("idle")
+            if self.args.broadcasts:
+                await self.broadcast()
+            await self.ping_round("after broadcasts")
+            print(f"heartbeat pings answered: {self.counters['heartbeat_pings']}, "
+                  f"closed by server: {self.counters['closed_by_server']} {self.close_codes or ''}")
+        finally:
+            if not self.args.keep:
+                await self.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the running server")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--sockets-per-user", type=int, default=1, help="Tabs/devices per user")
+    parser.add_argument("--concurrency", type=int, default=200, help="Connections or HTTP requests in flight")
+    parser.add_argument("--broadcasts", type=int, default=500, help="Goal updates to trigger; 0 to skip")
+    parser.add_argument("--rate", type=float, default=100, help="Broadcasts per second")
+    parser.add_argument("--drain-seconds", type=float, default=5, help="Wait for late deliveries")
+    parser.add_argument("--subprotocol", choices=["json", "msgpack"], default=None)
+    parser.add_argument("--compression", choices=["deflate"], default="deflate",
+                        help="permessage-deflate; pass --no-compression to disable")
+    parser.add_argument("--no-compression", dest="compression", action="store_const", const=None)
+    parser.add_argument("--server-pid", type=int, default=None, help="Server process to sample memory from")
+    parser.add_argument("--token-minutes", type=int, default=120)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded users and goals")
+    args = parser.parse_args()
+
+    limit = raise_file_limit()
+    if args.connections + args.concurrency > limit:
+        print(f"warning: open-file limit is {limit}; raise it (ulimit -n) for {args.connections} sockets")
+    asyncio.run(LoadRun(args).execute())
+
+if __name__ == "__main__":
+    main()
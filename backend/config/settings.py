@@ -1,6 +1,7 @@
 import os
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+from typing import Literal
 
 # Determine the environment and set the appropriate .env file path
 app_env = os.getenv('APP_ENV', 'development')
@@ -20,6 +21,63 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     REFRESH_TOKEN_ROTATION: bool = True
     ALGORITHM: str = "HS256"
+    AUTH_STATUS_CACHE_SECONDS: int = 15  # How long a user's role and active state are trusted before rechecking
+    AUTH_STATUS_CACHE_ENTRIES: int = 10000  # Users whose status is remembered per worker
+    TOKEN_REVOCATION_SYNC_SECONDS: int = 2  # How often each worker pulls access-token revocations made elsewhere
+    TOKEN_REVOCATION_REBUILD_MINUTES: int = 30  # The bloom filter is rebuilt this often to drop expired tokens
+    TOKEN_REVOCATION_BLOOM_BITS: int = 1 << 20  # 128 KiB; about 1% false positives at 100k live revocations
+    TOKEN_REVOCATION_BLOOM_HASHES: int = 7
+    # Web push (VAPID)
+    VAPID_PRIVATE_KEY: str = ""  # Will be loaded from env (PEM file path, DER or raw base64url key)
+    VAPID_CLAIM_EMAIL: str = ""  # Will be loaded from env
+    VAPID_TOKEN_TTL_SECONDS: int = 12 * 60 * 60  # Push services accept at most 24h
+    VAPID_REFRESH_MARGIN_SECONDS: int = 10 * 60  # Re-sign cached tokens this long before they expire
+    # Notification outbox
+    OUTBOX_CONSUMERS: int = 4  # Concurrent outbox consumers per worker
+    OUTBOX_POLL_SECONDS: int = 15  # How often each worker drains the outbox
+    OUTBOX_LEASE_SECONDS: int = 60  # How long a claimed job stays invisible to other consumers
+    OUTBOX_MAX_ATTEMPTS: int = 6  # Attempts before a job is moved to the dead-letter state
+    OUTBOX_BACKOFF_BASE_SECONDS: float = 5.0
+    OUTBOX_BACKOFF_MAX_SECONDS: float = 3600.0
+    OUTBOX_RETENTION_HOURS: int = 48  # Sent jobs are removed by a TTL index after this long
+    PUSH_SUBSCRIPTION_STALE_DAYS: int = 60  # Subscriptions without a successful push for this long are pruned
+    # Reminders
+    REMINDER_LEDGER_TTL_DAYS: int = 7  # How long per-day delivery records are kept
+    REMINDER_LOOKBACK_MINUTES: int = 15  # A sweep picks up reminders that came due this long ago
+    REMINDER_TIMER_ENABLED: bool = True  # Fire reminders at their exact minute from an in-memory timer heap
+    REMINDER_TIMER_WINDOW_MINUTES: int = 60  # How far ahead the timer loads upcoming reminders from the database
+    REMINDER_FALLBACK_POLL_MINUTES: int = 5  # Safety sweep interval that catches anything the timer missed
+    REMINDER_PARTITIONS: int = 0  # Hash partitions of users shared out between workers; 0 lets every worker handle everyone
+    REMINDER_PARTITION_LEASE_SECONDS: int = 30  # A worker that stops renewing loses its partitions after this long
+    # WebSockets
+    WS_PING_INTERVAL_SECONDS: int = 30  # Each socket is pinged once per interval by the shared heartbeat wheel
+    WS_PONG_TIMEOUT_SECONDS: int = 75  # Sockets silent for this long are closed
+    WS_SEND_TIMEOUT_SECONDS: float = 5.0
+    WS_SEND_QUEUE_SIZE: int = 64  # Outbound messages buffered per socket
+    WS_SEND_OVERFLOW_POLICY: Literal["drop_oldest", "coalesce", "disconnect"] = "drop_oldest"
+    WS_RPC_MAX_IN_FLIGHT: int = 16  # RPC calls run concurrently per socket; further calls wait their turn
+    WS_RPC_MAX_PENDING: int = 64  # RPC calls running or waiting per socket; more are refused with 429
+    # Cross-worker WebSocket bus
+    WS_BUS_CAPPED_BYTES: int = 16 * 1024 * 1024  # Size of the ws_bus capped collection
+    WS_BUS_MAX_MESSAGES: int = 50000
+    # Admin
+    ADMIN_USER_COUNT_CACHE_SECONDS: int = 30  # How long a user-search total is reused before recounting
+    ADMIN_STATS_REFRESH_SECONDS: int = 300  # How often the /admin/stats aggregations are recomputed in the background
+    ADMIN_STATS_TASK_DAYS: int = 30  # Days of task creation counts in the statistics
+    ADMIN_BULK_MAX_USERS: int = 1000  # Users one bulk admin request may act on
+    # Exports
+    EXPORT_BATCH_SIZE: int = 500  # Documents fetched per cursor batch while streaming an export
+    EXPORT_CHUNK_BYTES: int = 64 * 1024  # Export output is sent in chunks of about this size
+    # User deletion
+    USER_DELETION_POLL_SECONDS: int = 10  # How often each worker looks for queued deletions
+    USER_DELETION_BATCH_SIZE: int = 500  # Documents removed per delete
+    USER_DELETION_BATCH_PAUSE_SECONDS: float = 0.2  # Pause between batches so deletions never hog the database
+    USER_DELETION_LEASE_SECONDS: int = 120  # A job whose worker stops checkpointing is resumed by another after this long
+    USER_DELETION_MAX_ATTEMPTS: int = 5  # Claims before a job whose lease keeps expiring is marked failed
+    USER_DELETION_RETENTION_DAYS: int = 30  # Finished deletion records are removed by a TTL index after this long
+    # Scheduler job metrics
+    JOB_RUN_HISTORY_SIZE: int = 200  # Recent job runs kept in memory per worker
+    JOB_RUN_RETENTION_DAYS: int = 14  # Persisted job runs are removed by a TTL index after this long
 
     model_config = SettingsConfigDict(
         env_file=env_file,
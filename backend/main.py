@@ -11,10 +11,24 @@ from datetime import datetime
 from routes import auth, goals, websocket, preferences, task, admin, notifications # Added notifications router
 from middleware.cors import setup_cors
 from services.scheduler_service import scheduler_service
+from services.outbox_service import OutboxService
+from services.delivery_ledger_service import DeliveryLedgerService
+from services.notification_service import NotificationService
+from services.vapid_service import vapid_cache
+from services.reminder_service import ReminderService
+from services.job_run_service import JobRunService
+from services.user_search_service import UserSearchService
+from services.user_deletion_service import UserDeletionService
+from services.admin_stats_service import admin_stats_cache
+from services.admin_service import AdminService
+from services.token_revocation_service import token_revocations
+from services.partition_service import partition_manager
+from services.websocket_bus import websocket_bus
+from services.websocket_connections import heartbeat_wheel
 
 def mask_sensitive_settings(settings_obj):
     """Mask sensitive information in settings for logging purposes."""
-    sensitive_fields = ['SECRET_KEY', 'REFRESH_SECRET_KEY', 'MONGODB_URL']
+    sensitive_fields = ['SECRET_KEY', 'REFRESH_SECRET_KEY', 'MONGODB_URL', 'VAPID_PRIVATE_KEY']
     masked_settings = {}
 
     for key, value in settings_obj.__dict__.items():
@@ -38,9 +52,31 @@ def mask_sensitive_settings(settings_obj):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_to_mongo()
+    vapid_cache.load()
+    await OutboxService.ensure_indexes()
+    await DeliveryLedgerService.ensure_indexes()
+    await NotificationService.ensure_indexes()
+    await ReminderService.ensure_indexes()
+    await JobRunService.ensure_indexes()
+    await ReminderService.backfill_reminder_fields()
+    await UserSearchService.ensure_indexes()
+    await UserSearchService.backfill_search_fields()
+    await UserDeletionService.ensure_indexes()
+    await admin_stats_cache.ensure_collection()
+    await AdminService.ensure_indexes()
+    await token_revocations.ensure_indexes()
+    await token_revocations.start()
+    await partition_manager.ensure_partitions()
+    await websocket_bus.ensure_collection()
+    websocket_bus.start(websocket.send_to_user)
+    heartbeat_wheel.start()
     scheduler_service.start()
     yield
     scheduler_service.stop()
+    heartbeat_wheel.stop()
+    token_revocations.stop()
+    websocket_bus.stop()
+    await partition_manager.release_all()
 
 app = FastAPI(lifespan=lifespan)
 setup_cors(app)
@@ -31,6 +31,7 @@ class Goal(GoalBase):
     created_at: datetime
     updated_at: datetime
     completed_at: Optional[datetime] = None
+    version: int = 0  # Incremented on every write; goals created before versioning start at 0
 
 class GoalInDB(Goal):
     """Database representation of a goal including sensitive fields"""
@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+from enum import Enum
+from datetime import datetime
+
+class JobRunStatus(str, Enum):
+    RUNNING = "running"
+    OK = "ok"
+    ERROR = "error"
+    MISSED = "missed"  # The scheduler woke up too late to start the run
+    SKIPPED = "skipped"  # The previous run was still going when this one was due
+
+class JobRun(BaseModel):
+    job_id: str
+    worker_id: str
+    status: JobRunStatus = JobRunStatus.RUNNING
+    scheduled_at: Optional[datetime] = None
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    lag_ms: Optional[float] = None  # Start time minus scheduled time
+    duration_ms: Optional[float] = None
+    # Time spent waiting on the database and on push services, summed across concurrent operations
+    db_ms: float = 0.0
+    push_ms: float = 0.0
+    counts: Dict[str, int] = Field(default_factory=dict)
+    error: Optional[str] = None
+    overlapped: bool = False  # Another run of the same job was in progress, or this one ran past its next run
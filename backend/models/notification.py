@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from enum import Enum
 from datetime import datetime
 
 class PushSubscription(BaseModel):
@@ -12,6 +13,7 @@ class PushSubscriptionInDB(PushSubscription):
     user_id: str
     created_at: datetime = datetime.utcnow()
     updated_at: datetime = datetime.utcnow()
+    last_success_at: Optional[datetime] = None
 
 class NotificationRequest(BaseModel):
     user_id: str
@@ -19,4 +21,20 @@ class NotificationRequest(BaseModel):
     body: str
     icon: Optional[str] = None
     badge: Optional[str] = None
-    tag: Optional[str] = None
\ No newline at end of file
+    tag: Optional[str] = None
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    SENT = "sent"
+    DEAD = "dead"
+
+class PushResult(BaseModel):
+    """Outcome of a push attempt to a user's devices, used by the outbox to decide on retries."""
+    success: bool
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None  # Seconds, from the push service's Retry-After header
+    error: Optional[str] = None
+    retryable: bool = False
+    retry_endpoints: List[str] = []  # Devices that should be retried
+    delivered: int = 0  # Devices that accepted the push
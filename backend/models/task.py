@@ -23,6 +23,7 @@ class Task(TaskCreate):
     id: Optional[str] = None
     user_id: str
     created_at: datetime
+    version: int = 0  # Incremented on every write; tasks created before versioning start at 0
 
     class Config:
         json_encoders = {
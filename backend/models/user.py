@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, model_validator
 from typing import Optional, List, Literal
 
 class UserCreate(BaseModel):
@@ -58,6 +58,11 @@ class UserInDB(BaseModel):
 class User(UserInDB):
     pass
 
+class TokenUser(BaseModel):
+    """The caller as established by a verified access token, without loading the user document"""
+    id: str
+    role: str = "User"
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -87,4 +92,28 @@ class UserUpdate(BaseModel):
     name: Optional[str] = None
     role: Optional[Literal["User", "Admin"]] = None
     language: Optional[str] = None
-    preferences: Optional[UserPreferencesUpdate] = None
\ No newline at end of file
+    preferences: Optional[UserPreferencesUpdate] = None
+
+# Pydantic models for bulk admin operations
+class BulkUserFilter(BaseModel):
+    search: Optional[str] = None  # Same prefix search as the admin user list
+    role: Optional[str] = None
+
+class BulkUserSelection(BaseModel):
+    """Users to act on: either explicit ids or a filter, not both"""
+    ids: Optional[List[str]] = None
+    filter: Optional[BulkUserFilter] = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Provide either ids or filter")
+        return self
+
+class BulkUserChanges(BaseModel):
+    role: Optional[Literal["User", "Admin"]] = None
+    disabled: Optional[bool] = None
+    language: Optional[str] = None
+
+class BulkUserUpdate(BulkUserSelection):
+    changes: BulkUserChanges
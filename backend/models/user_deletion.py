@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+from enum import Enum
+from datetime import datetime
+
+class UserDeletionStatus(str, Enum):
+    PENDING = "pending"  # Tombstoned, waiting for a worker
+    RUNNING = "running"  # A worker holds the lease and is removing data
+    DONE = "done"
+    FAILED = "failed"  # Ran out of attempts; the user stays tombstoned until deletion is requested again
+
+class UserDeletion(BaseModel):
+    user_id: str
+    status: UserDeletionStatus = UserDeletionStatus.PENDING
+    requested_by: Optional[str] = None
+    requested_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    failed_at: Optional[datetime] = None
+    stage: int = 0  # Index of the collection being cleared; earlier ones are done
+    current_collection: Optional[str] = None
+    deleted: Dict[str, int] = Field(default_factory=dict)  # Documents removed so far, per collection
+    attempts: int = 0  # Times a worker has claimed the job; above 1 means it was resumed
@@ -0,0 +1,38 @@
+"""
+Dedicated reminder worker: runs the reminder scheduler, timer and outbox
+consumers without serving the API.
+
+With REMINDER_PARTITIONS set, start as many of these as needed (next to the
+web workers, which run the same scheduler) and the partitions spread across
+all of them. Indexes and backfills are left to the API's startup.
+
+    python reminder_worker.py
+"""
+import asyncio
+import logging
+import signal
+from database import connect_to_mongo
+from services.scheduler_service import scheduler_service
+from services.partition_service import partition_manager
+from services.vapid_service import vapid_cache
+
+async def run_worker():
+    await connect_to_mongo()
+    vapid_cache.load()
+    await partition_manager.ensure_partitions()
+    scheduler_service.start()
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    try:
+        await stopping.wait()
+    finally:
+        scheduler_service.stop()
+        await partition_manager.release_all()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker())
@@ -1,52 +1,96 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import Optional
-from models.user import User, UserUpdate
-from services.auth_service import get_current_user
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from models.user import TokenUser, UserUpdate, BulkUserSelection, BulkUserUpdate
+from models.user_deletion import UserDeletion
+from services.auth_service import require_role
 from services.admin_service import AdminService
+from services.user_deletion_service import UserDeletionService
+from services.admin_stats_service import admin_stats_cache
+from services.export_service import ExportService, ExportFormat, MEDIA_TYPES
+from services.job_run_service import JobRunService, job_recorder
+from services.scheduler_service import scheduler_service
+from services.websocket_bus import websocket_bus
+from services.websocket_connections import heartbeat_wheel, connection_registry
+from routes.websocket import broadcast_auth_update_to_user, broadcast_auth_update_to_users
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 @router.get("/users")
 async def list_users(
-    current_user: User = Depends(get_current_user),
-    page: int = Query(1, ge=1),
+    current_user: TokenUser = Depends(require_role("Admin")),
     limit: int = Query(10, ge=1, le=100),
     search: Optional[str] = None,
-    role: Optional[str] = None
+    role: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor or prev_cursor from a previous page")
 ):
-    if current_user.role.lower() != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-
     try:
-        users = await AdminService.list_users(
-            page=page,
+        page = await AdminService.list_users(
             limit=limit,
             search_query=search,
-            role_filter=role
+            role_filter=role,
+            cursor=cursor
+        )
+        page["total"] = await AdminService.count_users(search_query=search, role_filter=role)
+        return page
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-        return {"users": users}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
-@router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(
-    user_id: str,
-    current_user: User = Depends(get_current_user)
+@router.patch("/users/bulk")
+async def bulk_update_users(
+    request: BulkUserUpdate,
+    current_user: TokenUser = Depends(require_role("Admin"))
 ):
-    if current_user.role.lower() != "admin":
+    """Change role, disabled or language for the given ids or every user matching the filter"""
+    try:
+        result = await AdminService.bulk_update(request, actor_id=current_user.id)
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if request.changes.disabled:
+        await broadcast_auth_update_to_users(
+            [item["id"] for item in result["results"] if item["status"] == "updated"], is_authenticated=False
         )
+    return result
 
+@router.post("/users/bulk/delete", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_delete_users(
+    request: BulkUserSelection,
+    current_user: TokenUser = Depends(require_role("Admin"))
+):
+    """Queue the given ids, or every user matching the filter, for background deletion"""
+    try:
+        result = await AdminService.bulk_delete(request.ids, request.filter, actor_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    await broadcast_auth_update_to_users(
+        [item["id"] for item in result["results"] if item["status"] == "queued"], is_authenticated=False
+    )
+    return result
+
+@router.delete("/users/{user_id}", status_code=status.HTTP_202_ACCEPTED, response_model=UserDeletion)
+async def delete_user(
+    user_id: str,
+    current_user: TokenUser = Depends(require_role("Admin"))
+):
+    """Lock the user out now and remove their data in the background; poll /deletion for progress"""
     try:
-        await AdminService.delete_user(user_id)
+        deletion = await AdminService.delete_user(user_id, requested_by=current_user.id)
+        await broadcast_auth_update_to_user(user_id=user_id, is_authenticated=False)
+        return deletion
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,17 +102,24 @@ async def delete_user(
             detail=str(e)
         )
 
-@router.get("/users/{user_id}/details")
-async def get_user_details(
+@router.get("/users/{user_id}/deletion", response_model=UserDeletion)
+async def get_user_deletion(
     user_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: TokenUser = Depends(require_role("Admin"))
 ):
-    if current_user.role.lower() != "admin":
+    deletion = await UserDeletionService.get_progress(user_id)
+    if not deletion:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No deletion found for this user"
         )
-    
+    return deletion
+
+@router.get("/users/{user_id}/details")
+async def get_user_details(
+    user_id: str,
+    current_user: TokenUser = Depends(require_role("Admin"))
+):
     user = await AdminService.get_user_details(user_id)
     if not user:
         raise HTTPException(
@@ -81,14 +132,8 @@ async def get_user_details(
 async def update_user(
     user_id: str,
     user_data: UserUpdate,
-    current_user: User = Depends(get_current_user)
+    current_user: TokenUser = Depends(require_role("Admin"))
 ):
-    if current_user.role.lower() != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-    
     try:
         await AdminService.update_user(user_id, user_data.dict(exclude_unset=True))
         return {"message": "User updated successfully"}
@@ -96,4 +141,72 @@ async def update_user(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+@router.get("/stats")
+async def get_system_stats(current_user: TokenUser = Depends(require_role("Admin"))):
+    """System size and usage, from the snapshot the scheduler refreshes every ADMIN_STATS_REFRESH_SECONDS"""
+    snapshot = await admin_stats_cache.get()
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Statistics are still being computed",
+            headers={"Retry-After": "30"}
+        )
+    return snapshot
+
+@router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: Literal["users", "goals", "tasks"],
+    export_format: ExportFormat = Query("csv", alias="format"),
+    current_user: TokenUser = Depends(require_role("Admin"))
+):
+    """Stream a whole collection as CSV or NDJSON"""
+    # Accounts awaiting deletion are left out, as in the user list
+    query = {"deleted_at": None} if dataset == "users" else None
+    return StreamingResponse(
+        ExportService.stream(dataset, export_format, query),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{ExportService.filename(dataset, export_format)}"'}
+    )
+
+@router.get("/jobs")
+async def get_job_metrics(
+    current_user: TokenUser = Depends(require_role("Admin")),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Scheduled jobs with their next run, per-job figures and this worker's most recent runs"""
+    return {
+        "jobs": [
+            {"id": job.id, "name": job.name, "next_run_time": job.next_run_time}
+            for job in scheduler_service.get_jobs()
+        ],
+        "summary": job_recorder.summary(),
+        "recent_runs": job_recorder.recent(limit=limit)
+    }
+
+@router.get("/jobs/runs")
+async def list_job_runs(
+    current_user: TokenUser = Depends(require_role("Admin")),
+    job_id: Optional[str] = None,
+    run_status: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Persisted job runs from all workers, newest first"""
+    try:
+        runs = await JobRunService.list_runs(job_id=job_id, status=run_status, limit=limit)
+        return {"runs": runs}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/websocket/bus")
+async def get_websocket_bus_stats(current_user: TokenUser = Depends(require_role("Admin"))):
+    """This worker's WebSocket bus, heartbeat and send queue figures"""
+    return {
+        **websocket_bus.stats(),
+        "heartbeat": heartbeat_wheel.stats(),
+        "send_queues": connection_registry.stats()
+    }
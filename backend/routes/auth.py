@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import StreamingResponse
+from typing import Literal
+from datetime import datetime, timezone
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel # Import BaseModel for request body model
 from jose import jwt
 from jose.exceptions import JWTError as PyJWTError
 from config.settings import settings
 
-from models.user import User, UserCreate, Token, UserInDB # Added UserInDB
-from services.auth_service import AuthService, refresh_access_token, get_current_user # Added get_current_user
+from models.user import User, UserCreate, Token, UserInDB, TokenUser # Added UserInDB
+from models.user_deletion import UserDeletion
+from services.auth_service import AuthService, refresh_access_token, get_current_user, get_token_user # Added get_current_user
+from services.export_service import ExportService, ExportFormat, MEDIA_TYPES
+from services.token_revocation_service import token_revocations
 # Import the broadcast function from the websocket routes
 from routes.websocket import broadcast_auth_update_to_user
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
@@ -93,7 +101,13 @@ async def logout(request: Request):
         except Exception:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token (sub not ObjectId format)")
 
-        # Revoke all refresh tokens for this user
+        # Logout clears every refresh token below, so every access token is revoked too.
+        # The presented one is also revoked by jti, which lasts until its own expiry.
+        if payload.get("jti"):
+            await token_revocations.revoke_token(
+                payload["jti"], datetime.fromtimestamp(payload["exp"], timezone.utc).replace(tzinfo=None), user_id_str
+            )
+        await token_revocations.revoke_user(user_id_str)
         from database import get_db
         db = await get_db()
         await db.users.update_one(
@@ -197,38 +211,56 @@ async def refresh_token(request: Request):
             detail="Invalid refresh token"
         )
 
-@router.delete("/account", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/account", status_code=status.HTTP_202_ACCEPTED, response_model=UserDeletion)
 async def delete_account(current_user: UserInDB = Depends(get_current_user)):
     """
-    Delete the currently authenticated user's account.
+    Delete the currently authenticated user's account. The account is locked
+    at once; its data is removed in the background, so the response is the
+    deletion job's progress rather than a confirmation that it is gone.
     """
+    user_id_to_delete = current_user.id
+    logger.info(f"Deleting account for user ID: {user_id_to_delete}")
     try:
-        user_id_to_delete = current_user.id # Use current_user.id
-        print(f"Attempting to delete account for user ID: {user_id_to_delete}")
-
-        deleted = await AuthService.delete_user(user_id_to_delete) # Pass user_id
-        
-        if deleted:
-            await broadcast_auth_update_to_user(user_id=user_id_to_delete, is_authenticated=False) # Pass user_id
-            print(f"Successfully deleted account for user ID: {user_id_to_delete} and notified WebSocket sessions.")
-            return
-        else:
-            print(f"Account deletion failed for user ID: {user_id_to_delete} (AuthService.delete_user returned False)")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Account deletion failed unexpectedly."
-            )
-
+        deletion = await AuthService.delete_user(user_id_to_delete)
     except HTTPException as e:
-        print(f"HTTPException during account deletion for {current_user.id}: {e.detail}") # Log with current_user.id
-        raise e
+        logger.warning(f"Account deletion for {user_id_to_delete} refused: {e.detail}")
+        raise
     except Exception as e:
-        print(f"Unexpected error during account deletion for {current_user.id}: {str(e)}") # Log with current_user.id
+        logger.error(f"Unexpected error during account deletion for {user_id_to_delete}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while deleting the account."
         )
 
+    await broadcast_auth_update_to_user(user_id=user_id_to_delete, is_authenticated=False)
+    logger.info(f"Account {user_id_to_delete} queued for deletion and WebSocket sessions notified")
+    return deletion
+
+@router.get("/export")
+async def export_account_data(
+    dataset: Literal["all", "goals", "tasks"] = "all",
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    current_user: TokenUser = Depends(get_token_user)
+):
+    """
+    Download the current user's data. `all` is the profile, goals and tasks
+    as one NDJSON stream; CSV needs a single dataset.
+    """
+    if dataset == "all":
+        if export_format != "ndjson":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="CSV exports need dataset=goals or dataset=tasks"
+            )
+        content = ExportService.stream_user_data(current_user.id)
+    else:
+        content = ExportService.stream(dataset, export_format, {"user_id": current_user.id})
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{ExportService.filename(dataset, export_format)}"'}
+    )
+
 class UpdateNameRequest(BaseModel): # Corrected class definition
     name: str
 
@@ -2,16 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from services.notification_service import NotificationService
 from services.reminder_service import ReminderService
 from models.notification import PushSubscription, PushSubscriptionInDB, NotificationRequest
-from services.auth_service import get_current_user
-from models.user import UserInDB
-from typing import Optional
+from services.auth_service import get_token_user
+from models.user import TokenUser
+from typing import List, Optional
 
 router = APIRouter()
 
 @router.post("/subscribe", response_model=PushSubscriptionInDB)
 async def subscribe_to_notifications(
     subscription: PushSubscription,
-    current_user: UserInDB = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     """Subscribe user to push notifications"""
     try:
@@ -26,7 +26,7 @@ async def subscribe_to_notifications(
 
 @router.get("/subscription", response_model=Optional[PushSubscriptionInDB])
 async def get_push_subscription(
-    current_user: UserInDB = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     """Get user's push subscription"""
     try:
@@ -39,14 +39,29 @@ async def get_push_subscription(
             detail=f"Failed to get push subscription: {str(e)}"
         )
 
+@router.get("/subscriptions", response_model=List[PushSubscriptionInDB])
+async def list_push_subscriptions(
+    current_user: TokenUser = Depends(get_token_user)
+):
+    """Get all of the user's push subscriptions, one per device"""
+    try:
+        user_id = str(current_user.id)
+        return await NotificationService.get_push_subscriptions(user_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get push subscriptions: {str(e)}"
+        )
+
 @router.delete("/unsubscribe")
 async def unsubscribe_from_notifications(
-    current_user: UserInDB = Depends(get_current_user)
+    endpoint: Optional[str] = None,
+    current_user: TokenUser = Depends(get_token_user)
 ):
-    """Unsubscribe user from push notifications"""
+    """Unsubscribe one device (by endpoint) or all of the user's devices from push notifications"""
     try:
         user_id = str(current_user.id)
-        success = await NotificationService.delete_push_subscription(user_id)
+        success = await NotificationService.delete_push_subscription(user_id, endpoint)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -63,7 +78,7 @@ async def unsubscribe_from_notifications(
 
 @router.post("/send-test")
 async def send_test_notification(
-    current_user: UserInDB = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     """Send a test notification to the current user"""
     try:
@@ -94,7 +109,7 @@ async def send_test_notification(
 
 @router.post("/test-morning-reminder")
 async def test_morning_reminder(
-    current_user: UserInDB = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     """Send a test morning reminder to the current user"""
     try:
@@ -117,7 +132,7 @@ async def test_morning_reminder(
 
 @router.post("/test-evening-reminder")
 async def test_evening_reminder(
-    current_user: UserInDB = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     """Send a test evening reminder to the current user"""
     try:
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from models.user import UserInDB, UserPreferencesResponse
-from services.auth_service import get_current_user
+from models.user import TokenUser, UserPreferencesResponse
+from services.auth_service import get_token_user
 from services.preferences_service import PreferencesService
 
 router = APIRouter(prefix="/preferences", tags=["preferences"])
 
 @router.get("", response_model=UserPreferencesResponse)
-async def read_user_preferences(current_user: UserInDB = Depends(get_current_user)):
+async def read_user_preferences(current_user: TokenUser = Depends(get_token_user)):
     """
     Retrieve the current authenticated user's preferences.
     """
@@ -29,7 +29,7 @@ from models.user import UserPreferencesUpdate # Import UserPreferencesUpdate
 @router.patch("", response_model=UserPreferencesResponse)
 async def update_user_preferences_route(
     preferences_update: UserPreferencesUpdate,
-    current_user: UserInDB = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     """
     Update the current authenticated user's preferences.
@@ -2,14 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from typing import Optional
 
-from models.user import User
+from models.user import TokenUser
 from models.task import TaskCreate, Task, TaskStatus
-from services.auth_service import get_current_user
+from services.auth_service import get_token_user
 from services.task_service import (
     create_task,
     get_tasks_by_user,
     update_task,
-    delete_task
+    delete_task,
+    filter_tasks
 )
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
@@ -29,7 +30,7 @@ def get_valid_status(status_param: Optional[str] = None) -> Optional[TaskStatus]
 @router.post("/", response_model=Task, status_code=status.HTTP_201_CREATED)
 async def create_new_task(
     task: TaskCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     try:
         return await create_task(task, str(current_user.id))
@@ -45,22 +46,15 @@ async def create_new_task(
 async def list_user_tasks(
     status: Optional[TaskStatus] = Depends(get_valid_status),
     filter: Optional[str] = None,
-    current_user: User = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     tasks = await get_tasks_by_user(str(current_user.id))
-    if status:
-        tasks = [task for task in tasks if task.status == status]
-    if filter == "today":
-        from datetime import datetime, date, timezone
-        # Use UTC date for consistency with task creation
-        today = datetime.now(timezone.utc).date()
-        tasks = [task for task in tasks if task.created_at.date() == today]
-    return tasks
+    return filter_tasks(tasks, status, filter)
 
 @router.get("/{task_id}", response_model=Task)
 async def get_task(
     task_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     tasks = await get_tasks_by_user(str(current_user.id))
     task = next((t for t in tasks if t.id == task_id), None)
@@ -74,7 +68,7 @@ async def get_task(
 async def update_existing_task(
     task_id: str,
     task_update: dict,
-    current_user: User = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     try:
         updated_task = await update_task(task_id, str(current_user.id), task_update)
@@ -91,7 +85,7 @@ async def update_existing_task(
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_existing_task(
     task_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: TokenUser = Depends(get_token_user)
 ):
     if not await delete_task(task_id, str(current_user.id)):
         raise HTTPException(
@@ -1,49 +1,44 @@
-import asyncio
-import json
-from typing import Dict, List
+from typing import Dict, List, Union
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter
 from starlette import status
 import logging
 
 from services.auth_service import AuthService
+from services.websocket_bus import websocket_bus
+from services.websocket_connections import (
+    Connection, connection_registry, negotiate_subprotocol, encode_message, decode_message,
+    JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL
+)
+from services.websocket_rpc import RpcSession
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Global store for active connections: user_id (email) -> List[WebSocket]
-active_connections: Dict[str, List[WebSocket]] = {}
+def message_kind(payload: dict) -> str:
+    """Messages of the same kind replace each other in a full send queue under the coalesce policy"""
+    if payload.get("type") == "change":
+        # Only a newer event about the same document may replace an older one
+        return f"change:{payload.get('entity')}:{payload.get('id')}"
+    return payload.get("type") or "message"
 
-async def keep_alive(websocket: WebSocket, user_id: str):
-    """Periodically send ping messages to keep the connection alive."""
-    try:
-        while True:
-            await asyncio.sleep(30)  # Send ping every 30 seconds
-            await websocket.send_text("ping")
-            logger.debug(f"Sent ping to {user_id} for websocket: {websocket}")
-    except WebSocketDisconnect:
-        logger.info(f"Keep-alive for {user_id} (websocket: {websocket}) stopped due to disconnect.")
-    except Exception as e:
-        # Catching broad exception if send_text fails for other reasons (e.g. connection already closed)
-        logger.info(f"Keep-alive for {user_id} (websocket: {websocket}) stopped: {e}")
-
-async def send_to_user(user_id: str, payload: dict):
-    """Sends a JSON payload to all active WebSockets for a given user_id."""
-    if user_id in active_connections:
-        message = json.dumps(payload)
-        # Iterate over a copy of the list in case of disconnections during send
-        for connection in list(active_connections[user_id]):
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Failed to send message to {user_id} on websocket {connection}: {e}")
-                # Optionally, attempt to remove this specific dead connection here,
-                # though the main endpoint's finally block should also handle it.
-                try:
-                    active_connections[user_id].remove(connection)
-                    if not active_connections[user_id]:
-                        del active_connections[user_id]
-                except ValueError:
-                    pass # Already removed
+async def send_to_user(user_id: str, payload: dict) -> int:
+    """Queues a JSON payload on all of a user's WebSockets on this worker; returns how many took it."""
+    queued = 0
+    connections = connection_registry.for_user(user_id)
+    if connections:
+        kind = message_kind(payload)
+        # Serialized once per encoding in use, not once per socket
+        encoded: Dict[str, Union[str, bytes]] = {}
+        for connection in connections:
+            if connection.encoding not in encoded:
+                encoded[connection.encoding] = encode_message(payload, connection.encoding)
+            # Never waits on the socket, so one slow client cannot hold up the others or the caller
+            queued += connection.send(encoded[connection.encoding], kind)
+    return queued
+
+async def publish_to_user(user_id: str, payload: dict):
+    """Sends a JSON payload to all of a user's WebSockets, on whichever worker they are connected."""
+    await websocket_bus.publish(user_id, payload)
 
 async def broadcast_auth_update_to_user(user_id: str, is_authenticated: bool):
     """Sends an authentication status update to a specific user."""
@@ -52,13 +47,30 @@ async def broadcast_auth_update_to_user(user_id: str, is_authenticated: bool):
         "userId": user_id, # Or however the frontend expects this
         "authenticated": is_authenticated
     }
-    await send_to_user(user_id, payload)
+    # Sessions on other workers must be logged out too. Best-effort: callers
+    # have already revoked tokens or tombstoned the user by now, and a failed
+    # bus write must not turn that into an error response.
+    try:
+        await publish_to_user(user_id, payload)
+    except Exception as e:
+        logger.error(f"Failed to broadcast auth update for user {user_id}: {e}")
+
+async def broadcast_auth_update_to_users(user_ids: List[str], is_authenticated: bool):
+    """broadcast_auth_update_to_user() for many users with one bus write, equally best-effort"""
+    try:
+        await websocket_bus.publish_many([
+            (user_id, {"type": "auth_update", "userId": user_id, "authenticated": is_authenticated})
+            for user_id in user_ids
+        ])
+    except Exception as e:
+        logger.error(f"Failed to broadcast auth updates for {len(user_ids)} users: {e}")
 
 
 @router.websocket("/ws/{user_email}")
 async def websocket_endpoint(websocket: WebSocket, user_email: str, token: str):
     user_id_from_token: str = None
-    keep_alive_task: asyncio.Task = None
+    connection: Connection = None
+    rpc: RpcSession = None
 
     try:
         auth_service = AuthService()
@@ -79,24 +91,39 @@ async def websocket_endpoint(websocket: WebSocket, user_email: str, token: str):
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="User ID mismatch")
             return
 
-        await websocket.accept()
-        logger.info(f"WebSocket connection accepted for user: {user_id_from_token}")
+        # Clients may ask for MessagePack binary frames ("msgpack") or JSON ("json", the default)
+        subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        logger.info(f"WebSocket connection accepted for user: {user_id_from_token} (subprotocol: {subprotocol})")
+
+        # Registering also puts the socket on the shared heartbeat wheel
+        encoding = MSGPACK_SUBPROTOCOL if subprotocol == MSGPACK_SUBPROTOCOL else JSON_SUBPROTOCOL
+        connection = connection_registry.add(user_id_from_token, websocket, encoding)
 
-        if user_id_from_token not in active_connections:
-            active_connections[user_id_from_token] = []
-        active_connections[user_id_from_token].append(websocket)
-        
-        # Start keep-alive task
-        keep_alive_task = asyncio.create_task(keep_alive(websocket, user_id_from_token))
+        # Goal and task calls over this socket, authenticated by the token above
+        rpc = RpcSession(connection, token)
 
         while True:
-            data = await websocket.receive_text()
+            # Text or binary (MessagePack) frames
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+            connection.touch()
+            data = message.get("text") if message.get("text") is not None else message.get("bytes")
             if data == "pong":
                 logger.debug(f"Received pong from {user_id_from_token}")
                 continue
+            try:
+                request = decode_message(data)
+            except Exception as e:
+                logger.info(f"Ignoring undecodable message from {user_id_from_token}: {e}")
+                continue
+            if isinstance(request, dict) and request.get("type") == "rpc":
+                # Not awaited, so later calls on the socket are pipelined behind it
+                rpc.submit(request)
+                continue
             # Handle other incoming messages from this client if needed
             logger.info(f"Received message from {user_id_from_token}: {data}")
-            # Example: await send_to_user(user_id_from_token, {"echo": data})
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for user: {user_id_from_token or user_email}, reason: {websocket.client_state}")
@@ -108,15 +135,8 @@ async def websocket_endpoint(websocket: WebSocket, user_email: str, token: str):
             except Exception as close_exc:
                 logger.error(f"Error trying to close websocket for {user_id_from_token or user_email}: {close_exc}")
     finally:
-        if keep_alive_task and not keep_alive_task.done():
-            keep_alive_task.cancel()
-            logger.debug(f"Cancelled keep-alive task for {user_id_from_token or user_email} on websocket {websocket}")
-        
-        if user_id_from_token and user_id_from_token in active_connections:
-            if websocket in active_connections[user_id_from_token]:
-                active_connections[user_id_from_token].remove(websocket)
-                logger.info(f"Removed websocket {websocket} for user {user_id_from_token}")
-            if not active_connections[user_id_from_token]:
-                del active_connections[user_id_from_token]
-                logger.info(f"Removed user {user_id_from_token} from active_connections as they have no more sessions.")
+        if rpc:
+            rpc.cancel()
+        if connection and connection_registry.remove(connection):
+            logger.info(f"Removed websocket {websocket} for user {user_id_from_token}")
         logger.info(f"Finished cleanup for websocket connection: {user_id_from_token or user_email}")
\ No newline at end of file
@@ -1,53 +1,100 @@
-from typing import Optional, List
-from models.user import User
+import base64
+from collections import Counter
+from datetime import datetime
+from typing import Optional, List, Tuple
+from pymongo import ASCENDING, DESCENDING
+from config.settings import settings
+from models.user import User, BulkUserFilter, BulkUserUpdate
+from models.user_deletion import UserDeletion
 from database import get_db
 from bson import ObjectId
+from services.auth_service import account_status_cache
+from services.user_deletion_service import UserDeletionService
+from services.user_search_service import UserSearchService, user_count_cache
+
+# Only what the admin user list shows; details come from get_user_details
+USER_LIST_PROJECTION = {"email": 1, "name": 1, "role": 1}
+# What bulk operations compare against and record as the previous values
+BULK_USER_PROJECTION = {"role": 1, "disabled": 1, "language": 1, "deleted_at": 1}
+# Stored values of fields bulk updates can change, for users that never set them
+BULK_FIELD_DEFAULTS = {"role": "User", "disabled": False, "language": "en"}
+# Audit entries written per insert
+AUDIT_BATCH_SIZE = 500
 
 class AdminService:
+    @staticmethod
+    def encode_cursor(direction: str, user_id: ObjectId) -> str:
+        """Opaque page cursor: users `after` or `before` the given _id"""
+        return base64.urlsafe_b64encode(f"{direction}:{user_id}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, ObjectId]:
+        try:
+            direction, user_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+            if direction not in ("after", "before"):
+                raise ValueError(direction)
+            return direction, ObjectId(user_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+
     @staticmethod
     async def list_users(
-        page: int = 1,
         limit: int = 10,
         search_query: Optional[str] = None,
-        role_filter: Optional[str] = None
-    ) -> List[dict]:
-        skip = (page - 1) * limit
-        query = {}
-        
-        if search_query:
-            query["$or"] = [
-                {"email": {"$regex": search_query, "$options": "i"}},
-                {"name": {"$regex": search_query, "$options": "i"}}
-            ]
-            
-        if role_filter:
-            query["role"] = {"$regex": f"^{role_filter}$", "$options": "i"}
-            
+        role_filter: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> dict:
+        """
+        One page of users ordered by _id, with cursors for the pages after and
+        before it. Pages are found by _id range instead of skipping, so deep
+        pages cost the same as the first and users added or removed elsewhere
+        in the list do not shift a page's contents.
+        """
+        direction, anchor = AdminService.decode_cursor(cursor) if cursor else ("after", None)
+        forward = direction == "after"
+        query = UserSearchService.build_query(search_query, role_filter)
+        if anchor is not None:
+            query["_id"] = {"$gt": anchor} if forward else {"$lt": anchor}
+
         db = await get_db()
-        cursor = db.users.find(query, {"password": 0, "refresh_tokens": 0})
-        users = await cursor.skip(skip).limit(limit).to_list(length=limit)
-        
-        return [
-            {
-                "id": str(user["_id"]),
-                "email": user["email"],
-                "name": user.get("name"),
-                "role": user.get("role", "user"),
-                "createdAt": user.get("created_at"),
-                "preferences": user.get("preferences")
-            }
-            for user in users
-        ]
+        # One extra document tells whether there is another page in this direction
+        users = await db.users.find(query, USER_LIST_PROJECTION).sort(
+            "_id", ASCENDING if forward else DESCENDING
+        ).limit(limit + 1).to_list(length=limit + 1)
+        has_more = len(users) > limit
+        users = users[:limit]
+        if not forward:
+            users.reverse()
+            if not users:
+                # Everything before the cursor is gone; start over from the first page
+                return await AdminService.list_users(limit, search_query, role_filter)
+
+        has_next = has_more if forward else True
+        has_prev = anchor is not None if forward else has_more
+        return {
+            "users": [
+                {
+                    "id": str(user["_id"]),
+                    "email": user["email"],
+                    "name": user.get("name"),
+                    "role": user.get("role", "user"),
+                    "createdAt": user["_id"].generation_time
+                }
+                for user in users
+            ],
+            "next_cursor": AdminService.encode_cursor("after", users[-1]["_id"]) if users and has_next else None,
+            "prev_cursor": AdminService.encode_cursor("before", users[0]["_id"]) if users and has_prev else None
+        }
 
     @staticmethod
-    async def delete_user(user_id: str) -> None:
-        try:
-            db = await get_db()
-            result = await db.users.delete_one({"_id": ObjectId(user_id)})
-            if result.deleted_count == 0:
-                raise ValueError("User not found")
-        except Exception as e:
-            raise ValueError(str(e))
+    async def count_users(search_query: Optional[str] = None, role_filter: Optional[str] = None) -> int:
+        """Total users matching a filter, cached briefly per filter"""
+        return await user_count_cache.count(UserSearchService.build_query(search_query, role_filter))
+
+    @staticmethod
+    async def delete_user(user_id: str, requested_by: Optional[str] = None) -> UserDeletion:
+        """Tombstone the user and queue the removal of everything they own"""
+        return await UserDeletionService.request(user_id, requested_by=requested_by)
 
     @staticmethod
     async def get_user_details(user_id: str) -> Optional[dict]:
@@ -68,4 +115,122 @@ class AdminService:
     @staticmethod
     async def update_user(user_id: str, user_data: dict) -> None:
         db = await get_db()
-        await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": user_data})
\ No newline at end of file
+        await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": user_data})
+        if "name" in user_data or "role" in user_data:
+            await UserSearchService.refresh_search_fields(ObjectId(user_id))
+        if "role" in user_data:
+            account_status_cache.invalidate(user_id)
+
+    @staticmethod
+    async def ensure_indexes():
+        db = await get_db()
+        await db.admin_audit.create_index([("target_id", ASCENDING), ("at", DESCENDING)])
+        await db.admin_audit.create_index([("actor_id", ASCENDING), ("at", DESCENDING)])
+
+    @staticmethod
+    async def write_audit(entries: List[dict]) -> None:
+        """Append audit entries in batches of AUDIT_BATCH_SIZE"""
+        db = await get_db()
+        for start in range(0, len(entries), AUDIT_BATCH_SIZE):
+            await db.admin_audit.insert_many(entries[start:start + AUDIT_BATCH_SIZE], ordered=False)
+
+    @staticmethod
+    async def _select_for_bulk(ids: Optional[List[str]], user_filter: Optional[BulkUserFilter]) -> Tuple[List[dict], List[dict]]:
+        """
+        Users a bulk request applies to, read with one query, and results for
+        requested ids that cannot be used. Selections larger than
+        ADMIN_BULK_MAX_USERS are refused rather than partly applied.
+        """
+        db = await get_db()
+        limit = settings.ADMIN_BULK_MAX_USERS
+        if ids is not None:
+            if len(ids) > limit:
+                raise ValueError(f"At most {limit} ids per request")
+            results, user_obj_ids = [], []
+            for user_id in dict.fromkeys(ids):
+                try:
+                    user_obj_ids.append(ObjectId(user_id))
+                except Exception:
+                    results.append({"id": user_id, "status": "invalid_id"})
+            users = await db.users.find(
+                {"_id": {"$in": user_obj_ids}}, BULK_USER_PROJECTION
+            ).to_list(length=len(user_obj_ids))
+            found = {user["_id"] for user in users}
+            results.extend({"id": str(user_obj_id), "status": "not_found"}
+                           for user_obj_id in user_obj_ids if user_obj_id not in found)
+            return users, results
+
+        if not user_filter.search and not user_filter.role:
+            raise ValueError("Filter must include search or role")
+        query = UserSearchService.build_query(user_filter.search, user_filter.role)
+        users = await db.users.find(query, BULK_USER_PROJECTION).sort("_id", ASCENDING).limit(limit + 1).to_list(length=limit + 1)
+        if len(users) > limit:
+            raise ValueError(f"Filter matches more than {limit} users; narrow it down")
+        return users, []
+
+    @staticmethod
+    async def bulk_update(request: BulkUserUpdate, actor_id: str) -> dict:
+        """
+        Apply role, disabled and language changes to many users with a single
+        update_many. Users already in the requested state are reported as
+        unchanged; disabling also revokes refresh tokens.
+        """
+        changes = request.changes.model_dump(exclude_none=True)
+        if not changes:
+            raise ValueError("No changes given")
+        users, results = await AdminService._select_for_bulk(request.ids, request.filter)
+
+        now = datetime.utcnow()
+        to_update, audit = [], []
+        for user in users:
+            user_id = str(user["_id"])
+            previous = {field: user.get(field, BULK_FIELD_DEFAULTS[field]) for field in changes}
+            if "deleted_at" in user:
+                results.append({"id": user_id, "status": "deleted"})
+            elif user_id == actor_id and (changes.get("disabled") or changes.get("role", "Admin") != "Admin"):
+                results.append({"id": user_id, "status": "skipped", "detail": "Cannot demote or disable your own account"})
+            elif previous == changes:
+                results.append({"id": user_id, "status": "unchanged"})
+            else:
+                to_update.append(user["_id"])
+                results.append({"id": user_id, "status": "updated"})
+                audit.append({"actor_id": actor_id, "action": "user.update", "target_id": user_id,
+                              "changes": changes, "previous": previous, "at": now})
+
+        if to_update:
+            update = dict(changes)
+            if "role" in changes:
+                update["role_key"] = changes["role"].lower()
+            if changes.get("disabled"):
+                update["refresh_tokens"] = []
+            db = await get_db()
+            await db.users.update_many({"_id": {"$in": to_update}, "deleted_at": {"$exists": False}}, {"$set": update})
+            await AdminService.write_audit(audit)
+            if "role" in changes:
+                user_count_cache.invalidate()
+            if "role" in changes or "disabled" in changes:
+                for user_obj_id in to_update:
+                    account_status_cache.invalidate(str(user_obj_id))
+        return {"summary": dict(Counter(result["status"] for result in results)), "results": results}
+
+    @staticmethod
+    async def bulk_delete(ids: Optional[List[str]], user_filter: Optional[BulkUserFilter], actor_id: str) -> dict:
+        """Tombstone many users at once and queue their data for background removal"""
+        users, results = await AdminService._select_for_bulk(ids, user_filter)
+
+        now = datetime.utcnow()
+        to_delete, audit = [], []
+        for user in users:
+            user_id = str(user["_id"])
+            if "deleted_at" in user:
+                results.append({"id": user_id, "status": "deleted"})
+            elif user_id == actor_id:
+                results.append({"id": user_id, "status": "skipped", "detail": "Cannot delete your own account"})
+            else:
+                to_delete.append(user["_id"])
+                results.append({"id": user_id, "status": "queued"})
+                audit.append({"actor_id": actor_id, "action": "user.delete", "target_id": user_id, "at": now})
+
+        await UserDeletionService.request_many(to_delete, requested_by=actor_id)
+        await AdminService.write_audit(audit)
+        return {"summary": dict(Counter(result["status"] for result in results)), "results": results}
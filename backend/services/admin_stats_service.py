@@ -0,0 +1,183 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument
+from config.settings import settings
+from database import get_db
+from services.outbox_service import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+# The single document in `admin_stats` holding the shared snapshot
+SNAPSHOT_ID = "current"
+
+def _count(facet: List[dict]) -> int:
+    return facet[0]["count"] if facet else 0
+
+def _groups(facet: List[dict]) -> Dict[str, int]:
+    return {str(group["_id"]): group["count"] for group in facet if group["_id"] is not None}
+
+class AdminStatsService:
+    """
+    The aggregations behind /admin/stats: one $facet pipeline per collection,
+    so each collection is read once per refresh however many figures come
+    out of it.
+    """
+
+    @staticmethod
+    async def user_stats(db) -> dict:
+        result = await db.users.aggregate([
+            {"$match": {"deleted_at": None}},
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "by_role": [{"$group": {"_id": "$role_key", "count": {"$sum": 1}}}],
+                "by_language": [{"$group": {"_id": "$language", "count": {"$sum": 1}}}],
+                "notifications_enabled": [{"$match": {"notifications_enabled": True}}, {"$count": "count"}],
+            }}
+        ]).to_list(length=1)
+        facets = result[0]
+        return {
+            "total": _count(facets["total"]),
+            "by_role": _groups(facets["by_role"]),
+            "by_language": _groups(facets["by_language"]),
+            "notifications_enabled": _count(facets["notifications_enabled"]),
+        }
+
+    @staticmethod
+    async def goal_stats(db) -> dict:
+        result = await db.goals.aggregate([
+            {"$facet": {
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "active_by_category": [
+                    {"$match": {"status": "active"}},
+                    {"$group": {"_id": "$category", "count": {"$sum": 1}}}
+                ],
+            }}
+        ]).to_list(length=1)
+        facets = result[0]
+        return {
+            "total": sum(group["count"] for group in facets["by_status"]),
+            "by_status": _groups(facets["by_status"]),
+            "active_by_category": _groups(facets["active_by_category"]),
+        }
+
+    @staticmethod
+    async def task_stats(db, since: datetime) -> dict:
+        result = await db.tasks.aggregate([
+            {"$facet": {
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "created_per_day": [
+                    {"$match": {"created_at": {"$gte": since}}},
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                        "count": {"$sum": 1}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ],
+            }}
+        ]).to_list(length=1)
+        facets = result[0]
+        return {
+            "total": sum(group["count"] for group in facets["by_status"]),
+            "by_status": _groups(facets["by_status"]),
+            "created_per_day": _groups(facets["created_per_day"]),
+        }
+
+    @staticmethod
+    async def push_stats(db) -> dict:
+        result = await db.push_subscriptions.aggregate([
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "users": [{"$group": {"_id": "$user_id"}}, {"$count": "count"}],
+            }}
+        ]).to_list(length=1)
+        facets = result[0]
+        return {
+            "subscriptions": _count(facets["total"]),
+            "users_with_subscription": _count(facets["users"]),
+        }
+
+    @staticmethod
+    async def compute() -> dict:
+        db = await get_db()
+        since = datetime.utcnow() - timedelta(days=settings.ADMIN_STATS_TASK_DAYS)
+        users = await AdminStatsService.user_stats(db)
+        push = await AdminStatsService.push_stats(db)
+        push["coverage"] = round(push["users_with_subscription"] / users["total"], 4) if users["total"] else 0.0
+        return {
+            "users": users,
+            "goals": await AdminStatsService.goal_stats(db),
+            "tasks": await AdminStatsService.task_stats(db, since),
+            "push": push,
+        }
+
+
+class AdminStatsCache:
+    """
+    System statistics for admins, computed in the background.
+
+    The aggregations read whole collections, so they never run on a request.
+    The scheduler refreshes the snapshot every ADMIN_STATS_REFRESH_SECONDS and
+    stores it in `admin_stats`, which every worker reads; a worker only
+    recomputes once the shared snapshot is that old, so adding workers does
+    not multiply the aggregation load. Requests are answered from this
+    worker's copy, re-read from the shared document (one read by _id) once it
+    is a refresh interval old.
+    """
+
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self._snapshot: Optional[dict] = None
+        self._loaded_at = 0.0
+
+    async def ensure_collection(self):
+        db = await get_db()
+        await db.admin_stats.update_one(
+            {"_id": SNAPSHOT_ID},
+            {"$setOnInsert": {"started_at": datetime(1970, 1, 1), "computed_at": None, "stats": None}},
+            upsert=True
+        )
+
+    async def refresh(self, now: Optional[datetime] = None) -> bool:
+        """Recompute the shared snapshot if it is due; returns False if another worker has it covered"""
+        db = await get_db()
+        now = now or datetime.utcnow()
+        # A second of slack so ticks on this worker's own interval never skip a refresh
+        due_before = now - timedelta(seconds=max(settings.ADMIN_STATS_REFRESH_SECONDS - 1, 0))
+        claimed = await db.admin_stats.find_one_and_update(
+            {"_id": SNAPSHOT_ID, "started_at": {"$lte": due_before}},
+            {"$set": {"started_at": now, "refreshed_by": self.worker_id}},
+            return_document=ReturnDocument.AFTER
+        )
+        if claimed is None:
+            return False
+
+        started = time.perf_counter()
+        stats = await AdminStatsService.compute()
+        snapshot = {
+            "stats": stats,
+            "computed_at": datetime.utcnow(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "refreshed_by": self.worker_id
+        }
+        await db.admin_stats.update_one({"_id": SNAPSHOT_ID}, {"$set": snapshot})
+        self._snapshot = snapshot
+        self._loaded_at = time.monotonic()
+        return True
+
+    async def get(self) -> Optional[dict]:
+        """The latest snapshot, or None before the first refresh has finished"""
+        if self._snapshot is None or time.monotonic() - self._loaded_at >= settings.ADMIN_STATS_REFRESH_SECONDS:
+            db = await get_db()
+            document = await db.admin_stats.find_one(
+                {"_id": SNAPSHOT_ID}, {"stats": 1, "computed_at": 1, "duration_ms": 1, "refreshed_by": 1}
+            )
+            if document and document.get("stats") is not None:
+                document.pop("_id")
+                self._snapshot = document
+                self._loaded_at = time.monotonic()
+        return self._snapshot
+
+# Global cache instance for this worker; refreshed by the scheduler
+admin_stats_cache = AdminStatsCache()
@@ -1,5 +1,8 @@
+import logging
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from bson import ObjectId # Import ObjectId
 from jose import jwt
 from jose.exceptions import JWTError as PyJWTError
@@ -10,9 +13,13 @@ from passlib.context import CryptContext
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 from config.settings import settings
-from models.user import UserCreate, UserInDB, RefreshToken
+from models.user import UserCreate, UserInDB, RefreshToken, TokenUser
+from services.token_revocation_service import token_revocations
+from models.user_deletion import UserDeletion
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
+logger = logging.getLogger(__name__)
+
 class AuthService:
     async def verify_websocket_token(self, token: str) -> Optional[str]:
         """Verify WebSocket JWT token and return user_id (string _id) if valid"""
@@ -28,6 +35,8 @@ class AuthService:
             # Basic validation: ensure it's a non-empty string. Further validation (e.g. ObjectId format) could be added.
             if not isinstance(user_id_str, str) or not user_id_str:
                  return None
+            if await token_revocations.is_revoked(payload):
+                return None
             return user_id_str
         except PyJWTError:
             return None
@@ -35,12 +44,14 @@ class AuthService:
     @staticmethod
     async def register_user(user_data: UserCreate) -> dict:
         from database import get_db
+        from services.reminder_service import ReminderService
+        from services.user_search_service import UserSearchService, user_count_cache
         db = await get_db()
         
         print(f"Attempting to register user with email: {user_data.email}")  # Debug log
         
-        # Check if user already exists
-        existing_user = await db.users.find_one({"email": user_data.email})
+        # Check if user already exists; an account awaiting deletion no longer holds its email
+        existing_user = await db.users.find_one({"email": user_data.email, "deleted_at": {"$exists": False}})
         if existing_user:
             print(f"Registration failed - email already exists: {user_data.email}")
             raise HTTPException(
@@ -53,8 +64,10 @@ class AuthService:
         # Prepare user document for insertion.
         # UserInDB model fields will be used by Pydantic for validation if we construct UserInDB first,
         # but for direct insertion, we build a dict.
-        # MongoDB will auto-generate _id.
+        # The _id is generated here because the reminder slot is derived from it.
+        user_obj_id = ObjectId()
         user_doc_to_insert = {
+            "_id": user_obj_id,
             "email": user_data.email,
             "name": user_data.name,
             "hashed_password": hashed_password,
@@ -65,7 +78,12 @@ class AuthService:
             "evening_deadline": "10:00 PM", # Default from UserInDB
             "notifications_enabled": False, # Default from UserInDB
             "language": "en", # Default from UserInDB
-            "role": "User" # Default role for new users
+            "role": "User", # Default role for new users
+            # Derived scheduling fields used to find due reminders by index
+            **ReminderService.compute_reminder_fields("09:00 AM", "10:00 PM"),
+            "reminder_slot": ReminderService.reminder_slot(user_obj_id),
+            # Normalized keys for the indexed admin search
+            **UserSearchService.search_fields(user_data.email, user_data.name, "User")
         }
         
         print(f"Creating user document: {user_doc_to_insert}")
@@ -75,12 +93,13 @@ class AuthService:
             user_mongo_id_obj = insert_result.inserted_id
             user_id_str = str(user_mongo_id_obj)
             print(f"Insert result: {user_id_str}")
+            user_count_cache.invalidate()
         except Exception as e:
             print(f"Failed to insert user: {str(e)}")
             raise
         
         access_token = create_access_token(
-            data={"sub": user_id_str}, # Use string _id for sub
+            data={"sub": user_id_str, "role": "User"}, # Use string _id for sub
             expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         )
         refresh_token = create_refresh_token(
@@ -112,7 +131,7 @@ class AuthService:
         from database import get_db
         db = await get_db()
         
-        user_doc = await db.users.find_one({"email": email}) # Still find by email for login
+        user_doc = await db.users.find_one({"email": email, "deleted_at": {"$exists": False}}) # Still find by email for login
         if not user_doc:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -124,6 +143,12 @@ class AuthService:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
             )
+
+        if user_doc.get("disabled"):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Account is disabled"
+            )
         
         user_id_str = str(user_doc["_id"]) # Get string _id
         user_role = user_doc.get("role", "User") # Get role, default to "User"
@@ -165,6 +190,7 @@ class AuthService:
     @staticmethod
     async def update_user_name(user_id: str, new_name: str) -> dict: # Changed user_email to user_id
         from database import get_db
+        from services.user_search_service import UserSearchService
         db = await get_db()
 
         print(f"Attempting to update name for user ID: {user_id} to {new_name}")
@@ -183,7 +209,10 @@ class AuthService:
 
         result = await db.users.update_one(
             {"_id": user_obj_id},
-            {"$set": {"name": new_name}}
+            {"$set": {
+                "name": new_name,
+                **UserSearchService.search_fields(user["email"], new_name, user.get("role"))
+            }}
         )
 
         if result.modified_count == 1:
@@ -232,6 +261,8 @@ class AuthService:
             {"_id": user_obj_id},
             {"$set": {"hashed_password": new_hashed_password, "refresh_tokens": []}}
         )
+        # Access tokens issued before the change, possibly to whoever knew the old password, stop working too
+        await token_revocations.revoke_user(user_id)
 
         if result.modified_count == 1:
             print(f"Successfully changed password and cleared refresh tokens for user ID: {user_id}")
@@ -248,50 +279,19 @@ class AuthService:
             )
 
     @staticmethod
-    async def delete_user(user_id: str) -> bool: # Changed user_email to user_id
-        from database import get_db
-        db = await get_db()
+    async def delete_user(user_id: str) -> UserDeletion: # Changed user_email to user_id
+        """Tombstone the account at once; goals, tasks and other data are removed in the background"""
+        from services.user_deletion_service import UserDeletionService
 
-        print(f"Attempting to delete user with ID: {user_id}") # Debug log
         try:
-            user_obj_id = ObjectId(user_id)
-        except Exception:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID format")
-
-        user_to_delete = await db.users.find_one({"_id": user_obj_id})
-        if not user_to_delete:
-            print(f"Deletion failed - user not found: {user_id}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
-        try:
-            # Delete associated goals (user_id in goals is already string _id)
-            delete_goals_result = await db.goals.delete_many({"user_id": user_id})
-            print(f"Deleted {delete_goals_result.deleted_count} goals for user ID: {user_id}")
-
-            # Delete associated tasks (user_id in tasks is already string _id)
-            delete_tasks_result = await db.tasks.delete_many({"user_id": user_id})
-            print(f"Deleted {delete_tasks_result.deleted_count} tasks for user ID: {user_id}")
-
-            # Now delete the user document itself
-            result = await db.users.delete_one({"_id": user_obj_id})
-            if result.deleted_count == 1:
-                print(f"Successfully deleted user document for ID: {user_id}")
-                return True
-            else:
-                print(f"Deletion failed - user found but not deleted: {user_id}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to delete user account"
-                )
-        except Exception as e:
-            print(f"Error during user deletion for ID {user_id}: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="An error occurred while deleting the user account."
-            )
+            deletion = await UserDeletionService.request(user_id, requested_by=user_id)
+        except ValueError as e:
+            logger.warning(f"Deletion failed for user ID {user_id}: {e}")
+            if str(e) == "Invalid user ID format":
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        logger.info(f"User ID {user_id} tombstoned; data removal queued")
+        return deletion
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -301,11 +301,14 @@ def get_password_hash(password: str) -> str:
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=15)
+    # jti identifies the token for revocation; iat is compared with per-user revocation cut-offs,
+    # so it is taken from the same (database) clock, to the microsecond
+    to_encode.update({"exp": expire, "iat": token_revocations.now(), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -349,7 +352,7 @@ async def refresh_access_token(refresh_token: str) -> Tuple[str, str]:
 
         # Verify refresh token exists and hasn't been revoked
         user_doc = await db.users.find_one({"_id": user_obj_id}) # Query by _id
-        if not user_doc:
+        if not user_doc or "deleted_at" in user_doc or user_doc.get("disabled"):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found for refresh token"
@@ -427,6 +430,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB: # A
         )
     except PyJWTError:
         raise credentials_exception
+    if await token_revocations.is_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
     from database import get_db
     db = await get_db()
@@ -437,7 +446,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB: # A
         raise credentials_exception
         
     db_user_data = await db.users.find_one({"_id": user_obj_id})
-    if not db_user_data:
+    if not db_user_data or "deleted_at" in db_user_data or db_user_data.get("disabled"): # Deleted and disabled accounts are locked out at once
         raise credentials_exception
     
     # Prepare data for Pydantic model, ensuring 'id' is string representation of '_id'
@@ -458,4 +467,109 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB: # A
     try:
         return UserInDB(**user_data_for_pydantic)
     except Exception as e: # Catch Pydantic validation error or other issues
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+
+class AccountStatusCache:
+    """
+    Current role of active accounts, per worker, for claims-based auth.
+
+    A verified access token already says who the user is and what role they
+    had when it was issued; the only thing worth checking is whether that is
+    still true. Each user's role (or None once they are disabled or deleted)
+    is read with a small projection at most once every
+    AUTH_STATUS_CACHE_SECONDS, so a revoked account or a role change takes
+    effect within that time on other workers, and at once on the worker that
+    made the change, which invalidates the entry.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+
+    async def role(self, user_id: str) -> Optional[str]:
+        """The user's current role, or None if the account is gone, disabled or deleted"""
+        cached = self._entries.get(user_id)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < settings.AUTH_STATUS_CACHE_SECONDS:
+            return cached[0]
+
+        from database import get_db
+        db = await get_db()
+        try:
+            user = await db.users.find_one({"_id": ObjectId(user_id)}, {"role": 1, "disabled": 1, "deleted_at": 1})
+        except Exception: # Invalid ObjectId format in token sub
+            user = None
+        role = None
+        if user and not user.get("disabled") and "deleted_at" not in user:
+            role = user.get("role", "User")
+        if len(self._entries) >= settings.AUTH_STATUS_CACHE_ENTRIES:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries.pop(user_id, None)
+        self._entries[user_id] = (role, now)
+        return role
+
+    def invalidate(self, user_id: Optional[str] = None):
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+# Global cache instance for this worker
+account_status_cache = AccountStatusCache()
+
+async def get_token_user(token: str = Depends(oauth2_scheme)) -> TokenUser:
+    """
+    The caller as stated by their access token, for routes that only need the
+    user id and role. No user document is loaded; see AccountStatusCache.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        user_id_str: Optional[str] = payload.get("sub")
+        if user_id_str is None:
+            raise credentials_exception
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except PyJWTError:
+        raise credentials_exception
+    if await token_revocations.is_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    role = await account_status_cache.role(user_id_str)
+    if role is None:
+        raise credentials_exception
+    claimed_role = payload.get("role")
+    if claimed_role is not None and claimed_role.lower() != role.lower():
+        # Issued before a role change; a refresh gets a token with the current role
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token role is out of date",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return TokenUser(id=user_id_str, role=role)
+
+def require_role(*roles: str):
+    """Dependency that admits only callers whose token carries one of `roles`"""
+    allowed = {role.lower() for role in roles}
+
+    async def check_role(token_user: TokenUser = Depends(get_token_user)) -> TokenUser:
+        if token_user.role.lower() not in allowed:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"{' or '.join(roles)} access required"
+            )
+        return token_user
+
+    return check_role
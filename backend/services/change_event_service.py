@@ -0,0 +1,38 @@
+import logging
+from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from services.websocket_bus import websocket_bus
+
+logger = logging.getLogger(__name__)
+
+# Fields the server owns on goals and tasks; clients cannot write them
+SERVER_FIELDS = ("_id", "id", "user_id", "created_at", "version")
+
+def client_changes(update_data: dict) -> dict:
+    """A client's update without server-owned fields, safe to $set and to publish"""
+    return {key: value for key, value in update_data.items() if key not in SERVER_FIELDS}
+
+class ChangeEventService:
+    """
+    Publishes compact change events for a user's goals and tasks to all of
+    their open sockets, so other tabs and devices can patch their cached data
+    instead of refetching whole lists:
+
+        {"type": "change", "entity": "task", "id": "...", "op": "updated",
+         "version": 4, "fields": {"status": "completed"}}
+
+    `version` increases with every write to the document; clients ignore
+    events older than what they already have.
+    """
+
+    @staticmethod
+    async def publish(user_id: str, entity: str, entity_id: str, op: str, version: int,
+                      fields: Optional[dict] = None):
+        payload = {"type": "change", "entity": entity, "id": entity_id, "op": op, "version": version}
+        if fields:
+            payload["fields"] = jsonable_encoder(fields)
+        try:
+            await websocket_bus.publish(user_id, payload)
+        except Exception as e:
+            # The write already succeeded; clients fall back to refetching
+            logger.error(f"Failed to publish {entity} {op} event for user {user_id}: {e}")
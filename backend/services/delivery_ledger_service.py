@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from config.settings import settings
+from database import get_db
+
+class DeliveryLedgerService:
+    """
+    Records which reminders have gone out so each (user, reminder type, local day)
+    is delivered at most once, no matter how many scheduler ticks, workers or
+    restarts see the user as eligible. The unique index makes the upsert the
+    single point of truth; a TTL index expires old entries.
+    """
+
+    @staticmethod
+    async def ensure_indexes():
+        db = await get_db()
+        await db.reminder_deliveries.create_index(
+            [("user_id", ASCENDING), ("reminder_type", ASCENDING), ("local_date", ASCENDING)],
+            unique=True
+        )
+        await db.reminder_deliveries.create_index(
+            "created_at",
+            expireAfterSeconds=int(timedelta(days=settings.REMINDER_LEDGER_TTL_DAYS).total_seconds())
+        )
+
+    @staticmethod
+    async def claim(user_id: str, reminder_type: str, local_date: str, now: Optional[datetime] = None) -> bool:
+        """
+        Try to record a delivery. Returns True only for the caller that created
+        the entry; everyone else (other ticks, other workers) gets False.
+        """
+        db = await get_db()
+        key = {"user_id": user_id, "reminder_type": reminder_type, "local_date": local_date}
+        try:
+            result = await db.reminder_deliveries.update_one(
+                key,
+                {"$setOnInsert": {**key, "created_at": now or datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Two upserts raced on the unique index; the other one won
+            return False
+        return result.upserted_id is not None
+
+    @staticmethod
+    async def attach_job(user_id: str, reminder_type: str, local_date: str, job_id: str):
+        """Link a ledger entry to the outbox job that delivers it"""
+        db = await get_db()
+        await db.reminder_deliveries.update_one(
+            {"user_id": user_id, "reminder_type": reminder_type, "local_date": local_date},
+            {"$set": {"job_id": job_id}}
+        )
+
+    @staticmethod
+    async def release(user_id: str, reminder_type: str, local_date: str):
+        """Undo a claim when the reminder could not be queued, so a later tick can retry"""
+        db = await get_db()
+        await db.reminder_deliveries.delete_one(
+            {"user_id": user_id, "reminder_type": reminder_type, "local_date": local_date}
+        )
@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Literal, Optional
+from bson import ObjectId
+from config.settings import settings
+from database import get_db
+
+ExportFormat = Literal["csv", "ndjson"]
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Exported columns per dataset; `id` is the document _id
+EXPORT_FIELDS: Dict[str, List[str]] = {
+    "users": ["id", "email", "name", "role", "language", "notifications_enabled",
+              "morning_deadline", "evening_deadline", "disabled", "created_at"],
+    "goals": ["id", "user_id", "title", "description", "category", "status",
+              "target_date", "created_at", "updated_at", "completed_at"],
+    "tasks": ["id", "user_id", "goal_id", "title", "status", "created_at"],
+}
+
+_compact_json = json.JSONEncoder(separators=(",", ":"))
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _csv_safe(value):
+    """Neutralize user-written text that a spreadsheet would otherwise evaluate"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+def _row(document: dict, fields: List[str]) -> dict:
+    row = {}
+    for field in fields:
+        if field == "id":
+            row["id"] = str(document["_id"])
+        elif field == "created_at" and "created_at" not in document and isinstance(document["_id"], ObjectId):
+            # Users have no created_at; their _id records when they were inserted
+            row["created_at"] = document["_id"].generation_time.replace(tzinfo=None).isoformat()
+        else:
+            row[field] = _value(document.get(field))
+    return row
+
+class ExportService:
+    """
+    Streams a collection out as CSV or NDJSON.
+
+    Documents are read from a Motor cursor in batches of EXPORT_BATCH_SIZE,
+    with only the exported fields projected, and written into a small buffer
+    that is handed to the response every EXPORT_CHUNK_BYTES. Only one cursor
+    batch and one chunk are held at a time, so memory stays flat however
+    large the export is.
+    """
+
+    @staticmethod
+    def filename(dataset: str, export_format: ExportFormat) -> str:
+        return f"{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+
+    @staticmethod
+    async def stream(dataset: str, export_format: ExportFormat, query: Optional[dict] = None,
+                     tag: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Yield the export in chunks. `tag` adds a "type" field to NDJSON lines
+        so several datasets can share one stream.
+        """
+        fields = EXPORT_FIELDS[dataset]
+        projection = {field: 1 for field in fields if field != "id"}
+        db = await get_db()
+        cursor = db[dataset].find(query or {}, projection).sort("_id", 1).batch_size(settings.EXPORT_BATCH_SIZE)
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore") if export_format == "csv" else None
+        if writer is not None:
+            writer.writeheader()
+        async for document in cursor:
+            row = _row(document, fields)
+            if writer is not None:
+                writer.writerow({field: _csv_safe(value) for field, value in row.items()})
+            else:
+                if tag:
+                    row = {"type": tag, **row}
+                buffer.write(_compact_json.encode(row))
+                buffer.write("\n")
+            if buffer.tell() >= settings.EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    async def stream_user_data(user_id: str) -> AsyncIterator[str]:
+        """Everything a user owns as one NDJSON stream: their profile, then goals, then tasks"""
+        streams = [
+            ExportService.stream("users", "ndjson", {"_id": ObjectId(user_id)}, tag="user"),
+            ExportService.stream("goals", "ndjson", {"user_id": user_id}, tag="goal"),
+            ExportService.stream("tasks", "ndjson", {"user_id": user_id}, tag="task"),
+        ]
+        for stream in streams:
+            async for chunk in stream:
+                yield chunk
@@ -8,6 +8,7 @@ from models.goal import Goal, GoalCreate, GoalStatus
 from utils.constants import CATEGORIES
 from database import db
 from fastapi import HTTPException, status
+from services.change_event_service import ChangeEventService, client_changes
 
 class GoalService:
     def __init__(self):
@@ -23,6 +24,7 @@ class GoalService:
         goal_doc["updated_at"] = datetime.utcnow()
         # Ensure status is set if not provided, though GoalBase has a default
         goal_doc.setdefault("status", GoalStatus.ACTIVE.value)
+        goal_doc["version"] = 1
 
 
         # The Goal model includes user_id, so we can create it before insertion for validation if needed,
@@ -46,6 +48,7 @@ class GoalService:
 
 
         goal = Goal(**final_goal_data)
+        await ChangeEventService.publish(user_id, "goal", goal.id, "created", goal.version, goal.model_dump())
         return goal
 
     async def get_goal(self, goal_id: str) -> Optional[Goal]:
@@ -102,7 +105,8 @@ class GoalService:
         if not existing_goal or existing_goal.user_id != user_id:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Goal not found or not authorized")
 
-        # Category is immutable, remove it from update_data if present
+        # Category is immutable, as are the fields the server owns
+        update_data = client_changes(update_data)
         update_data.pop("category", None)
 
         # Handle completed_at based on status
@@ -130,7 +134,7 @@ class GoalService:
 
         result = await self.collection.find_one_and_update(
             {"_id": obj_goal_id}, # Use ObjectId for the query
-            {"$set": update_data},
+            {"$set": update_data, "$inc": {"version": 1}},
             return_document=ReturnDocument.AFTER
         )
         
@@ -139,7 +143,9 @@ class GoalService:
             if "_id" in result and "id" not in result:
                  result["id"] = str(result["_id"])
             # result.pop("_id", None) # Not strictly necessary
-            return Goal(**result)
+            goal = Goal(**result)
+            await ChangeEventService.publish(user_id, "goal", goal_id, "updated", goal.version, update_data)
+            return goal
         return None # Explicitly return None if no document was updated/found
 
     async def delete_goal(self, goal_id: str, user_id: str) -> bool:
@@ -157,6 +163,8 @@ class GoalService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid goal ID format for delete")
 
         result = await self.collection.delete_one({"_id": obj_goal_id}) # Use ObjectId
+        if result.deleted_count > 0:
+            await ChangeEventService.publish(user_id, "goal", goal_id, "deleted", existing_goal.version + 1)
         return result.deleted_count > 0
 
     async def _validate_category_limit(self, user_id: str, category: str):
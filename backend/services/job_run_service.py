@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING
+from config.settings import settings
+from database import get_db
+from models.job_run import JobRun, JobRunStatus
+
+logger = logging.getLogger(__name__)
+
+# The run whose DB and push time is being measured in the current task
+_current_run: ContextVar[Optional[JobRun]] = ContextVar("current_job_run", default=None)
+
+def to_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """APScheduler reports timezone-aware times; the rest of the app stores naive UTC"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+class JobRunService:
+    """Persistence for scheduler job runs in the `job_runs` collection"""
+
+    @staticmethod
+    async def ensure_indexes():
+        db = await get_db()
+        await db.job_runs.create_index([("job_id", ASCENDING), ("started_at", DESCENDING)])
+        await db.job_runs.create_index(
+            "started_at",
+            expireAfterSeconds=int(timedelta(days=settings.JOB_RUN_RETENTION_DAYS).total_seconds())
+        )
+
+    @staticmethod
+    async def save_run(run: JobRun):
+        db = await get_db()
+        await db.job_runs.insert_one(run.model_dump(mode="json") | {
+            # Keep dates as BSON dates so the TTL index and range queries work
+            "scheduled_at": run.scheduled_at,
+            "started_at": run.started_at,
+            "finished_at": run.finished_at
+        })
+
+    @staticmethod
+    async def list_runs(job_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[dict]:
+        db = await get_db()
+        query = {}
+        if job_id:
+            query["job_id"] = job_id
+        if status:
+            query["status"] = status
+        cursor = db.job_runs.find(query, {"_id": 0}).sort("started_at", DESCENDING).limit(limit)
+        return await cursor.to_list(length=limit)
+
+
+class JobRunRecorder:
+    """
+    Measures scheduler job runs and keeps the most recent ones in memory.
+
+    A run is opened with track(); while it is open, timed() and timed_iter()
+    add the time spent on database and push-service calls made anywhere in
+    the same task (or tasks it spawns) to that run. Finished runs go to a
+    bounded in-memory history and to the `job_runs` collection, and overlapping
+    or missed runs are logged as warnings.
+    """
+
+    def __init__(self):
+        self.history: deque = deque(maxlen=settings.JOB_RUN_HISTORY_SIZE)
+        self._running: Dict[str, int] = {}
+        self._scheduled: Dict[str, datetime] = {}
+
+    def note_scheduled(self, job_id: str, scheduled_at: datetime):
+        """Remember when the scheduler meant to start the run it just submitted"""
+        self._scheduled[job_id] = to_utc_naive(scheduled_at)
+
+    def record_event(self, job_id: str, status: JobRunStatus, scheduled_at: Optional[datetime], error: str):
+        """Record a run that never started (missed or skipped)"""
+        from services.outbox_service import WORKER_ID
+
+        logger.warning(f"Job {job_id} {status.value}: {error}")
+        now = datetime.utcnow()
+        scheduled_at = to_utc_naive(scheduled_at)
+        run = JobRun(
+            job_id=job_id,
+            worker_id=WORKER_ID,
+            status=status,
+            scheduled_at=scheduled_at,
+            started_at=now,
+            finished_at=now,
+            lag_ms=(now - scheduled_at).total_seconds() * 1000 if scheduled_at else None,
+            error=error,
+            overlapped=status == JobRunStatus.SKIPPED
+        )
+        self.history.append(run)
+        asyncio.ensure_future(self._save(run))
+
+    async def _save(self, run: JobRun):
+        try:
+            await JobRunService.save_run(run)
+        except Exception as e:
+            logger.error(f"Could not persist run of job {run.job_id}: {e}")
+
+    @asynccontextmanager
+    async def track(self, job_id: str, scheduled_at: Optional[datetime] = None,
+                    next_run_at: Optional[datetime] = None, record_idle: bool = True) -> AsyncIterator[JobRun]:
+        """
+        Measure one run of a job. `scheduled_at` defaults to the time the
+        scheduler submitted it for; `next_run_at` is used to detect a run that
+        is still going when the next one is due. Frequent pollers pass
+        record_idle=False so runs that found nothing to do are not recorded.
+        """
+        from services.outbox_service import WORKER_ID
+
+        started = time.perf_counter()
+        run = JobRun(job_id=job_id, worker_id=WORKER_ID)
+        run.scheduled_at = to_utc_naive(scheduled_at) or self._scheduled.pop(job_id, None)
+        if run.scheduled_at:
+            run.lag_ms = (run.started_at - run.scheduled_at).total_seconds() * 1000
+
+        if self._running.get(job_id):
+            run.overlapped = True
+            logger.warning(f"Job {job_id} started while a previous run is still in progress")
+        self._running[job_id] = self._running.get(job_id, 0) + 1
+        token = _current_run.set(run)
+
+        try:
+            yield run
+            run.status = JobRunStatus.OK
+        except Exception as e:
+            run.status = JobRunStatus.ERROR
+            run.error = str(e)
+            raise
+        finally:
+            _current_run.reset(token)
+            self._running[job_id] -= 1
+            run.finished_at = datetime.utcnow()
+            run.duration_ms = (time.perf_counter() - started) * 1000
+
+            next_run_at = to_utc_naive(next_run_at)
+            if next_run_at and run.finished_at > next_run_at:
+                run.overlapped = True
+                logger.warning(
+                    f"Job {job_id} took {run.duration_ms:.0f} ms and ran past its next scheduled run at {next_run_at}"
+                )
+
+            idle = run.status == JobRunStatus.OK and not run.overlapped and not any(run.counts.values())
+            if record_idle or not idle:
+                self.history.append(run)
+                await self._save(run)
+
+    @contextmanager
+    def timed(self, kind: str):
+        """Add the time spent in the block to the current run's `db_ms` or `push_ms`"""
+        run = _current_run.get()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if run is not None:
+                elapsed = (time.perf_counter() - started) * 1000
+                setattr(run, f"{kind}_ms", getattr(run, f"{kind}_ms") + elapsed)
+
+    async def timed_iter(self, iterator, kind: str):
+        """Iterate an async cursor, counting only the time spent waiting on it"""
+        iterator = iterator.__aiter__()
+        while True:
+            with self.timed(kind):
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield item
+
+    def recent(self, job_id: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Most recent runs first"""
+        runs = [run for run in reversed(self.history) if job_id is None or run.job_id == job_id]
+        return [run.model_dump() for run in runs[:limit]]
+
+    def summary(self) -> Dict[str, dict]:
+        """Per-job figures over the runs still in the in-memory history"""
+        summary: Dict[str, dict] = {}
+        for run in self.history:
+            job = summary.setdefault(run.job_id, {
+                "runs": 0, "errors": 0, "missed": 0, "skipped": 0, "overlapped": 0,
+                "max_lag_ms": None, "max_duration_ms": None, "last_started_at": None
+            })
+            job["runs"] += 1
+            job["errors"] += run.status == JobRunStatus.ERROR
+            job["missed"] += run.status == JobRunStatus.MISSED
+            job["skipped"] += run.status == JobRunStatus.SKIPPED
+            job["overlapped"] += run.overlapped
+            if run.lag_ms is not None:
+                job["max_lag_ms"] = max(job["max_lag_ms"] or 0, run.lag_ms)
+            if run.duration_ms is not None:
+                job["max_duration_ms"] = max(job["max_duration_ms"] or 0, run.duration_ms)
+            job["last_started_at"] = run.started_at
+        return summary
+
+# Global recorder instance shared by the scheduler and the reminder timer
+job_recorder = JobRunRecorder()
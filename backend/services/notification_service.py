@@ -1,54 +1,60 @@
-import os
+import asyncio
 from database import get_db
-from models.notification import PushSubscription, PushSubscriptionInDB, NotificationRequest
+from models.notification import PushSubscription, PushSubscriptionInDB, NotificationRequest, PushResult
 from bson import ObjectId
 from fastapi import HTTPException, status
+from pymongo import DESCENDING, ReturnDocument
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+from services.vapid_service import vapid_cache
+from services.job_run_service import job_recorder
 try:
     from pywebpush import webpush, WebPushException
 except ImportError:
     webpush = None
     WebPushException = Exception
 
+# Push services answer 404/410 once a subscription has been revoked or expired
+GONE_STATUS_CODES = (404, 410)
+
 class NotificationService:
     @staticmethod
-    async def save_push_subscription(user_id: str, subscription: PushSubscription) -> PushSubscriptionInDB:
+    async def ensure_indexes():
         db = await get_db()
-
-        # Check if user already has a subscription
-        existing = await db.push_subscriptions.find_one({"user_id": user_id})
-
-        subscription_data = {
-            "user_id": user_id,
-            "endpoint": subscription.endpoint,
-            "p256dh": subscription.p256dh,
-            "auth": subscription.auth,
-            "updated_at": datetime.utcnow()
-        }
-
-        if existing:
-            # Update existing subscription
-            await db.push_subscriptions.update_one(
-                {"user_id": user_id},
-                {"$set": subscription_data}
-            )
-            subscription_data["id"] = str(existing["_id"])
-        else:
-            # Create new subscription
-            result = await db.push_subscriptions.insert_one(subscription_data)
-            subscription_data["id"] = str(result.inserted_id)
-
-        return PushSubscriptionInDB(**subscription_data)
+        indexes = await db.push_subscriptions.index_information()
+        if not indexes.get("endpoint_1", {}).get("unique"):
+            # Before subscriptions were keyed by endpoint, one browser could be stored for several accounts
+            await NotificationService.remove_duplicate_endpoints()
+        # A subscription is identified by its endpoint; a user can have one per device
+        await db.push_subscriptions.create_index("endpoint", unique=True)
+        await db.push_subscriptions.create_index("user_id")
+        await db.push_subscriptions.create_index("last_success_at")
 
     @staticmethod
-    async def get_push_subscription(user_id: str):
+    async def remove_duplicate_endpoints() -> int:
+        """
+        One-time migration for the unique endpoint index: of the subscriptions
+        sharing an endpoint keep the most recently updated one, which belongs
+        to whoever used that browser last, and delete the others.
+        """
         db = await get_db()
-        subscription = await db.push_subscriptions.find_one({"user_id": user_id})
-
-        if not subscription:
-            return None
+        duplicates = db.push_subscriptions.aggregate([
+            {"$sort": {"updated_at": DESCENDING, "_id": DESCENDING}},
+            {"$group": {"_id": "$endpoint", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ], allowDiskUse=True)
+        removed = 0
+        async for group in duplicates:
+            result = await db.push_subscriptions.delete_many({"_id": {"$in": group["ids"][1:]}})
+            removed += result.deleted_count
+        if removed:
+            print(f"Removed {removed} push subscription(s) with a duplicate endpoint")
+        return removed
 
+    @staticmethod
+    def _to_model(subscription: dict) -> PushSubscriptionInDB:
         return PushSubscriptionInDB(
             id=str(subscription["_id"]),
             user_id=subscription["user_id"],
@@ -56,63 +62,213 @@ class NotificationService:
             p256dh=subscription["p256dh"],
             auth=subscription["auth"],
             created_at=subscription.get("created_at", datetime.utcnow()),
-            updated_at=subscription.get("updated_at", datetime.utcnow())
+            updated_at=subscription.get("updated_at", datetime.utcnow()),
+            last_success_at=subscription.get("last_success_at")
+        )
+
+    @staticmethod
+    async def save_push_subscription(user_id: str, subscription: PushSubscription) -> PushSubscriptionInDB:
+        db = await get_db()
+        now = datetime.utcnow()
+
+        # Upsert by endpoint: re-subscribing the same device refreshes its keys,
+        # a new device adds another subscription for the user.
+        saved = await db.push_subscriptions.find_one_and_update(
+            {"endpoint": subscription.endpoint},
+            {
+                "$set": {
+                    "user_id": user_id,
+                    "p256dh": subscription.p256dh,
+                    "auth": subscription.auth,
+                    "updated_at": now
+                },
+                "$setOnInsert": {"endpoint": subscription.endpoint, "created_at": now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
 
+        return NotificationService._to_model(saved)
+
+    @staticmethod
+    async def get_push_subscriptions(user_id: str) -> List[PushSubscriptionInDB]:
+        db = await get_db()
+        cursor = db.push_subscriptions.find({"user_id": user_id}).sort("updated_at", DESCENDING)
+        return [NotificationService._to_model(subscription) async for subscription in cursor]
+
+    @staticmethod
+    async def get_push_subscription(user_id: str):
+        """Most recently registered subscription for the user"""
+        subscriptions = await NotificationService.get_push_subscriptions(user_id)
+        return subscriptions[0] if subscriptions else None
+
     @staticmethod
-    async def delete_push_subscription(user_id: str) -> bool:
+    async def delete_push_subscription(user_id: str, endpoint: Optional[str] = None) -> bool:
+        """Delete one device's subscription, or all of the user's subscriptions when no endpoint is given"""
         db = await get_db()
-        result = await db.push_subscriptions.delete_one({"user_id": user_id})
+        if endpoint:
+            result = await db.push_subscriptions.delete_one({"user_id": user_id, "endpoint": endpoint})
+        else:
+            result = await db.push_subscriptions.delete_many({"user_id": user_id})
         return result.deleted_count > 0
 
+    @staticmethod
+    async def prune_stale_subscriptions(max_age_days: int) -> int:
+        """
+        Delete subscriptions that have not accepted a push in max_age_days.
+        Subscriptions that never received one are judged by when they were last saved.
+        """
+        db = await get_db()
+        cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+        result = await db.push_subscriptions.delete_many({"$or": [
+            {"last_success_at": {"$lt": cutoff}},
+            {"last_success_at": None, "updated_at": {"$lt": cutoff}}
+        ]})
+        return result.deleted_count
+
     @staticmethod
     async def send_notification(request: NotificationRequest) -> bool:
         """
         Send push notification to a user.
         Note: VAPID keys need to be configured for this to work.
         """
+        result = await NotificationService.deliver(request)
+        return result.delivered > 0
+
+    @staticmethod
+    async def deliver(request: NotificationRequest, endpoints: Optional[List[str]] = None) -> PushResult:
+        """
+        Push to all of the user's devices in parallel (or only to `endpoints`,
+        when retrying) and describe the combined outcome.
+
+        Subscriptions the push service reports as gone (404/410) are deleted.
+        429 and 5xx responses (and network errors) are marked retryable, and
+        the endpoints that need another attempt are listed in retry_endpoints.
+        """
         if webpush is None:
             print("Warning: pywebpush not installed. Install with: pip install pywebpush")
-            return False
+            return PushResult(success=False, error="pywebpush not installed")
 
-        try:
-            # Get user's push subscription
-            subscription = await NotificationService.get_push_subscription(request.user_id)
-            if not subscription:
-                print(f"No push subscription found for user {request.user_id}")
-                return False
-
-            # Prepare the subscription dict for webpush
-            webpush_subscription = {
-                "endpoint": subscription.endpoint,
-                "keys": {
-                    "p256dh": subscription.p256dh,
-                    "auth": subscription.auth
-                }
-            }
+        db = await get_db()
+        with job_recorder.timed("db"):
+            subscriptions = await NotificationService.get_push_subscriptions(request.user_id)
+        if endpoints is not None:
+            subscriptions = [s for s in subscriptions if s.endpoint in endpoints]
+        if not subscriptions:
+            print(f"No push subscription found for user {request.user_id}")
+            return PushResult(success=False, error="No push subscription")
 
-            # Prepare notification payload
-            payload = json.dumps({
-                "title": request.title,
-                "body": request.body,
-                "icon": request.icon or "/losicon.svg",
-                "badge": request.badge or "/losicon.svg",
-                "tag": request.tag or "los-reminder"
-            })
-
-            # Send the notification
-            webpush(
-                subscription_info=webpush_subscription,
-                data=payload,
-                vapid_private_key=os.getenv("VAPID_PRIVATE_KEY"),
-                vapid_claims={"sub": os.getenv("VAPID_CLAIM_EMAIL")}
+        # Prepare notification payload
+        payload = json.dumps({
+            "title": request.title,
+            "body": request.body,
+            "icon": request.icon or "/losicon.svg",
+            "badge": request.badge or "/losicon.svg",
+            "tag": request.tag or "los-reminder"
+        })
+
+        results = await asyncio.gather(*[
+            NotificationService._push(subscription, payload) for subscription in subscriptions
+        ])
+
+        delivered = [s.endpoint for s, r in zip(subscriptions, results) if r.success]
+        gone = [s.endpoint for s, r in zip(subscriptions, results) if r.status_code in GONE_STATUS_CODES]
+        failures = [(s, r) for s, r in zip(subscriptions, results) if not r.success]
+        retry = [s.endpoint for s, r in failures if r.retryable]
+
+        if delivered:
+            await db.push_subscriptions.update_many(
+                {"endpoint": {"$in": delivered}},
+                {"$set": {"last_success_at": datetime.utcnow()}}
             )
+        if gone:
+            await db.push_subscriptions.delete_many({"endpoint": {"$in": gone}})
+            print(f"Removed {len(gone)} expired push subscription(s) for user {request.user_id}")
+
+        if not failures:
+            return PushResult(success=True, status_code=results[0].status_code, delivered=len(delivered))
 
-            return True
+        first_failure = failures[0][1]
+        retry_afters = [r.retry_after for _, r in failures if r.retry_after is not None]
+        return PushResult(
+            success=not retry and bool(delivered),
+            status_code=first_failure.status_code,
+            retry_after=max(retry_afters) if retry_afters else None,
+            error=first_failure.error,
+            retryable=bool(retry),
+            retry_endpoints=retry,
+            delivered=len(delivered)
+        )
+
+    @staticmethod
+    async def _push(subscription: PushSubscriptionInDB, payload: str) -> PushResult:
+        """Send one push to one device"""
+        # Prepare the subscription dict for webpush
+        webpush_subscription = {
+            "endpoint": subscription.endpoint,
+            "keys": {
+                "p256dh": subscription.p256dh,
+                "auth": subscription.auth
+            }
+        }
+
+        if not vapid_cache.configured:
+            return PushResult(success=False, error="VAPID key not configured")
+
+        try:
+            # Signed once per push-service origin and reused until close to expiry
+            vapid_headers = vapid_cache.get_headers(subscription.endpoint)
+        except Exception as e:
+            # A bad key, claim or endpoint will not fix itself on retry
+            print(f"Error signing VAPID headers: {e}")
+            return PushResult(success=False, error=str(e))
+
+        try:
+            # webpush is a blocking HTTP call; keep it off the event loop so
+            # several devices and outbox consumers can have pushes in flight at once.
+            # Passing ready-made headers (and no claims) skips webpush's own signing.
+            with job_recorder.timed("push"):
+                response = await asyncio.to_thread(
+                    webpush,
+                    subscription_info=webpush_subscription,
+                    data=payload,
+                    headers=vapid_headers
+                )
+
+            return PushResult(success=True, status_code=getattr(response, "status_code", None), delivered=1)
 
         except WebPushException as e:
+            response = getattr(e, "response", None)
+            status_code = getattr(response, "status_code", None)
+            retry_after = None
+            if response is not None and getattr(response, "headers", None):
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
             print(f"Push notification failed: {e}")
-            return False
+            return PushResult(
+                success=False,
+                status_code=status_code,
+                retry_after=retry_after,
+                error=str(e),
+                # No response at all means the request never completed (DNS, timeout, reset)
+                retryable=status_code is None or status_code == 429 or status_code >= 500
+            )
         except Exception as e:
             print(f"Error sending notification: {e}")
-            return False
\ No newline at end of file
+            return PushResult(success=False, error=str(e), retryable=True)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as delay-seconds or an HTTP-date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
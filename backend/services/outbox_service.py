@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ASCENDING, ReturnDocument
+from config.settings import settings
+from database import get_db
+from models.notification import NotificationRequest, OutboxStatus, PushResult
+from services.notification_service import NotificationService
+from services.job_run_service import job_recorder
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class OutboxService:
+    """
+    Durable queue of outgoing push notifications stored in `notification_outbox`.
+
+    Producers enqueue jobs; consumers claim them with an atomic
+    find_one_and_update lease, send them and record the outcome. A consumer that
+    crashes mid-send simply lets its lease expire and the job is picked up again,
+    so adding consumers (in this worker or in other processes) scales throughput
+    without any coordination beyond the lease.
+    """
+
+    @staticmethod
+    async def ensure_indexes():
+        db = await get_db()
+        await db.notification_outbox.create_index(
+            [("status", ASCENDING), ("next_attempt_at", ASCENDING)]
+        )
+        await db.notification_outbox.create_index(
+            [("status", ASCENDING), ("lease_expires_at", ASCENDING)]
+        )
+        # Only sent jobs carry expires_at; dead letters are kept for inspection
+        await db.notification_outbox.create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    async def enqueue(request: NotificationRequest, now: Optional[datetime] = None) -> str:
+        """Add a notification to the outbox and return the job id"""
+        db = await get_db()
+        now = now or datetime.utcnow()
+        job = {
+            "user_id": request.user_id,
+            "payload": request.model_dump(),
+            "status": OutboxStatus.PENDING.value,
+            "attempts": 0,
+            "endpoints": None,  # None targets all of the user's devices
+            "next_attempt_at": now,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "last_error": None,
+            "last_status_code": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        result = await db.notification_outbox.insert_one(job)
+        return str(result.inserted_id)
+
+    @staticmethod
+    async def claim_job(worker_id: str, now: Optional[datetime] = None) -> Optional[dict]:
+        """
+        Atomically lease the next due job. Jobs whose lease has expired (their
+        consumer died or stalled) are eligible again until they run out of
+        attempts; dead_letter_expired() retires those.
+        """
+        db = await get_db()
+        now = now or datetime.utcnow()
+        return await db.notification_outbox.find_one_and_update(
+            {"$or": [
+                {"status": OutboxStatus.PENDING.value, "next_attempt_at": {"$lte": now}},
+                {
+                    "status": OutboxStatus.PROCESSING.value,
+                    "lease_expires_at": {"$lte": now},
+                    "attempts": {"$lt": settings.OUTBOX_MAX_ATTEMPTS}
+                }
+            ]},
+            {
+                "$set": {
+                    "status": OutboxStatus.PROCESSING.value,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+                    "updated_at": now
+                },
+                # Counting on claim means a job that keeps crashing its consumer
+                # still ends up dead-lettered instead of looping forever.
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    async def dead_letter_expired(now: Optional[datetime] = None) -> int:
+        """
+        Move jobs whose lease expired on their last allowed attempt to the
+        dead-letter state. Such a job crashed or stalled its consumer every
+        time it was claimed, so it is not leased again.
+        """
+        db = await get_db()
+        now = now or datetime.utcnow()
+        result = await db.notification_outbox.update_many(
+            {
+                "status": OutboxStatus.PROCESSING.value,
+                "lease_expires_at": {"$lte": now},
+                "attempts": {"$gte": settings.OUTBOX_MAX_ATTEMPTS}
+            },
+            {"$set": {
+                "status": OutboxStatus.DEAD.value,
+                "dead_at": now,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "last_error": "Lease expired on the final attempt",
+                "updated_at": now
+            }}
+        )
+        return result.modified_count
+
+    @staticmethod
+    def compute_backoff(attempts: int, retry_after: Optional[float] = None) -> float:
+        """Exponential backoff with full jitter, never shorter than the server's Retry-After"""
+        ceiling = min(
+            settings.OUTBOX_BACKOFF_MAX_SECONDS,
+            settings.OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+        )
+        delay = random.uniform(settings.OUTBOX_BACKOFF_BASE_SECONDS, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @staticmethod
+    async def complete_job(job: dict, worker_id: str, result: PushResult, now: Optional[datetime] = None) -> str:
+        """Record the outcome of a send and return the job's new status"""
+        db = await get_db()
+        now = now or datetime.utcnow()
+
+        if result.success:
+            new_status = OutboxStatus.SENT
+            update = {
+                "status": new_status.value,
+                "sent_at": now,
+                "expires_at": now + timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+            }
+        elif result.retryable and job["attempts"] < settings.OUTBOX_MAX_ATTEMPTS:
+            new_status = OutboxStatus.PENDING
+            delay = OutboxService.compute_backoff(job["attempts"], result.retry_after)
+            update = {
+                "status": new_status.value,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                # Devices that already accepted the push are not sent it again
+                "endpoints": result.retry_endpoints
+            }
+        else:
+            new_status = OutboxStatus.DEAD
+            update = {"status": new_status.value, "dead_at": now}
+
+        update.update({
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "last_error": result.error,
+            "last_status_code": result.status_code,
+            "updated_at": now
+        })
+
+        # Guard on the lease owner so a consumer whose lease already expired
+        # cannot overwrite the outcome recorded by the consumer that took over.
+        await db.notification_outbox.update_one(
+            {"_id": job["_id"], "lease_owner": worker_id},
+            {"$set": update}
+        )
+        return new_status.value
+
+    @staticmethod
+    async def _consume(worker_id: str, max_jobs: Optional[int], stats: dict):
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            with job_recorder.timed("db"):
+                job = await OutboxService.claim_job(worker_id)
+            if not job:
+                return
+            processed += 1
+            request = NotificationRequest(**job["payload"])
+            try:
+                result = await NotificationService.deliver(request, job.get("endpoints"))
+            except Exception as e:
+                result = PushResult(success=False, error=str(e), retryable=True)
+
+            with job_recorder.timed("db"):
+                new_status = await OutboxService.complete_job(job, worker_id, result)
+            stats[new_status] = stats.get(new_status, 0) + 1
+            if new_status == OutboxStatus.DEAD.value:
+                logger.warning(f"Notification job {job['_id']} for user {job['user_id']} moved to dead-letter: {result.error}")
+
+    @staticmethod
+    async def process_outbox(consumers: Optional[int] = None, max_jobs_per_consumer: Optional[int] = None) -> dict:
+        """
+        Drain due jobs with several concurrent consumers. Returns counts of jobs
+        by the status they ended in (sent, pending for retry, dead).
+        """
+        consumers = consumers or settings.OUTBOX_CONSUMERS
+        stats: dict = {}
+        dead = await OutboxService.dead_letter_expired()
+        if dead:
+            stats[OutboxStatus.DEAD.value] = dead
+            logger.error(f"Moved {dead} notification jobs with expired final leases to dead-letter")
+        await asyncio.gather(*[
+            OutboxService._consume(f"{WORKER_ID}:{index}", max_jobs_per_consumer, stats)
+            for index in range(consumers)
+        ])
+        return stats
@@ -0,0 +1,144 @@
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from pymongo import ASCENDING, ReturnDocument
+from config.settings import settings
+from database import get_db
+from services.reminder_service import REMINDER_SLOTS
+from services.outbox_service import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+class ReminderPartitionManager:
+    """
+    Splits reminder work across workers by hash partition (opt-in through
+    REMINDER_PARTITIONS).
+
+    Users carry a `reminder_slot` (a hash of their id); partition p of N owns a
+    contiguous range of slots. Each worker heartbeats into `reminder_workers`
+    and holds leases on partitions in `reminder_partitions`. On every heartbeat
+    it renews its leases, gives back partitions above its fair share of
+    ceil(N / live workers) and claims free or expired ones up to that share,
+    so partitions spread out when workers join and are taken over when a
+    worker stops renewing.
+    """
+
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self.owned: List[int] = []
+
+    @property
+    def enabled(self) -> bool:
+        return settings.REMINDER_PARTITIONS > 0
+
+    @staticmethod
+    def partition_slots(partition: int, partitions: int) -> Tuple[int, int]:
+        """The [start, end) slot range a partition owns"""
+        start = math.ceil(partition * REMINDER_SLOTS / partitions)
+        end = math.ceil((partition + 1) * REMINDER_SLOTS / partitions)
+        return start, end
+
+    def slot_ranges(self) -> Optional[List[Tuple[int, int]]]:
+        """
+        Slot ranges this worker should handle: None when partitioning is off
+        (handle everyone), an empty list while it owns no partition.
+        """
+        if not self.enabled:
+            return None
+        ranges: List[Tuple[int, int]] = []
+        for partition in sorted(self.owned):
+            start, end = self.partition_slots(partition, settings.REMINDER_PARTITIONS)
+            if ranges and ranges[-1][1] == start:
+                # Merge neighbouring partitions into one range
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    async def ensure_partitions(self):
+        """Create the lease documents and indexes for the configured partition count"""
+        if not self.enabled:
+            return
+        db = await get_db()
+        await db.reminder_workers.create_index(
+            "seen_at", expireAfterSeconds=settings.REMINDER_PARTITION_LEASE_SECONDS * 10
+        )
+        await db.reminder_partitions.create_index([("owner", ASCENDING), ("lease_expires_at", ASCENDING)])
+        for partition in range(settings.REMINDER_PARTITIONS):
+            await db.reminder_partitions.update_one(
+                {"_id": partition},
+                {"$setOnInsert": {"owner": None, "lease_expires_at": None}},
+                upsert=True
+            )
+        # Partitions left over from a larger partition count must not be claimed
+        await db.reminder_partitions.delete_many({"_id": {"$gte": settings.REMINDER_PARTITIONS}})
+
+    async def rebalance(self, now: Optional[datetime] = None) -> bool:
+        """Heartbeat, renew, shed and claim partition leases. Returns True if ownership changed."""
+        db = await get_db()
+        now = now or datetime.utcnow()
+        lease = timedelta(seconds=settings.REMINDER_PARTITION_LEASE_SECONDS)
+        partitions = settings.REMINDER_PARTITIONS
+        before = set(self.owned)
+
+        await db.reminder_workers.update_one(
+            {"_id": self.worker_id}, {"$set": {"seen_at": now}}, upsert=True
+        )
+        live_workers = await db.reminder_workers.count_documents({"seen_at": {"$gt": now - lease}})
+        fair_share = math.ceil(partitions / max(live_workers, 1))
+
+        # Renew what is still ours; a lease that lapsed and was taken over is lost
+        await db.reminder_partitions.update_many(
+            {"owner": self.worker_id, "lease_expires_at": {"$gt": now}},
+            {"$set": {"lease_expires_at": now + lease}}
+        )
+        owned = sorted([
+            partition["_id"] async for partition in db.reminder_partitions.find(
+                {"owner": self.worker_id, "lease_expires_at": {"$gt": now}}, {"_id": 1}
+            )
+        ])
+
+        # Give back partitions above our share so newly joined workers can take them
+        surplus = owned[fair_share:]
+        if surplus:
+            await db.reminder_partitions.update_many(
+                {"_id": {"$in": surplus}, "owner": self.worker_id},
+                {"$set": {"owner": None, "lease_expires_at": None}}
+            )
+            owned = owned[:fair_share]
+
+        while len(owned) < fair_share:
+            claimed = await db.reminder_partitions.find_one_and_update(
+                {"$or": [{"owner": None}, {"lease_expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.worker_id, "lease_expires_at": now + lease}},
+                sort=[("_id", ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not claimed:
+                break
+            owned.append(claimed["_id"])
+
+        self.owned = sorted(owned)
+        changed = set(self.owned) != before
+        if changed:
+            logger.info(
+                f"Reminder partitions for {self.worker_id}: {self.owned} "
+                f"({live_workers} live workers, fair share {fair_share})"
+            )
+        return changed
+
+    async def release_all(self):
+        """Hand back all leases on shutdown so other workers can take over immediately"""
+        if not self.enabled:
+            return
+        db = await get_db()
+        await db.reminder_partitions.update_many(
+            {"owner": self.worker_id},
+            {"$set": {"owner": None, "lease_expires_at": None}}
+        )
+        await db.reminder_workers.delete_one({"_id": self.worker_id})
+        self.owned = []
+
+# Global partition manager for this worker
+partition_manager = ReminderPartitionManager()
@@ -1,99 +1,77 @@
 from fastapi import HTTPException, status
 from bson import ObjectId # Import ObjectId
-from models.user import UserInDB, UserPreferencesResponse, UserPreferencesUpdate # Import UserPreferencesUpdate
+from pymongo import ReturnDocument
+from models.user import UserPreferencesResponse, UserPreferencesUpdate # Import UserPreferencesUpdate
 from database import get_db
+from services.reminder_service import ReminderService
+from services.reminder_timer import reminder_timer
+
+# Only the preference fields are read; never the password hash or refresh tokens
+PREFERENCES_PROJECTION = {field: 1 for field in UserPreferencesResponse.model_fields}
+# After an update the reminder timer also needs the derived reminder minutes
+UPDATED_PREFERENCES_PROJECTION = {**PREFERENCES_PROJECTION, "morning_reminder_minute": 1, "evening_reminder_minute": 1}
+
+def _user_obj_id(user_id: str) -> ObjectId:
+    try:
+        return ObjectId(user_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid user ID format"
+        )
+
+def _to_response(user_data: dict) -> UserPreferencesResponse:
+    # Fields the user never set fall back to the model defaults
+    return UserPreferencesResponse(**{
+        field: user_data[field] for field in UserPreferencesResponse.model_fields if user_data.get(field) is not None
+    })
 
 class PreferencesService:
     @staticmethod
     async def get_user_preferences(user_id: str) -> UserPreferencesResponse: # Changed user_email to user_id
         db = await get_db()
-        # Ensure user_id is a valid ObjectId string before querying
-        try:
-            user_obj_id = ObjectId(user_id)
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
-        user_data = await db.users.find_one({"_id": user_obj_id})
+        user_data = await db.users.find_one({"_id": _user_obj_id(user_id)}, PREFERENCES_PROJECTION)
         
         if not user_data:
-            # This case should ideally not happen if the user_email comes from an authenticated token
+            # This case should ideally not happen if the user_id comes from an authenticated token
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        
-        # UserInDB model now has defaults for preference fields
-        user_data_for_pydantic = {}
-        if user_data: # Ensure user_data is not None
-            for field_name in UserInDB.model_fields:
-                if field_name == "id" and "_id" in user_data:
-                    user_data_for_pydantic["id"] = str(user_data["_id"])
-                elif field_name in user_data:
-                    user_data_for_pydantic[field_name] = user_data[field_name]
-        
-        user = UserInDB(**user_data_for_pydantic)
-        
-        return UserPreferencesResponse(
-            morning_deadline=user.morning_deadline,
-            evening_deadline=user.evening_deadline,
-            notifications_enabled=user.notifications_enabled,
-            language=user.language
-        )
+        return _to_response(user_data)
 
     @staticmethod
     async def update_user_preferences(user_id: str, preferences_update: UserPreferencesUpdate) -> UserPreferencesResponse: # Changed user_email to user_id
-        db = await get_db()
-        # Ensure user_id is a valid ObjectId string before querying
-        try:
-            user_obj_id = ObjectId(user_id)
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
-        user = await db.users.find_one({"_id": user_obj_id})
-
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
-        update_data = preferences_update.dict(exclude_unset=True)
+        user_obj_id = _user_obj_id(user_id)
+        update_data = preferences_update.model_dump(exclude_unset=True)
         
         if not update_data:
             # No actual updates provided, just return current preferences
             return await PreferencesService.get_user_preferences(user_id) # Changed user_email to user_id
 
-        await db.users.update_one(
-            {"_id": user_obj_id}, # Changed to query by _id
-            {"$set": update_data}
+        # Keep the derived reminder scheduling fields in step with the deadlines, in the same write.
+        # Each reminder minute depends only on its own deadline.
+        for reminder_type in ("morning", "evening"):
+            if f"{reminder_type}_deadline" in update_data:
+                update_data[f"{reminder_type}_reminder_minute"] = ReminderService.reminder_minute(
+                    update_data[f"{reminder_type}_deadline"], reminder_type
+                )
+
+        db = await get_db()
+        updated_user_data = await db.users.find_one_and_update(
+            {"_id": user_obj_id},
+            {"$set": update_data},
+            projection=UPDATED_PREFERENCES_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
-        
-        # Fetch and return the updated user's preferences
-        updated_user_data = await db.users.find_one({"_id": user_obj_id}) # Changed to query by _id
-        # Ensure updated_user_data is not None before creating UserInDB instance
         if not updated_user_data:
-             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, # Or 500, as this should not happen if update was successful
-                detail="User data not found after update."
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
             )
-        
-        updated_user_data_for_pydantic = {}
-        if updated_user_data: # Ensure updated_user_data is not None
-            for field_name in UserInDB.model_fields:
-                if field_name == "id" and "_id" in updated_user_data:
-                    updated_user_data_for_pydantic["id"] = str(updated_user_data["_id"])
-                elif field_name in updated_user_data:
-                    updated_user_data_for_pydantic[field_name] = updated_user_data[field_name]
 
-        updated_user = UserInDB(**updated_user_data_for_pydantic)
+        # Wake the reminder timer so a new deadline fires at its exact minute
+        if {"morning_deadline", "evening_deadline", "notifications_enabled"} & update_data.keys():
+            reminder_timer.reschedule(user_id, updated_user_data)
 
-        return UserPreferencesResponse(
-            morning_deadline=updated_user.morning_deadline,
-            evening_deadline=updated_user.evening_deadline,
-            notifications_enabled=updated_user.notifications_enabled,
-            language=updated_user.language
-        )
\ No newline at end of file
+        return _to_response(updated_user_data)
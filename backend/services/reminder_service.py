@@ -1,77 +1,72 @@
-from datetime import datetime, timedelta
+import zlib
+from datetime import datetime, time, timedelta
 from services.notification_service import NotificationService
+from services.outbox_service import OutboxService
+from services.delivery_ledger_service import DeliveryLedgerService
+from services.job_run_service import job_recorder
 from models.notification import NotificationRequest
+from config.settings import settings
 from database import get_db
-from typing import List, Optional
+from pymongo import ASCENDING, UpdateOne
+from bson import ObjectId
+from typing import Iterable, List, Optional, Tuple
+
+# Reminder deadlines are entered in UTC+8 local time
+LOCAL_UTC_OFFSET = timedelta(hours=8)
+# Reminders go out this long before the user's deadline
+REMINDER_LEAD_TIME = timedelta(minutes=15)
+MINUTES_PER_DAY = 24 * 60
+REMINDER_TYPES = ("morning", "evening")
+# How many active goal titles the morning reminder lists
+MAX_GOALS_IN_REMINDER = 3
+# Users are hashed into this many slots; reminder partitions own contiguous slot ranges,
+# so the partition count can change without rewriting any user
+REMINDER_SLOTS = 1024
+
+REMINDER_TEMPLATES = {
+    "en": {
+        "morning_title": "🌅 Good Morning!",
+        "morning_body": "Time to set your tasks for today! Don't forget to plan your day ahead.",
+        "morning_goals_body": "Your active goals: {goals}. Time to set your tasks for today!",
+        "evening_title": "🌙 Good Evening!",
+        "evening_body": "Time to review your task status for today. How did you do?",
+        "evening_tasks_left_body": "{left} of {total} tasks left today. Time to review how you did!",
+        "evening_tasks_done_body": "All {total} tasks done today. Great work!",
+    },
+    "zh": {
+        "morning_title": "🌅 早上好！",
+        "morning_body": "该为今天设置任务了！别忘了提前规划你的一天。",
+        "morning_goals_body": "你的进行中目标：{goals}。来设置今天的任务吧！",
+        "evening_title": "🌙 晚上好！",
+        "evening_body": "该回顾今天的任务状态了。今天表现如何？",
+        "evening_tasks_left_body": "今天还有 {left}/{total} 个任务未完成，来回顾一下吧！",
+        "evening_tasks_done_body": "今天的 {total} 个任务全部完成，干得漂亮！",
+    },
+}
 
 class ReminderService:
     @staticmethod
-    async def get_users_for_reminder(reminder_type: str) -> List[str]:
-        """
-        Get list of user IDs who should receive a reminder notification.
-        reminder_type: 'morning' or 'evening'
-        """
+    async def ensure_indexes():
         db = await get_db()
-
-        # Build query for users with notifications enabled and valid deadlines
-        query: dict = {
-            "notifications_enabled": True
-        }
-
-        if reminder_type == "morning":
-            query["morning_deadline"] = {"$exists": True, "$ne": None}
-        elif reminder_type == "evening":
-            query["evening_deadline"] = {"$exists": True, "$ne": None}
-        else:
-            return []
-
-        # Get users with valid deadline preferences
-        users = await db.users.find(query).to_list(None)
-
-        current_time = datetime.utcnow()
-        eligible_users = []
-
-        for user in users:
-            deadline_time = None
-
-            if reminder_type == "morning":
-                deadline_time = await ReminderService.parse_deadline_time(user.get("morning_deadline"))
-            elif reminder_type == "evening":
-                deadline_time = await ReminderService.parse_deadline_time(user.get("evening_deadline"))
-
-            if deadline_time:
-                # Validate that morning deadlines are before noon and evening deadlines are after noon
-                if reminder_type == "morning" and deadline_time.hour >= 12:
-                    continue
-                elif reminder_type == "evening" and deadline_time.hour < 12:
-                    continue
-
-                # Check if current time is within 15 minutes before the deadline
-                reminder_time = deadline_time - timedelta(minutes=15)
-
-                # Handle case where reminder time is on the next day (e.g., evening deadline at 10 PM, reminder at 9:45 PM same day)
-                if reminder_time.date() == current_time.date() or (
-                    reminder_time.date() > current_time.date() and
-                    abs((reminder_time - current_time).total_seconds()) < 900  # Within 15 minutes
-                ):
-                    time_diff = abs((reminder_time - current_time).total_seconds())
-                    if time_diff <= 900:  # Within 15 minutes window
-                        eligible_users.append(user["_id"])
-
-        return [str(user_id) for user_id in eligible_users]
+        for reminder_type in REMINDER_TYPES:
+            await db.users.create_index([
+                ("notifications_enabled", ASCENDING),
+                (f"{reminder_type}_reminder_minute", ASCENDING),
+                ("reminder_slot", ASCENDING)
+            ])
+        # Used by the per-user lookups in the due-reminders pipeline
+        await db.tasks.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)])
+        await db.goals.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
 
     @staticmethod
-    async def parse_deadline_time(deadline_str: Optional[str]) -> Optional[datetime]:
+    def parse_deadline(deadline_str: Optional[str]) -> Optional[time]:
         """
-        Parse deadline string like '09:00 AM' or '10:00 PM' into datetime object
+        Parse deadline string like '09:00 AM' or '10:00 PM' into a local time of day
         """
         if not deadline_str:
             return None
 
         try:
-            # Handle AM/PM format
-            current_date = datetime.utcnow().date()
-
             # Simple parsing for HH:MM AM/PM format
             parts = deadline_str.strip().split()
             if len(parts) != 2:
@@ -91,67 +86,272 @@ class ReminderService:
             elif ampm.upper() == 'AM' and hour == 12:
                 hour = 0
 
-            # Create datetime object for today
-            deadline = datetime.combine(current_date, datetime.min.time())
-            deadline = deadline.replace(hour=hour, minute=minute)
+            return time(hour=hour, minute=minute)
 
-            # Adjust for UTC+8 timezone (user local time to UTC)
-            deadline = deadline - timedelta(hours=8)
+        except (ValueError, IndexError):
+            return None
 
-            return deadline
+    @staticmethod
+    def reminder_minute(deadline_str: Optional[str], reminder_type: str) -> Optional[int]:
+        """
+        Minute of the UTC day at which the reminder for this deadline is due,
+        or None if the deadline is missing or invalid for the reminder type.
+        """
+        deadline = ReminderService.parse_deadline(deadline_str)
+        if deadline is None:
+            return None
 
-        except (ValueError, IndexError):
+        # Morning deadlines must be before noon and evening deadlines after noon (local time)
+        if reminder_type == "morning" and deadline.hour >= 12:
             return None
+        if reminder_type == "evening" and deadline.hour < 12:
+            return None
+
+        local_minute = deadline.hour * 60 + deadline.minute
+        offset = (REMINDER_LEAD_TIME + LOCAL_UTC_OFFSET).total_seconds() // 60
+        return int(local_minute - offset) % MINUTES_PER_DAY
 
     @staticmethod
-    async def send_morning_reminders():
-        """Send morning reminders to all eligible users"""
-        try:
-            user_ids = await ReminderService.get_users_for_reminder("morning")
-
-            for user_id in user_ids:
-                request = NotificationRequest(
-                    user_id=user_id,
-                    title="🌅 Good Morning!",
-                    body="Time to set your tasks for today! Don't forget to plan your day ahead.",
-                    icon="/losicon.svg",
-                    badge="/losicon.svg",
-                    tag="morning-reminder"
-                )
-
-                success = await NotificationService.send_notification(request)
-                if success:
-                    print(f"Morning reminder sent to user {user_id}")
-                else:
-                    print(f"Failed to send morning reminder to user {user_id}")
+    def compute_reminder_fields(morning_deadline: Optional[str], evening_deadline: Optional[str]) -> dict:
+        """Derived scheduling fields stored on the user so due reminders can be found by index"""
+        return {
+            "morning_reminder_minute": ReminderService.reminder_minute(morning_deadline, "morning"),
+            "evening_reminder_minute": ReminderService.reminder_minute(evening_deadline, "evening")
+        }
 
-        except Exception as e:
-            print(f"Error sending morning reminders: {e}")
+    @staticmethod
+    def reminder_slot(user_id) -> int:
+        """Stable hash slot of a user, used to split reminder work into partitions"""
+        return zlib.crc32(str(user_id).encode()) % REMINDER_SLOTS
 
     @staticmethod
-    async def send_evening_reminders():
-        """Send evening reminders to all eligible users"""
+    async def backfill_reminder_fields(batch_size: int = 500) -> int:
+        """Compute scheduling fields for users created before they existed"""
+        db = await get_db()
+        cursor = db.users.find(
+            {"$or": [{"morning_reminder_minute": {"$exists": False}}, {"reminder_slot": {"$exists": False}}]},
+            {"morning_deadline": 1, "evening_deadline": 1}
+        )
+        updated = 0
+        batch = []
+        async for user in cursor:
+            fields = ReminderService.compute_reminder_fields(user.get("morning_deadline"), user.get("evening_deadline"))
+            fields["reminder_slot"] = ReminderService.reminder_slot(user["_id"])
+            batch.append(UpdateOne({"_id": user["_id"]}, {"$set": fields}))
+            if len(batch) >= batch_size:
+                await db.users.bulk_write(batch, ordered=False)
+                updated += len(batch)
+                batch = []
+        if batch:
+            await db.users.bulk_write(batch, ordered=False)
+            updated += len(batch)
+        return updated
+
+    @staticmethod
+    def slot_match(slot_ranges: Optional[List[Tuple[int, int]]]) -> dict:
+        """Query clause restricting users to the given [start, end) reminder slot ranges"""
+        if slot_ranges is None:
+            return {}
+        return {"$or": [{"reminder_slot": {"$gte": start, "$lt": end}} for start, end in slot_ranges]}
+
+    @staticmethod
+    def local_date(now: Optional[datetime] = None) -> str:
+        """The user's local calendar day (ISO format) for a UTC instant"""
+        return ((now or datetime.utcnow()) + LOCAL_UTC_OFFSET).date().isoformat()
+
+    @staticmethod
+    def due_minutes(now: datetime, lookback_minutes: int) -> List[int]:
+        """UTC minutes of the day whose reminders are due at `now`, newest first"""
+        current = now.hour * 60 + now.minute
+        return [(current - offset) % MINUTES_PER_DAY for offset in range(lookback_minutes)]
+
+    @staticmethod
+    def reminder_instant(minute: int, now: datetime) -> datetime:
+        """The most recent UTC instant at or before `now` falling on the given minute of the day"""
+        instant = now.replace(hour=minute // 60, minute=minute % 60, second=0, microsecond=0)
+        if instant > now:
+            instant -= timedelta(days=1)
+        return instant
+
+    @staticmethod
+    def build_due_reminders_pipeline(reminder_types: Iterable[str], minutes: List[int], now: datetime,
+                                     user_ids: Optional[List[str]] = None,
+                                     slot_ranges: Optional[List[Tuple[int, int]]] = None) -> list:
+        """
+        One aggregation that finds every user with a reminder due and joins in
+        what the reminder text needs: today's task counts for evening reminders
+        and active goal titles for morning reminders. `user_ids` narrows it to
+        the users a timer fired for, `slot_ranges` to this worker's partitions.
+        """
+        local_day = (now + LOCAL_UTC_OFFSET).date()
+        day_start = datetime.combine(local_day, time()) - LOCAL_UTC_OFFSET
+        day_end = day_start + timedelta(days=1)
+
+        user_match = {
+            "notifications_enabled": True,
+            "$or": [{f"{reminder_type}_reminder_minute": {"$in": minutes}} for reminder_type in reminder_types]
+        }
+        if user_ids is not None:
+            user_match["_id"] = {"$in": [ObjectId(user_id) for user_id in user_ids]}
+        if slot_ranges is not None:
+            user_match["$and"] = [ReminderService.slot_match(slot_ranges)]
+
+        pipeline = [
+            {"$match": user_match},
+            {"$project": {
+                "language": 1,
+                "morning_reminder_minute": 1,
+                "evening_reminder_minute": 1,
+                "uid": {"$toString": "$_id"}
+            }},
+            # Users without any device would only produce dead-letter jobs
+            {"$lookup": {
+                "from": "push_subscriptions",
+                "let": {"uid": "$uid"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$user_id", "$$uid"]}}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}}
+                ],
+                "as": "devices"
+            }},
+            {"$match": {"devices": {"$ne": []}}}
+        ]
+
+        if "evening" in reminder_types:
+            pipeline.append({"$lookup": {
+                "from": "tasks",
+                "let": {"uid": "$uid", "due": {"$in": ["$evening_reminder_minute", minutes]}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        "$$due",
+                        {"$eq": ["$user_id", "$$uid"]},
+                        {"$gte": ["$created_at", day_start]},
+                        {"$lt": ["$created_at", day_end]}
+                    ]}}},
+                    {"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}}
+                    }}
+                ],
+                "as": "task_counts"
+            }})
+
+        if "morning" in reminder_types:
+            pipeline.append({"$lookup": {
+                "from": "goals",
+                "let": {"uid": "$uid", "due": {"$in": ["$morning_reminder_minute", minutes]}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        "$$due",
+                        {"$eq": ["$user_id", "$$uid"]},
+                        {"$eq": ["$status", "active"]}
+                    ]}}},
+                    {"$sort": {"created_at": 1}},
+                    {"$limit": MAX_GOALS_IN_REMINDER},
+                    {"$project": {"_id": 0, "title": 1}}
+                ],
+                "as": "active_goals"
+            }})
+
+        return pipeline
+
+    @staticmethod
+    def build_reminder_request(user: dict, reminder_type: str) -> NotificationRequest:
+        """Localized reminder text for one row of the due-reminders pipeline"""
+        templates = REMINDER_TEMPLATES.get(user.get("language") or "en", REMINDER_TEMPLATES["en"])
+
+        if reminder_type == "morning":
+            goals = [goal["title"] for goal in user.get("active_goals", [])]
+            if goals:
+                body = templates["morning_goals_body"].format(goals=", ".join(goals))
+            else:
+                body = templates["morning_body"]
+        else:
+            counts = (user.get("task_counts") or [{}])[0]
+            total = counts.get("total", 0)
+            left = total - counts.get("completed", 0)
+            if not total:
+                body = templates["evening_body"]
+            elif left:
+                body = templates["evening_tasks_left_body"].format(left=left, total=total)
+            else:
+                body = templates["evening_tasks_done_body"].format(total=total)
+
+        return NotificationRequest(
+            user_id=user["uid"],
+            title=templates[f"{reminder_type}_title"],
+            body=body,
+            icon="/losicon.svg",
+            badge="/losicon.svg",
+            tag=f"{reminder_type}-reminder"
+        )
+
+    @staticmethod
+    async def queue_reminder(request: NotificationRequest, reminder_type: str,
+                             local_date: Optional[str] = None, now: Optional[datetime] = None) -> bool:
+        """
+        Queue a reminder unless this user already got this reminder type on
+        that local day. Returns True if a new reminder was queued.
+        """
+        local_date = local_date or ReminderService.local_date(now)
+        if not await DeliveryLedgerService.claim(request.user_id, reminder_type, local_date, now):
+            return False
+
         try:
-            user_ids = await ReminderService.get_users_for_reminder("evening")
-
-            for user_id in user_ids:
-                request = NotificationRequest(
-                    user_id=user_id,
-                    title="🌙 Good Evening!",
-                    body="Time to review your task status for today. How did you do?",
-                    icon="/losicon.svg",
-                    badge="/losicon.svg",
-                    tag="evening-reminder"
-                )
-
-                success = await NotificationService.send_notification(request)
-                if success:
-                    print(f"Evening reminder sent to user {user_id}")
-                else:
-                    print(f"Failed to send evening reminder to user {user_id}")
+            job_id = await OutboxService.enqueue(request, now)
+        except Exception:
+            await DeliveryLedgerService.release(request.user_id, reminder_type, local_date)
+            raise
 
-        except Exception as e:
-            print(f"Error sending evening reminders: {e}")
+        await DeliveryLedgerService.attach_job(request.user_id, reminder_type, local_date, job_id)
+        return True
+
+    @staticmethod
+    async def send_due_reminders(reminder_types: Iterable[str] = REMINDER_TYPES, now: Optional[datetime] = None,
+                                 user_ids: Optional[List[str]] = None,
+                                 slot_ranges: Optional[List[Tuple[int, int]]] = None) -> dict:
+        """
+        Queue every reminder that has come due within the lookback window
+        (only for `user_ids` and within `slot_ranges`, when given). Users are streamed from a single
+        aggregation straight into the outbox; the delivery ledger drops those
+        already reminded today, so overlapping windows between ticks, timers
+        and workers never cause duplicates.
+        """
+        db = await get_db()
+        now = now or datetime.utcnow()
+        reminder_types = tuple(reminder_types)
+        minutes = ReminderService.due_minutes(now, settings.REMINDER_LOOKBACK_MINUTES)
+        due = set(minutes)
+        stats = {"eligible": 0, "queued": 0, "skipped": 0, "failed": 0}
+        if slot_ranges == []:
+            # Partitioned mode and this worker currently owns no partition
+            return stats
+
+        pipeline = ReminderService.build_due_reminders_pipeline(reminder_types, minutes, now, user_ids, slot_ranges)
+        async for user in job_recorder.timed_iter(db.users.aggregate(pipeline), "db"):
+            for reminder_type in reminder_types:
+                minute = user.get(f"{reminder_type}_reminder_minute")
+                if minute not in due:
+                    continue
+                stats["eligible"] += 1
+                try:
+                    request = ReminderService.build_reminder_request(user, reminder_type)
+                    local_date = ReminderService.local_date(ReminderService.reminder_instant(minute, now))
+                    with job_recorder.timed("db"):
+                        queued = await ReminderService.queue_reminder(request, reminder_type, local_date, now)
+                    if queued:
+                        stats["queued"] += 1
+                        print(f"{reminder_type.capitalize()} reminder queued for user {user['uid']}")
+                    else:
+                        stats["skipped"] += 1
+                except Exception as e:
+                    # One bad user must not cost everyone after them their reminder
+                    stats["failed"] += 1
+                    print(f"Error queueing {reminder_type} reminder for user {user['uid']}: {e}")
+
+        return stats
 
     @staticmethod
     async def send_test_reminder(user_id: str, reminder_type: str = "morning"):
@@ -178,4 +378,4 @@ class ReminderService:
 
         except Exception as e:
             print(f"Error sending test reminder: {e}")
-            return False
\ No newline at end of file
+            return False
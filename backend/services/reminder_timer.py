@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from config.settings import settings
+from database import get_db
+from services.reminder_service import ReminderService, REMINDER_TYPES, MINUTES_PER_DAY
+from services.outbox_service import OutboxService
+from services.job_run_service import job_recorder
+from services.partition_service import partition_manager
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on one sleep, so a wall-clock jump can never stall the timer for long
+MAX_SLEEP_SECONDS = 60
+# Users passed to one due-reminders aggregation when many fire in the same minute
+FIRE_BATCH_SIZE = 1000
+# Pause before retrying after the loop itself failed (e.g. the database is unreachable)
+ERROR_BACKOFF_SECONDS = 30
+
+class ReminderTimer:
+    """
+    Fires reminders at their exact minute from a min-heap of upcoming instants.
+
+    Upcoming reminders are loaded lazily, one window of
+    REMINDER_TIMER_WINDOW_MINUTES at a time, through the reminder-minute
+    indexes, so memory grows with the reminders due soon rather than with the
+    number of users. Between reminders the loop sleeps until the earliest
+    instant in the heap.
+
+    Heap entries are never edited in place. A preference change pushes a fresh
+    entry and wakes the loop; the old entry goes stale but is harmless, because
+    firing re-checks the user's stored reminder minute and the delivery ledger
+    turns a second fire into a no-op. The cron sweep in SchedulerService stays
+    in place as a fallback for anything the timer misses.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        self._window_start: Optional[datetime] = None
+        self._window_end: Optional[datetime] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the timer loop on the running event loop"""
+        if not self.running:
+            self._window_end = None
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Cancel the timer loop"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._heap.clear()
+
+    def reload(self):
+        """Reload the current window, e.g. after this worker's partitions changed"""
+        self._window_end = None
+        self._wake.set()
+
+    def reschedule(self, user_id: str, user: dict):
+        """
+        Schedule a user's reminders again after their preferences changed.
+        `user` is the stored user document with the derived reminder minutes.
+        """
+        if not self.running or self._window_start is None or not user.get("notifications_enabled"):
+            return
+
+        for reminder_type in REMINDER_TYPES:
+            instant = self._instant_in_window(user.get(f"{reminder_type}_reminder_minute"))
+            if instant is not None:
+                heapq.heappush(self._heap, (instant, user_id))
+        # Let the loop recompute how long to sleep
+        self._wake.set()
+
+    def _instant_in_window(self, minute: Optional[int]) -> Optional[datetime]:
+        """The instant in the loaded window that falls on a UTC minute of the day, if any"""
+        if minute is None:
+            return None
+        start_minute = self._window_start.hour * 60 + self._window_start.minute
+        instant = self._window_start + timedelta(minutes=(minute - start_minute) % MINUTES_PER_DAY)
+        return instant if instant < self._window_end else None
+
+    async def _load_window(self, now: datetime):
+        """Replace the heap with the reminders due from this minute to the end of the window"""
+        db = await get_db()
+        window_start = now.replace(second=0, microsecond=0)
+        window_minutes = settings.REMINDER_TIMER_WINDOW_MINUTES
+        start_minute = window_start.hour * 60 + window_start.minute
+        minutes = [(start_minute + offset) % MINUTES_PER_DAY for offset in range(window_minutes)]
+
+        self._window_start = window_start
+        self._window_end = window_start + timedelta(minutes=window_minutes)
+        heap = []
+        slot_ranges = partition_manager.slot_ranges()
+        if slot_ranges == []:
+            # Partitioned mode and this worker currently owns no partition
+            self._heap = heap
+            return
+
+        query = {
+            "notifications_enabled": True,
+            "$or": [{f"{reminder_type}_reminder_minute": {"$in": minutes}} for reminder_type in REMINDER_TYPES]
+        }
+        if slot_ranges is not None:
+            query["$and"] = [ReminderService.slot_match(slot_ranges)]
+        cursor = db.users.find(query, {f"{reminder_type}_reminder_minute": 1 for reminder_type in REMINDER_TYPES})
+        async for user in cursor:
+            for reminder_type in REMINDER_TYPES:
+                instant = self._instant_in_window(user.get(f"{reminder_type}_reminder_minute"))
+                if instant is not None:
+                    heap.append((instant, str(user["_id"])))
+        heapq.heapify(heap)
+        self._heap = heap
+        logger.info(f"Reminder timer loaded {len(heap)} reminders due before {self._window_end}")
+
+    async def _fire_due(self, now: datetime):
+        """Queue and deliver the reminders of everyone whose instant has arrived"""
+        scheduled_at = self._heap[0][0]
+        user_ids = set()
+        while self._heap and self._heap[0][0] <= now:
+            user_ids.add(heapq.heappop(self._heap)[1])
+
+        user_ids = sorted(user_ids)
+        async with job_recorder.track("reminder_timer", scheduled_at=scheduled_at) as run:
+            for offset in range(0, len(user_ids), FIRE_BATCH_SIZE):
+                stats = await ReminderService.send_due_reminders(
+                    now=now,
+                    user_ids=user_ids[offset:offset + FIRE_BATCH_SIZE],
+                    slot_ranges=partition_manager.slot_ranges()
+                )
+                for key, value in stats.items():
+                    run.counts[key] = run.counts.get(key, 0) + value
+            outbox_stats = await OutboxService.process_outbox()
+            run.counts.update({f"outbox_{key}": value for key, value in outbox_stats.items()})
+        logger.info(f"Reminder timer fired: {run.counts}")
+
+    async def _sleep_until(self, wake_at: datetime):
+        delay = (wake_at - datetime.utcnow()).total_seconds()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=min(max(delay, 0), MAX_SLEEP_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                now = datetime.utcnow()
+                if self._window_end is None or now >= self._window_end:
+                    await self._load_window(now)
+                if self._heap and self._heap[0][0] <= now:
+                    await self._fire_due(now)
+                    continue
+                await self._sleep_until(self._heap[0][0] if self._heap else self._window_end)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in reminder timer: {e}")
+                await asyncio.sleep(ERROR_BACKOFF_SECONDS)
+
+# Global timer instance, started with the scheduler
+reminder_timer = ReminderTimer()
@@ -1,6 +1,17 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from config.settings import settings
 from services.reminder_service import ReminderService
+from services.outbox_service import OutboxService
+from services.notification_service import NotificationService
+from services.reminder_timer import reminder_timer
+from services.job_run_service import job_recorder
+from services.partition_service import partition_manager
+from services.user_deletion_service import UserDeletionService
+from services.admin_stats_service import admin_stats_cache
+from models.job_run import JobRunStatus
 from datetime import datetime
 import logging
 
@@ -9,53 +20,174 @@ logger = logging.getLogger(__name__)
 class SchedulerService:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_listener(
+            self._on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
+        )
         self._setup_jobs()
 
+    def _on_job_event(self, event):
+        """Feed scheduled run times, misfires and overlaps into the job-run metrics"""
+        scheduled_at = event.scheduled_run_times[-1] if getattr(event, "scheduled_run_times", None) else \
+            getattr(event, "scheduled_run_time", None)
+        if event.code == EVENT_JOB_SUBMITTED:
+            job_recorder.note_scheduled(event.job_id, scheduled_at)
+        elif event.code == EVENT_JOB_MISSED:
+            job_recorder.record_event(
+                event.job_id, JobRunStatus.MISSED, scheduled_at, "Run missed its misfire grace time"
+            )
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            job_recorder.record_event(
+                event.job_id, JobRunStatus.SKIPPED, scheduled_at, "Previous run was still in progress"
+            )
+
+    def _next_run_time(self, job_id: str):
+        job = self.scheduler.get_job(job_id)
+        # Jobs added before the scheduler started have no run time yet
+        return getattr(job, "next_run_time", None)
+
     def _setup_jobs(self):
         """Setup scheduled jobs for daily reminders"""
 
-        # Check for reminders every 5 minutes - allows for individual user deadline times
+        # Sweep for due reminders every few minutes. The reminder timer fires them at
+        # their exact minute; this poll is the safety net for anything it missed.
         self.scheduler.add_job(
             func=self._check_and_send_reminders,
-            trigger=CronTrigger(minute="*/5"),  # Every 5 minutes
+            trigger=CronTrigger(minute=f"*/{settings.REMINDER_FALLBACK_POLL_MINUTES}"),
             id='reminder_checker',
             name='Reminder Checker',
             replace_existing=True
         )
 
-    async def _run_morning_reminders(self):
-        """Run morning reminder job"""
-        try:
-            logger.info("Running morning reminders job")
-            await ReminderService.send_morning_reminders()
-            logger.info("Morning reminders job completed")
-        except Exception as e:
-            logger.error(f"Error in morning reminders job: {e}")
+        # Drain the notification outbox, including retries that have come due
+        self.scheduler.add_job(
+            func=self._dispatch_outbox,
+            trigger=IntervalTrigger(seconds=settings.OUTBOX_POLL_SECONDS),
+            id='outbox_dispatcher',
+            name='Notification Outbox Dispatcher',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
 
-    async def _run_evening_reminders(self):
-        """Run evening reminder job"""
-        try:
-            logger.info("Running evening reminders job")
-            await ReminderService.send_evening_reminders()
-            logger.info("Evening reminders job completed")
-        except Exception as e:
-            logger.error(f"Error in evening reminders job: {e}")
+        # Remove the data of tombstoned users in throttled batches
+        self.scheduler.add_job(
+            func=self._process_user_deletions,
+            trigger=IntervalTrigger(seconds=settings.USER_DELETION_POLL_SECONDS),
+            id='user_deletion_worker',
+            name='User Deletion Worker',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+
+        # Hold this worker's share of the reminder partitions, starting right away
+        if partition_manager.enabled:
+            self.scheduler.add_job(
+                func=self._rebalance_partitions,
+                trigger=IntervalTrigger(seconds=max(settings.REMINDER_PARTITION_LEASE_SECONDS // 3, 1)),
+                id='partition_rebalancer',
+                name='Reminder Partition Rebalancer',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+                next_run_time=datetime.now()
+            )
+
+        # Recompute the admin statistics off the request path, starting right away
+        self.scheduler.add_job(
+            func=self._refresh_admin_stats,
+            trigger=IntervalTrigger(seconds=settings.ADMIN_STATS_REFRESH_SECONDS),
+            id='admin_stats_refresher',
+            name='Admin Statistics Refresher',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            next_run_time=datetime.now()
+        )
+
+        # Garbage-collect push subscriptions that have stopped accepting pushes
+        self.scheduler.add_job(
+            func=self._prune_push_subscriptions,
+            trigger=CronTrigger(hour=3, minute=30),
+            id='push_subscription_pruner',
+            name='Push Subscription Pruner',
+            replace_existing=True
+        )
 
     async def _check_and_send_reminders(self):
         """Check for and send reminders to users whose deadline is approaching"""
         try:
             logger.info("Checking for reminder notifications")
-            # Check both morning and evening reminders
-            await ReminderService.send_morning_reminders()
-            await ReminderService.send_evening_reminders()
-            logger.info("Reminder check completed")
+            async with job_recorder.track("reminder_checker", next_run_at=self._next_run_time("reminder_checker")) as run:
+                # Check both morning and evening reminders with one query
+                run.counts.update(await ReminderService.send_due_reminders(
+                    slot_ranges=partition_manager.slot_ranges()
+                ))
+                # Deliver the reminders just queued without waiting for the next dispatcher tick
+                outbox_stats = await OutboxService.process_outbox()
+                run.counts.update({f"outbox_{key}": value for key, value in outbox_stats.items()})
+            logger.info(f"Reminder check completed: {run.counts}")
         except Exception as e:
             logger.error(f"Error in reminder check: {e}")
 
+    async def _dispatch_outbox(self):
+        """Send due notifications from the outbox"""
+        try:
+            async with job_recorder.track("outbox_dispatcher", next_run_at=self._next_run_time("outbox_dispatcher"),
+                                          record_idle=False) as run:
+                run.counts.update(await OutboxService.process_outbox())
+            if run.counts:
+                logger.info(f"Outbox dispatch completed: {run.counts}")
+        except Exception as e:
+            logger.error(f"Error dispatching notification outbox: {e}")
+
+    async def _process_user_deletions(self):
+        """Work through queued user deletions, resuming any whose worker died"""
+        try:
+            async with job_recorder.track("user_deletion_worker", next_run_at=self._next_run_time("user_deletion_worker"),
+                                          record_idle=False) as run:
+                run.counts.update(await UserDeletionService.process_deletions())
+            if run.counts["users"]:
+                logger.info(f"User deletions completed: {run.counts}")
+        except Exception as e:
+            logger.error(f"Error processing user deletions: {e}")
+
+    async def _refresh_admin_stats(self):
+        """Recompute the shared admin statistics when they are due"""
+        try:
+            async with job_recorder.track("admin_stats_refresher", next_run_at=self._next_run_time("admin_stats_refresher"),
+                                          record_idle=False) as run:
+                with job_recorder.timed("db"):
+                    run.counts["refreshed"] = int(await admin_stats_cache.refresh())
+        except Exception as e:
+            logger.error(f"Error refreshing admin statistics: {e}")
+
+    async def _rebalance_partitions(self):
+        """Renew, shed and claim reminder partition leases"""
+        try:
+            if await partition_manager.rebalance():
+                # Load the reminders of the partitions this worker now owns
+                reminder_timer.reload()
+        except Exception as e:
+            logger.error(f"Error rebalancing reminder partitions: {e}")
+
+    async def _prune_push_subscriptions(self):
+        """Remove stale push subscriptions in bulk"""
+        try:
+            async with job_recorder.track("push_subscription_pruner") as run:
+                with job_recorder.timed("db"):
+                    removed = await NotificationService.prune_stale_subscriptions(settings.PUSH_SUBSCRIPTION_STALE_DAYS)
+                run.counts["removed"] = removed
+            logger.info(f"Pruned {removed} stale push subscriptions")
+        except Exception as e:
+            logger.error(f"Error pruning push subscriptions: {e}")
+
     def start(self):
         """Start the scheduler"""
         logger.info("Starting notification scheduler")
         self.scheduler.start()
+        if settings.REMINDER_TIMER_ENABLED:
+            reminder_timer.start()
         logger.info("Notification scheduler started")
 
         # Log scheduled jobs
@@ -66,6 +198,7 @@ class SchedulerService:
     def stop(self):
         """Stop the scheduler"""
         logger.info("Stopping notification scheduler")
+        reminder_timer.stop()
         self.scheduler.shutdown()
         logger.info("Notification scheduler stopped")
 
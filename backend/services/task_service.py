@@ -1,11 +1,12 @@
 from datetime import datetime, timezone
 from typing import Optional
 from pymongo import ReturnDocument
-from models.task import Task, TaskCreate
+from models.task import Task, TaskCreate, TaskStatus
 from database import db
 from fastapi import HTTPException, status
 from services.goal_service import get_goal_by_id_and_user
 from bson import ObjectId
+from services.change_event_service import ChangeEventService, client_changes
 
 class TaskService:
     def __init__(self):
@@ -24,13 +25,15 @@ class TaskService:
         task_dict = task_data.model_dump()
         task_dict.update({
             "user_id": user_id,
-            "created_at": datetime.now(timezone.utc)
+            "created_at": datetime.now(timezone.utc),
+            "version": 1
         })
         result = await self.collection.insert_one(task_dict)
         task = Task(
             **task_dict,
             id=str(result.inserted_id)
         )
+        await ChangeEventService.publish(user_id, "task", task.id, "created", task.version, task.model_dump())
         return task
 
     async def get_task(self, task_id: str) -> Optional[Task]:
@@ -71,27 +74,34 @@ class TaskService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found or not authorized"
             )
+        update_data = client_changes(update_data)
+        if not update_data:
+            return existing_task
 
         from bson import ObjectId
         try:
             result = await self.collection.find_one_and_update(
                 {"_id": ObjectId(task_id)},
-                {"$set": update_data},
+                {"$set": update_data, "$inc": {"version": 1}},
                 return_document=ReturnDocument.AFTER
             )
             if result:
                 result['id'] = str(result.get('_id', ''))
-                return Task(**result)
+                task = Task(**result)
+                await ChangeEventService.publish(user_id, "task", task.id, "updated", task.version, update_data)
+                return task
         except ValueError:
             # If the task_id is not a valid ObjectId, try as string
             result = await self.collection.find_one_and_update(
                 {"_id": task_id},
-                {"$set": update_data},
+                {"$set": update_data, "$inc": {"version": 1}},
                 return_document=ReturnDocument.AFTER
             )
             if result:
                 result['id'] = str(result.get('_id', ''))
-                return Task(**result)
+                task = Task(**result)
+                await ChangeEventService.publish(user_id, "task", task.id, "updated", task.version, update_data)
+                return task
         return None
 
     async def delete_task(self, task_id: str, user_id: str) -> bool:
@@ -106,6 +116,8 @@ class TaskService:
                 )
                 
             result = await self.collection.delete_one({"_id": ObjectId(task_id)})
+            if result.deleted_count > 0:
+                await ChangeEventService.publish(user_id, "task", task_id, "deleted", existing_task.version + 1)
             return result.deleted_count > 0
         except ValueError:
             # If the task_id is not a valid ObjectId, try as string
@@ -116,6 +128,8 @@ class TaskService:
                     detail="Task not found or not authorized"
                 )
             result = await self.collection.delete_one({"_id": task_id})
+            if result.deleted_count > 0:
+                await ChangeEventService.publish(user_id, "task", task_id, "deleted", existing_task.version + 1)
             return result.deleted_count > 0
 
 # Module-level function exports for convenience
@@ -139,4 +153,14 @@ async def update_task(task_id: str, user_id: str, update_data: dict) -> Optional
 
 async def delete_task(task_id: str, user_id: str) -> bool:
     """Delete a task (module-level wrapper)"""
-    return await _task_service.delete_task(task_id, user_id)
\ No newline at end of file
+    return await _task_service.delete_task(task_id, user_id)
+
+def filter_tasks(tasks: list[Task], task_status: Optional[TaskStatus] = None, filter: Optional[str] = None) -> list[Task]:
+    """Apply the task list filters shared by the HTTP and WebSocket APIs"""
+    if task_status:
+        tasks = [task for task in tasks if task.status == task_status]
+    if filter == "today":
+        # Use UTC date for consistency with task creation
+        today = datetime.now(timezone.utc).date()
+        tasks = [task for task in tasks if task.created_at.date() == today]
+    return tasks
\ No newline at end of file
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Union
+from pymongo import ASCENDING, ReturnDocument
+from config.settings import settings
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Revocations written by other workers can land slightly behind this worker's clock
+SYNC_OVERLAP = timedelta(seconds=5)
+# Confirmed revocations remembered so repeated use of a revoked token costs no read
+CONFIRMED_ENTRIES = 10000
+# Document in `revoked_tokens` whose write time tells each worker the database's clock
+CLOCK_ID = "clock"
+
+def _timestamp(value: Union[datetime, float]) -> float:
+    """Seconds since the epoch of a naive UTC datetime read from MongoDB, or of a stored number"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc).timestamp()
+    return value
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings, using double hashing of one blake2b digest"""
+
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * step) % self.bits for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenRevocationList:
+    """
+    Revoked access tokens, checked on every authenticated request without a
+    database round trip.
+
+    Access tokens carry a `jti`. Revoking one stores it in `revoked_tokens`
+    until the token would have expired anyway (a TTL index removes it then).
+    Revoking all of a user's tokens, as a password change does, stores a
+    cut-off instead: tokens issued (`iat`) up to it are rejected.
+
+    The cut-off and `iat` are compared across workers, so both are read from
+    the database's clock rather than the local one: the cut-off is the
+    server's write time ($currentDate), and each worker measures its offset
+    from that clock whenever it rebuilds and stamps `iat` with now(). Clock
+    skew between workers therefore cannot let a token issued just before a
+    revocation through, or reject one issued just after it; what remains is
+    the offset measurement's error, about half a round trip, plus the
+    millisecond the stored cut-off is rounded up to.
+
+    Each worker keeps revoked jtis in a bloom filter and the cut-offs in a
+    dict, and pulls new entries every TOKEN_REVOCATION_SYNC_SECONDS by
+    `revoked_at`. A jti that is not in the filter is certainly not revoked,
+    so almost every check is a few hash lookups; only filter hits are
+    confirmed with a read by _id. Revocations made on this worker apply at
+    once, those made on other workers within one sync interval. Bloom
+    filters cannot forget, so the filter is rebuilt from the live entries
+    every TOKEN_REVOCATION_REBUILD_MINUTES, dropping expired tokens.
+    """
+
+    def __init__(self):
+        self._filter = self._new_filter()
+        self._user_cutoffs: Dict[str, float] = {}
+        self._confirmed: Dict[str, datetime] = {}
+        self._synced_until: Optional[datetime] = None
+        self._rebuilt_at = 0.0
+        # Seconds the database's clock is ahead of this worker's
+        self._clock_offset = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"checks": 0, "filter_hits": 0, "false_positives": 0, "rejected": 0}
+
+    def now(self) -> float:
+        """Current time on the database's clock, in seconds since the epoch; used for `iat`"""
+        return time.time() + self._clock_offset
+
+    def _observe_clock(self, server_time: datetime, sent_at: float, received_at: float):
+        self._clock_offset = _timestamp(server_time) - (sent_at + received_at) / 2
+
+    async def sync_clock(self):
+        """Measure this worker's clock offset from the database's"""
+        db = await get_db()
+        sent_at = time.time()
+        entry = await db.revoked_tokens.find_one_and_update(
+            {"_id": CLOCK_ID}, {"$currentDate": {"checked_at": True}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self._observe_clock(entry["checked_at"], sent_at, time.time())
+
+    @staticmethod
+    def _new_filter() -> BloomFilter:
+        return BloomFilter(settings.TOKEN_REVOCATION_BLOOM_BITS, settings.TOKEN_REVOCATION_BLOOM_HASHES)
+
+    async def ensure_indexes(self):
+        db = await get_db()
+        await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+        await db.revoked_tokens.create_index([("revoked_at", ASCENDING)])
+
+    async def revoke_token(self, jti: str, expires_at: datetime, user_id: Optional[str] = None):
+        """Revoke one access token until it expires"""
+        db = await get_db()
+        await db.revoked_tokens.update_one(
+            {"_id": f"jti:{jti}"},
+            {"$set": {"user_id": user_id, "revoked_at": datetime.utcnow(), "expires_at": expires_at}},
+            upsert=True
+        )
+        self._filter.add(jti)
+        self._remember(jti, expires_at)
+
+    async def revoke_user(self, user_id: str):
+        """Revoke every access token issued to a user until now"""
+        db = await get_db()
+        sent_at = time.time()
+        # One write stamps the cut-off and revoked_at with the server's clock
+        entry = await db.revoked_tokens.find_one_and_update(
+            {"_id": f"user:{user_id}"},
+            {
+                "$set": {
+                    "user_id": user_id,
+                    # Tokens issued before the cut-off are expired by then
+                    "expires_at": datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+                        + timedelta(seconds=self._clock_offset)
+                },
+                "$currentDate": {"not_before": True, "revoked_at": True}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        received_at = time.time()
+        self._observe_clock(entry["not_before"], sent_at, received_at)
+        self._apply(self._filter, self._user_cutoffs, entry)
+        # Whatever this worker issues from here on comes after the revocation,
+        # so keep its clock no earlier than the (rounded-up) cut-off
+        self._clock_offset = max(self._clock_offset, self._user_cutoffs[user_id] - received_at)
+
+    async def is_revoked(self, payload: dict) -> bool:
+        """Whether a verified access token's claims have been revoked"""
+        self.counters["checks"] += 1
+        cutoff = self._user_cutoffs.get(payload.get("sub"))
+        if cutoff is not None and payload.get("iat", 0) <= cutoff:
+            self.counters["rejected"] += 1
+            return True
+
+        jti = payload.get("jti")
+        if not jti or jti not in self._filter:
+            return False
+        self.counters["filter_hits"] += 1
+        if jti in self._confirmed:
+            self.counters["rejected"] += 1
+            return True
+
+        db = await get_db()
+        entry = await db.revoked_tokens.find_one({"_id": f"jti:{jti}"}, {"expires_at": 1})
+        if entry is None:
+            self.counters["false_positives"] += 1
+            return False
+        self._remember(jti, entry["expires_at"])
+        self.counters["rejected"] += 1
+        return True
+
+    def _remember(self, jti: str, expires_at: datetime):
+        if len(self._confirmed) >= CONFIRMED_ENTRIES:
+            self._confirmed.pop(next(iter(self._confirmed)))
+        self._confirmed[jti] = expires_at
+
+    def _apply(self, bloom: BloomFilter, cutoffs: Dict[str, float], entry: dict):
+        key = entry["_id"]
+        if key.startswith("jti:"):
+            bloom.add(key[4:])
+        elif key.startswith("user:"):
+            # Dates are stored to the millisecond; round up so the revoking instant is covered
+            cutoff = _timestamp(entry["not_before"]) + 0.001
+            cutoffs[key[5:]] = max(cutoffs.get(key[5:], 0), cutoff)
+
+    async def rebuild(self):
+        """Load every live revocation into a fresh filter and swap it in"""
+        await self.sync_clock()
+        db = await get_db()
+        now = datetime.utcnow()
+        bloom, cutoffs = self._new_filter(), {}
+        latest = None
+        async for entry in db.revoked_tokens.find({"expires_at": {"$gt": now}}):
+            self._apply(bloom, cutoffs, entry)
+            latest = max(latest or entry["revoked_at"], entry["revoked_at"])
+        self._filter, self._user_cutoffs = bloom, cutoffs
+        self._confirmed = {jti: expires for jti, expires in self._confirmed.items() if expires > now}
+        self._synced_until = latest or now
+        self._rebuilt_at = time.monotonic()
+
+    async def sync(self):
+        """Pull revocations made since the last sync, or rebuild when due"""
+        if self._synced_until is None or \
+                time.monotonic() - self._rebuilt_at >= settings.TOKEN_REVOCATION_REBUILD_MINUTES * 60:
+            await self.rebuild()
+            return
+        db = await get_db()
+        async for entry in db.revoked_tokens.find(
+            {"revoked_at": {"$gte": self._synced_until - SYNC_OVERLAP}}
+        ).sort("revoked_at", ASCENDING):
+            self._apply(self._filter, self._user_cutoffs, entry)
+            self._synced_until = max(self._synced_until, entry["revoked_at"])
+
+    async def start(self):
+        """Load the current revocations, then keep them in sync in the background"""
+        await self.rebuild()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.TOKEN_REVOCATION_SYNC_SECONDS)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Token revocation sync failed: {e}")
+
+    def stats(self) -> dict:
+        return {**self.counters, "user_cutoffs": len(self._user_cutoffs), "synced_until": self._synced_until}
+
+# Global revocation list for this worker; started at application startup
+token_revocations = TokenRevocationList()
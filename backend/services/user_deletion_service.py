@@ -0,0 +1,287 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from config.settings import settings
+from database import get_db
+from models.user_deletion import UserDeletion, UserDeletionStatus
+from services.auth_service import account_status_cache
+from services.outbox_service import WORKER_ID
+from services.user_search_service import user_count_cache
+
+logger = logging.getLogger(__name__)
+
+# Collections holding a user's data, cleared in this order; the user document goes last
+DELETION_STAGES = [
+    "tasks",
+    "goals",
+    "push_subscriptions",
+    "notification_outbox",
+    "reminder_deliveries",
+]
+
+class UserDeletionService:
+    """
+    Deletes users in two steps.
+
+    request() tombstones the user document at once: it is marked deleted,
+    disabled, loses its refresh tokens and notifications, so authentication
+    fails from that moment and no reminders are sent. A job in
+    `user_deletions` records the request. Background workers lease jobs like
+    outbox jobs and remove the user's documents collection by collection in
+    batches of USER_DELETION_BATCH_SIZE, pausing between batches so a heavy
+    account does not monopolize the database. The stage and counts are saved
+    after every batch, so a job whose worker died is resumed by the next one
+    from where it stopped; deleting is idempotent, so repeating a batch is
+    harmless.
+    """
+
+    @staticmethod
+    async def ensure_indexes():
+        db = await get_db()
+        await db.user_deletions.create_index([("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+        # Only finished jobs carry expires_at
+        await db.user_deletions.create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    def _tombstone(now: datetime) -> dict:
+        return {"$set": {
+            "deleted_at": now,
+            "disabled": True,
+            "refresh_tokens": [],
+            "notifications_enabled": False
+        }}
+
+    @staticmethod
+    def _new_job(now: datetime, requested_by: Optional[str]) -> dict:
+        return {"$setOnInsert": {
+            "status": UserDeletionStatus.PENDING.value,
+            "requested_by": requested_by,
+            "requested_at": now,
+            "stage": 0,
+            "deleted": {},
+            "attempts": 0,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "updated_at": now
+        }}
+
+    @staticmethod
+    async def _apply_tombstone(user_id: str, now: datetime) -> bool:
+        """Tombstone a user unless that already happened; True if this call did it"""
+        db = await get_db()
+        result = await db.users.update_one(
+            {"_id": ObjectId(user_id), "deleted_at": {"$exists": False}}, UserDeletionService._tombstone(now)
+        )
+        if result.modified_count == 0:
+            return False
+        user_count_cache.invalidate()
+        account_status_cache.invalidate(user_id)
+        return True
+
+    @staticmethod
+    async def request(user_id: str, requested_by: Optional[str] = None) -> UserDeletion:
+        """Tombstone a user and queue the removal of their data; repeated requests are no-ops"""
+        try:
+            user_obj_id = ObjectId(user_id)
+        except Exception:
+            raise ValueError("Invalid user ID format")
+
+        db = await get_db()
+        user = await db.users.find_one({"_id": user_obj_id}, {"deleted_at": 1})
+        if user is None:
+            existing = await db.user_deletions.find_one({"_id": user_id})
+            if existing is None:
+                raise ValueError("User not found")
+            return UserDeletionService._to_model(existing)
+
+        # The job is written before the tombstone: if this request dies in
+        # between, the worker that claims the job applies the tombstone.
+        now = datetime.utcnow()
+        job = await db.user_deletions.find_one_and_update(
+            {"_id": user_id},
+            UserDeletionService._new_job(now, requested_by),
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if job["status"] == UserDeletionStatus.FAILED.value:
+            # Asking again retries a job that ran out of attempts
+            job = await db.user_deletions.find_one_and_update(
+                {"_id": user_id, "status": UserDeletionStatus.FAILED.value},
+                {"$set": {"status": UserDeletionStatus.PENDING.value, "attempts": 0, "updated_at": now}},
+                return_document=ReturnDocument.AFTER
+            ) or job
+        if await UserDeletionService._apply_tombstone(user_id, now):
+            logger.info(f"User {user_id} tombstoned for deletion (requested by {requested_by})")
+        return UserDeletionService._to_model(job)
+
+    @staticmethod
+    async def request_many(user_obj_ids: List[ObjectId], requested_by: Optional[str] = None) -> None:
+        """Tombstone many users with one update and queue their jobs with one bulk write"""
+        if not user_obj_ids:
+            return
+        db = await get_db()
+        now = datetime.utcnow()
+        # Jobs first, as in request(), so a crash never leaves a tombstone without a job
+        await db.user_deletions.bulk_write([
+            UpdateOne({"_id": str(user_obj_id)}, UserDeletionService._new_job(now, requested_by), upsert=True)
+            for user_obj_id in user_obj_ids
+        ], ordered=False)
+        await db.users.update_many(
+            {"_id": {"$in": user_obj_ids}, "deleted_at": {"$exists": False}}, UserDeletionService._tombstone(now)
+        )
+        user_count_cache.invalidate()
+        for user_obj_id in user_obj_ids:
+            account_status_cache.invalidate(str(user_obj_id))
+        logger.info(f"{len(user_obj_ids)} users tombstoned for deletion (requested by {requested_by})")
+
+    @staticmethod
+    async def get_progress(user_id: str) -> Optional[UserDeletion]:
+        db = await get_db()
+        job = await db.user_deletions.find_one({"_id": user_id})
+        return UserDeletionService._to_model(job) if job else None
+
+    @staticmethod
+    async def claim_job(worker_id: str, now: Optional[datetime] = None) -> Optional[dict]:
+        """
+        Lease the oldest waiting job, or one whose worker stopped renewing its
+        lease and that has attempts left; fail_expired() retires the others.
+        """
+        db = await get_db()
+        now = now or datetime.utcnow()
+        return await db.user_deletions.find_one_and_update(
+            {"$or": [
+                {"status": UserDeletionStatus.PENDING.value},
+                {
+                    "status": UserDeletionStatus.RUNNING.value,
+                    "lease_expires_at": {"$lte": now},
+                    "attempts": {"$lt": settings.USER_DELETION_MAX_ATTEMPTS}
+                }
+            ]},
+            {
+                "$set": {
+                    "status": UserDeletionStatus.RUNNING.value,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=settings.USER_DELETION_LEASE_SECONDS),
+                    "updated_at": now
+                },
+                "$min": {"started_at": now},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("requested_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    async def fail_expired(now: Optional[datetime] = None) -> int:
+        """
+        Mark jobs whose lease expired on their last allowed attempt as failed,
+        so a user whose data keeps crashing workers is not retried forever.
+        The user stays tombstoned; requesting the deletion again retries it.
+        """
+        db = await get_db()
+        now = now or datetime.utcnow()
+        result = await db.user_deletions.update_many(
+            {
+                "status": UserDeletionStatus.RUNNING.value,
+                "lease_expires_at": {"$lte": now},
+                "attempts": {"$gte": settings.USER_DELETION_MAX_ATTEMPTS}
+            },
+            {"$set": {
+                "status": UserDeletionStatus.FAILED.value,
+                "failed_at": now,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "updated_at": now
+            }}
+        )
+        if result.modified_count:
+            logger.error(f"{result.modified_count} user deletions failed after {settings.USER_DELETION_MAX_ATTEMPTS} attempts")
+        return result.modified_count
+
+    @staticmethod
+    async def process_deletions(worker_id: str = WORKER_ID) -> dict:
+        """Work through queued deletions until none are left; returns counts for the job metrics"""
+        stats = {"users": 0, "documents": 0, "failed": await UserDeletionService.fail_expired()}
+        while True:
+            job = await UserDeletionService.claim_job(worker_id)
+            if job is None:
+                return stats
+            removed = await UserDeletionService._run(job, worker_id)
+            if removed is None:
+                continue  # Lost the lease; the new owner carries on
+            stats["users"] += 1
+            stats["documents"] += removed
+
+    @staticmethod
+    async def _run(job: dict, worker_id: str) -> Optional[int]:
+        """Remove one user's data from the job's saved stage onwards; None if the lease was lost"""
+        db = await get_db()
+        user_id = job["_id"]
+        if await UserDeletionService._apply_tombstone(user_id, datetime.utcnow()):
+            logger.warning(f"User {user_id} had a deletion job but no tombstone; applied it")
+        removed = 0
+        for stage in range(job.get("stage", 0), len(DELETION_STAGES)):
+            collection = DELETION_STAGES[stage]
+            while True:
+                batch = await db[collection].find(
+                    {"user_id": user_id}, {"_id": 1}
+                ).limit(settings.USER_DELETION_BATCH_SIZE).to_list(length=settings.USER_DELETION_BATCH_SIZE)
+                if not batch:
+                    break
+                result = await db[collection].delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                removed += result.deleted_count
+                if not await UserDeletionService._checkpoint(
+                    user_id, worker_id, {"stage": stage, "current_collection": collection},
+                    {f"deleted.{collection}": result.deleted_count}
+                ):
+                    return None
+                # Throttle so other queries keep their share of the database
+                await asyncio.sleep(settings.USER_DELETION_BATCH_PAUSE_SECONDS)
+            if not await UserDeletionService._checkpoint(user_id, worker_id, {"stage": stage + 1}):
+                return None
+
+        result = await db.users.delete_one({"_id": ObjectId(user_id), "deleted_at": {"$exists": True}})
+        now = datetime.utcnow()
+        await db.user_deletions.update_one(
+            {"_id": user_id, "lease_owner": worker_id},
+            {
+                "$set": {
+                    "status": UserDeletionStatus.DONE.value,
+                    "current_collection": None,
+                    "completed_at": now,
+                    "expires_at": now + timedelta(days=settings.USER_DELETION_RETENTION_DAYS),
+                    "lease_owner": None,
+                    "lease_expires_at": None,
+                    "updated_at": now
+                },
+                "$inc": {"deleted.users": result.deleted_count}
+            }
+        )
+        user_count_cache.invalidate()
+        logger.info(f"Deleted user {user_id} and {removed} dependent documents")
+        return removed + result.deleted_count
+
+    @staticmethod
+    async def _checkpoint(user_id: str, worker_id: str, fields: dict, increments: Optional[dict] = None) -> bool:
+        """Save progress and renew the lease; False if another worker has taken the job over"""
+        db = await get_db()
+        now = datetime.utcnow()
+        update = {"$set": {
+            **fields,
+            "lease_expires_at": now + timedelta(seconds=settings.USER_DELETION_LEASE_SECONDS),
+            "updated_at": now
+        }}
+        if increments:
+            update["$inc"] = increments
+        result = await db.user_deletions.update_one({"_id": user_id, "lease_owner": worker_id}, update)
+        if result.matched_count == 0:
+            logger.warning(f"Lost the deletion lease for user {user_id}")
+            return False
+        return True
+
+    @staticmethod
+    def _to_model(job: dict) -> UserDeletion:
+        return UserDeletion(user_id=job["_id"], **{key: value for key, value in job.items() if key != "_id"})
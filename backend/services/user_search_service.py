@@ -0,0 +1,140 @@
+import re
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+from pymongo import ASCENDING, UpdateOne
+from config.settings import settings
+from database import get_db
+
+# Distinct filters whose totals are remembered per worker
+COUNT_CACHE_ENTRIES = 256
+
+class UserSearchService:
+    """
+    Indexed admin search over users.
+
+    Each user document carries derived, normalized fields: `search_keys`
+    (lowercased, accent-stripped email, its local part and domain, the full
+    name and each word of it) and `role_key` (the lowercased role). A search
+    is an anchored prefix match on `search_keys` and a role filter is an exact
+    match on `role_key`, so both are answered from indexes instead of scanning
+    every user with case-insensitive regexes.
+    """
+
+    @staticmethod
+    def normalize(text: Optional[str]) -> str:
+        """Lowercase, strip accents and collapse whitespace"""
+        if not text:
+            return ""
+        decomposed = unicodedata.normalize("NFKD", text)
+        stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+        return " ".join(stripped.casefold().split())
+
+    @staticmethod
+    def search_keys(email: Optional[str], name: Optional[str]) -> List[str]:
+        keys = set()
+        email_key = UserSearchService.normalize(email)
+        if email_key:
+            keys.add(email_key)
+            keys.update(part for part in email_key.split("@") if part)
+        name_key = UserSearchService.normalize(name)
+        if name_key:
+            keys.add(name_key)
+            keys.update(name_key.split())
+        return sorted(keys)
+
+    @staticmethod
+    def search_fields(email: Optional[str], name: Optional[str], role: Optional[str]) -> dict:
+        """Derived search fields stored on the user so admin searches can use indexes"""
+        return {
+            "search_keys": UserSearchService.search_keys(email, name),
+            "role_key": (role or "User").lower()
+        }
+
+    @staticmethod
+    def build_query(search: Optional[str] = None, role: Optional[str] = None) -> dict:
+        # Accounts awaiting deletion are hidden from the admin list and totals
+        query = {"deleted_at": None}
+        prefix = UserSearchService.normalize(search)
+        if prefix:
+            # Anchored and case-sensitive on normalized keys, so MongoDB scans only the matching index range
+            query["search_keys"] = {"$regex": f"^{re.escape(prefix)}"}
+        if role:
+            query["role_key"] = role.lower()
+        return query
+
+    @staticmethod
+    async def ensure_indexes():
+        db = await get_db()
+        await db.users.create_index([("search_keys", ASCENDING), ("_id", ASCENDING)])
+        await db.users.create_index([("role_key", ASCENDING), ("_id", ASCENDING)])
+
+    @staticmethod
+    async def refresh_search_fields(user_obj_id) -> None:
+        """Recompute a user's search fields from their stored email, name and role"""
+        db = await get_db()
+        user = await db.users.find_one({"_id": user_obj_id}, {"email": 1, "name": 1, "role": 1})
+        if user:
+            await db.users.update_one(
+                {"_id": user_obj_id},
+                {"$set": UserSearchService.search_fields(user.get("email"), user.get("name"), user.get("role"))}
+            )
+        user_count_cache.invalidate()
+
+    @staticmethod
+    async def backfill_search_fields(batch_size: int = 500) -> int:
+        """Compute search fields for users created before they existed"""
+        db = await get_db()
+        cursor = db.users.find(
+            {"$or": [{"search_keys": {"$exists": False}}, {"role_key": {"$exists": False}}]},
+            {"email": 1, "name": 1, "role": 1}
+        )
+        updated = 0
+        batch = []
+        async for user in cursor:
+            fields = UserSearchService.search_fields(user.get("email"), user.get("name"), user.get("role"))
+            batch.append(UpdateOne({"_id": user["_id"]}, {"$set": fields}))
+            if len(batch) >= batch_size:
+                await db.users.bulk_write(batch, ordered=False)
+                updated += len(batch)
+                batch = []
+        if batch:
+            await db.users.bulk_write(batch, ordered=False)
+            updated += len(batch)
+        if updated:
+            user_count_cache.invalidate()
+        return updated
+
+
+class UserCountCache:
+    """
+    Totals for admin user filters, kept for ADMIN_USER_COUNT_CACHE_SECONDS.
+
+    Paging through a search asks for the same total on every page; counting is
+    the expensive part of a broad filter, so it is done once per filter and
+    reused. Writes to users on this worker clear the cache; other workers see
+    their changes once the entries expire.
+    """
+
+    def __init__(self):
+        self._counts: Dict[Tuple[str, ...], Tuple[int, float]] = {}
+
+    async def count(self, query: dict) -> int:
+        key = tuple(sorted(f"{field}={value}" for field, value in query.items()))
+        cached = self._counts.get(key)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < settings.ADMIN_USER_COUNT_CACHE_SECONDS:
+            return cached[0]
+
+        db = await get_db()
+        total = await db.users.count_documents(query)
+        if len(self._counts) >= COUNT_CACHE_ENTRIES:
+            self._counts.pop(next(iter(self._counts)))
+        self._counts[key] = (total, now)
+        return total
+
+    def invalidate(self):
+        self._counts.clear()
+
+# Global cache instance for this worker
+user_count_cache = UserCountCache()
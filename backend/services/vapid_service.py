@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from config.settings import settings
+try:
+    from py_vapid import Vapid
+except ImportError:
+    Vapid = None
+
+class VapidHeaderCache:
+    """
+    Caches signed VAPID Authorization headers per push-service origin.
+
+    The VAPID JWT only depends on the audience (scheme://host of the push
+    endpoint), the subscriber claim and the expiry, so every push to the same
+    push service can reuse one ES256 signature until shortly before it expires.
+    The private key is parsed once in load() instead of on every send.
+    """
+
+    def __init__(self):
+        self._vapid = None
+        self._subject: Optional[str] = None
+        self._headers: Dict[str, Tuple[dict, int]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @property
+    def configured(self) -> bool:
+        if not self._loaded:
+            self.load()
+        return self._vapid is not None
+
+    def load(self, private_key: Optional[str] = None, claim_email: Optional[str] = None):
+        """Parse the VAPID private key (PEM file path, DER or raw base64url) once"""
+        private_key = private_key or settings.VAPID_PRIVATE_KEY
+        claim_email = claim_email or settings.VAPID_CLAIM_EMAIL
+        self._loaded = True
+        self._headers.clear()
+        self._vapid = None
+
+        if Vapid is None or not private_key or not claim_email:
+            print("Warning: VAPID key or claim email not configured; push notifications are disabled")
+            return
+
+        if os.path.isfile(private_key):
+            self._vapid = Vapid.from_file(private_key_file=private_key)
+        else:
+            self._vapid = Vapid.from_string(private_key=private_key)
+
+        # The push service rejects a `sub` that is not a mailto: or https: URL
+        if claim_email.startswith(("mailto:", "https://")):
+            self._subject = claim_email
+        else:
+            self._subject = f"mailto:{claim_email}"
+
+    def get_headers(self, endpoint: str) -> dict:
+        """Return VAPID headers for a subscription endpoint, signing only when needed"""
+        if not self.configured:
+            raise RuntimeError("VAPID key not configured")
+
+        url = urlparse(endpoint)
+        audience = f"{url.scheme}://{url.netloc}"
+        now = int(time.time())
+
+        with self._lock:
+            cached = self._headers.get(audience)
+            if cached and cached[1] - now > settings.VAPID_REFRESH_MARGIN_SECONDS:
+                return dict(cached[0])
+
+            expires_at = now + settings.VAPID_TOKEN_TTL_SECONDS
+            headers = self._vapid.sign({"sub": self._subject, "aud": audience, "exp": expires_at})
+            self._headers[audience] = (headers, expires_at)
+            return dict(headers)
+
+# Global cache instance, loaded at startup
+vapid_cache = VapidHeaderCache()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+from config.settings import settings
+from database import get_db
+from services.outbox_service import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+# How long to wait before reopening the tail after the cursor died or failed
+RETAIL_DELAY_SECONDS = 1.0
+# Latency samples kept for the percentile figures
+LATENCY_SAMPLES = 1000
+# A reopened tail re-reads this far back, since other workers' clocks and inserts can lag
+RESUME_OVERLAP = timedelta(seconds=5)
+# Ids of recently handled messages, so re-read ones are not delivered twice
+SEEN_IDS = 10000
+
+class WebSocketBus:
+    """
+    Fans WebSocket messages out to every worker through a capped collection.
+
+    WebSocket connections live in the process that accepted them, so a message
+    for a user has to reach every worker. publish() delivers to this worker's
+    sockets right away and appends the message to the `ws_bus` capped
+    collection; each worker follows that collection with a tailable cursor and
+    delivers messages published by the other workers to its own sockets.
+    Capped collections work on a standalone MongoDB, unlike change streams,
+    and trim themselves, so the bus needs no cleanup and no extra service.
+
+    ObjectIds from different workers do not sort in insertion order, so a
+    tail reopened after an error does not resume after the last _id it saw.
+    It re-reads, in insertion order, everything published from RESUME_OVERLAP
+    before the newest message it handled and skips the ids it already has.
+    """
+
+    def __init__(self):
+        self._deliver_local: Optional[Callable[[str, dict], Awaitable[int]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._resume_at: Optional[datetime] = None
+        self._seen: OrderedDict = OrderedDict()
+        self._latencies_ms: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"published": 0, "received": 0, "delivered": 0, "errors": 0}
+
+    async def ensure_collection(self):
+        db = await get_db()
+        try:
+            await db.create_collection(
+                "ws_bus", capped=True, size=settings.WS_BUS_CAPPED_BYTES, max=settings.WS_BUS_MAX_MESSAGES
+            )
+            # A tailable cursor on an empty capped collection dies immediately
+            await db.ws_bus.insert_one({"user_id": None, "origin": WORKER_ID, "published_at": datetime.utcnow()})
+        except CollectionInvalid:
+            pass  # Already created by another worker
+
+    def start(self, deliver_local: Callable[[str, dict], Awaitable[int]]):
+        """
+        Start following the bus. `deliver_local(user_id, payload)` sends to the
+        user's sockets on this worker and returns how many it reached.
+        """
+        self._deliver_local = deliver_local
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._tail())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def publish(self, user_id: str, payload: dict) -> int:
+        """Send a payload to all of a user's sockets on every worker; returns the local deliveries"""
+        delivered = 0
+        if self._deliver_local is not None:
+            delivered = await self._deliver_local(user_id, payload)
+
+        db = await get_db()
+        await db.ws_bus.insert_one({
+            "user_id": user_id,
+            "payload": payload,
+            "origin": WORKER_ID,
+            "published_at": datetime.utcnow()
+        })
+        self.counters["published"] += 1
+        return delivered
+
+    async def publish_many(self, messages: List[Tuple[str, dict]]) -> int:
+        """publish() for many (user_id, payload) pairs with a single insert"""
+        if not messages:
+            return 0
+        delivered = 0
+        if self._deliver_local is not None:
+            for user_id, payload in messages:
+                delivered += await self._deliver_local(user_id, payload)
+
+        db = await get_db()
+        now = datetime.utcnow()
+        await db.ws_bus.insert_many([
+            {"user_id": user_id, "payload": payload, "origin": WORKER_ID, "published_at": now}
+            for user_id, payload in messages
+        ])
+        self.counters["published"] += len(messages)
+        return delivered
+
+    def _mark_seen(self, message_id) -> bool:
+        """Remember a message id; False if it was already handled"""
+        if message_id in self._seen:
+            return False
+        if len(self._seen) >= SEEN_IDS:
+            self._seen.popitem(last=False)
+        self._seen[message_id] = None
+        return True
+
+    async def _tail(self):
+        db = await get_db()
+        # Only messages published from now on; the bus is not a replay log
+        self._resume_at = datetime.utcnow()
+        async for message in db.ws_bus.find({"published_at": {"$gte": self._resume_at - RESUME_OVERLAP}}, {"_id": 1}):
+            self._mark_seen(message["_id"])
+
+        while True:
+            try:
+                cursor = db.ws_bus.find(
+                    {"published_at": {"$gte": self._resume_at - RESUME_OVERLAP}}, cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                while cursor.alive:
+                    async for message in cursor:
+                        if not self._mark_seen(message["_id"]):
+                            continue
+                        self._resume_at = max(self._resume_at, message["published_at"])
+                        await self._handle(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"WebSocket bus tail failed, reopening: {e}")
+            await asyncio.sleep(RETAIL_DELAY_SECONDS)
+
+    async def _handle(self, message: dict):
+        # Messages from this worker were delivered locally when published
+        if message.get("origin") == WORKER_ID or not message.get("user_id"):
+            return
+        self.counters["received"] += 1
+        try:
+            delivered = await self._deliver_local(message["user_id"], message["payload"])
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"WebSocket bus delivery to {message['user_id']} failed: {e}")
+            return
+        if delivered:
+            self.counters["delivered"] += delivered
+            # Includes clock skew between workers
+            latency = datetime.utcnow() - message["published_at"]
+            self._latencies_ms.append(latency.total_seconds() * 1000)
+
+    def stats(self) -> dict:
+        """Counters and cross-worker delivery latency (ms) over the recent samples"""
+        samples = sorted(self._latencies_ms)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not samples:
+                return None
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+        return {
+            "worker_id": WORKER_ID,
+            **self.counters,
+            "latency_ms": {
+                "samples": len(samples),
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": samples[-1] if samples else None
+            }
+        }
+
+# Global bus instance, started at application startup
+websocket_bus = WebSocketBus()
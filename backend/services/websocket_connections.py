@@ -0,0 +1,320 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Union
+from fastapi import WebSocket
+from starlette import status
+from config.settings import settings
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Subprotocols a client can ask for in Sec-WebSocket-Protocol. Without one,
+# messages are JSON text frames as before. permessage-deflate is negotiated
+# separately by the server (uvicorn enables it by default).
+JSON_SUBPROTOCOL = "json"
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+# Kind of RPC replies in the send queue; a client is waiting on each one, so they are never dropped
+RPC_REPLY_KIND = "rpc_result"
+
+def negotiate_subprotocol(requested: List[str]) -> Optional[str]:
+    """Pick the first supported subprotocol the client offered"""
+    for subprotocol in requested:
+        if subprotocol == MSGPACK_SUBPROTOCOL and msgpack is not None:
+            return subprotocol
+        if subprotocol == JSON_SUBPROTOCOL:
+            return subprotocol
+    return None
+
+# Reused: json.dumps() with non-default arguments builds a new encoder per call
+_compact_json = json.JSONEncoder(separators=(",", ":"))
+
+def encode_message(payload: dict, encoding: str) -> Union[str, bytes]:
+    """Serialize a payload for one encoding: MessagePack binary frames or compact JSON text"""
+    if encoding == MSGPACK_SUBPROTOCOL:
+        return msgpack.packb(payload)
+    return _compact_json.encode(payload)
+
+def decode_message(message: Union[str, bytes]) -> dict:
+    """Parse a client frame: binary frames are MessagePack, text frames JSON"""
+    if isinstance(message, bytes):
+        if msgpack is None:
+            raise ValueError("MessagePack is not available")
+        return msgpack.unpackb(message)
+    return json.loads(message)
+
+# Outbound queue figures for all of this worker's connections
+queue_counters = {
+    "enqueued": 0, "sent": 0, "dropped": 0, "coalesced": 0,
+    "overflow_disconnects": 0, "send_failures": 0, "max_depth": 0
+}
+
+class Connection:
+    """
+    One accepted WebSocket, its liveness bookkeeping and its outbound queue.
+
+    send() never waits on the socket: messages go into a queue bounded by
+    WS_SEND_QUEUE_SIZE, drained by a writer task that only exists while the
+    queue is non-empty. A slow or half-dead client therefore only delays its
+    own messages. When the queue is full, WS_SEND_OVERFLOW_POLICY decides:
+    `drop_oldest` drops the oldest queued message, `coalesce` replaces a queued
+    message of the same kind (falling back to dropping the oldest), and
+    `disconnect` closes the socket so the client reconnects and resyncs.
+    RPC replies are never dropped or coalesced: other messages make way for
+    them, and a reply that still finds no room closes the socket.
+    """
+    __slots__ = ("id", "user_id", "websocket", "encoding", "connected_at", "last_seen", "slot",
+                 "dropped", "closing", "_queue", "_writer")
+
+    def __init__(self, connection_id: int, user_id: str, websocket: WebSocket, encoding: str = JSON_SUBPROTOCOL):
+        self.id = connection_id
+        self.user_id = user_id
+        self.websocket = websocket
+        self.encoding = encoding
+        self.connected_at = time.monotonic()
+        # Any message from the client (pongs included) proves it is alive
+        self.last_seen = self.connected_at
+        self.slot: Optional[int] = None
+        self.dropped = 0
+        self.closing = False
+        self._queue: deque = deque()
+        self._writer: Optional[asyncio.Task] = None
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def send(self, message: Union[str, bytes], kind: Optional[str] = None) -> bool:
+        """Queue a text (str) or binary (bytes) message; returns False if it was not queued"""
+        if self.closing:
+            return False
+        if len(self._queue) >= settings.WS_SEND_QUEUE_SIZE and not self._make_room(kind):
+            return False
+
+        self._queue.append((kind, message))
+        queue_counters["enqueued"] += 1
+        queue_counters["max_depth"] = max(queue_counters["max_depth"], len(self._queue))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+        return True
+
+    def _make_room(self, kind: Optional[str]) -> bool:
+        policy = settings.WS_SEND_OVERFLOW_POLICY
+        self.dropped += 1
+        if policy == "disconnect":
+            self._overflow_disconnect()
+            return False
+        if policy == "coalesce" and kind is not None and kind != RPC_REPLY_KIND:
+            for index, (queued_kind, _) in enumerate(self._queue):
+                if queued_kind == kind:
+                    del self._queue[index]
+                    queue_counters["coalesced"] += 1
+                    return True
+        for index, (queued_kind, _) in enumerate(self._queue):
+            if queued_kind != RPC_REPLY_KIND:
+                del self._queue[index]
+                queue_counters["dropped"] += 1
+                return True
+        # The queue holds nothing but RPC replies
+        if kind == RPC_REPLY_KIND:
+            self._overflow_disconnect()
+        else:
+            queue_counters["dropped"] += 1
+        return False
+
+    def _overflow_disconnect(self):
+        queue_counters["overflow_disconnects"] += 1
+        logger.warning(f"Send queue full for user {self.user_id}; disconnecting")
+        self._shutdown()
+        asyncio.create_task(self._close_socket(status.WS_1013_TRY_AGAIN_LATER, "Send queue overflow"))
+
+    async def _drain(self):
+        while self._queue and not self.closing:
+            _, message = self._queue.popleft()
+            if isinstance(message, bytes):
+                send = self.websocket.send_bytes(message)
+            else:
+                send = self.websocket.send_text(message)
+            try:
+                await asyncio.wait_for(send, settings.WS_SEND_TIMEOUT_SECONDS)
+            except Exception as e:
+                queue_counters["send_failures"] += 1
+                logger.info(f"Send to user {self.user_id} failed, dropping connection: {e}")
+                await self.close(status.WS_1011_INTERNAL_ERROR, "Send failed")
+                return
+            queue_counters["sent"] += 1
+
+    def _shutdown(self) -> bool:
+        """Stop accepting messages and unregister; returns False if already shut down"""
+        if self.closing:
+            return False
+        self.closing = True
+        self._queue.clear()
+        connection_registry.remove(self)
+        return True
+
+    async def close(self, code: int, reason: str):
+        """Unregister the connection, discard its queue and close the socket"""
+        if self._shutdown():
+            await self._close_socket(code, reason)
+
+    async def _close_socket(self, code: int, reason: str):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), settings.WS_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            pass  # Already gone
+
+
+class ConnectionRegistry:
+    """
+    This worker's open WebSockets, indexed by connection id and by user so
+    that adding, removing and looking up a user's sockets are all O(1).
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._by_id: Dict[int, Connection] = {}
+        self._by_user: Dict[str, Dict[int, Connection]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, user_id: str, websocket: WebSocket, encoding: str = JSON_SUBPROTOCOL) -> Connection:
+        connection = Connection(next(self._ids), user_id, websocket, encoding)
+        self._by_id[connection.id] = connection
+        self._by_user.setdefault(user_id, {})[connection.id] = connection
+        heartbeat_wheel.schedule(connection)
+        return connection
+
+    def remove(self, connection: Connection) -> bool:
+        """Forget a connection; returns False if it was already removed"""
+        if self._by_id.pop(connection.id, None) is None:
+            return False
+        heartbeat_wheel.unschedule(connection)
+        user_connections = self._by_user.get(connection.user_id)
+        if user_connections is not None:
+            user_connections.pop(connection.id, None)
+            if not user_connections:
+                del self._by_user[connection.user_id]
+        return True
+
+    def get(self, connection_id: int) -> Optional[Connection]:
+        return self._by_id.get(connection_id)
+
+    def for_user(self, user_id: str) -> List[Connection]:
+        return list(self._by_user.get(user_id, {}).values())
+
+    def user_count(self) -> int:
+        return len(self._by_user)
+
+    def stats(self) -> dict:
+        """Outbound queue figures, including the current depth over all connections"""
+        depths = [connection.queue_depth for connection in self._by_id.values()]
+        return {
+            **queue_counters,
+            "queued": sum(depths),
+            "deepest_queue": max(depths, default=0),
+            "policy": settings.WS_SEND_OVERFLOW_POLICY,
+            "capacity": settings.WS_SEND_QUEUE_SIZE
+        }
+
+
+class HeartbeatWheel:
+    """
+    One timer for all of this worker's sockets instead of a keep-alive task each.
+
+    Connections are spread over a wheel of WS_PING_INTERVAL_SECONDS one-second
+    buckets. Every second the wheel advances one bucket and pings the sockets
+    in it as one concurrent batch, so each socket is pinged once per interval
+    and the pings are spread evenly over it. Sockets that have sent nothing
+    (not even a pong) for WS_PONG_TIMEOUT_SECONDS are closed and removed.
+    """
+
+    def __init__(self, size: int):
+        self._buckets: List[Set[int]] = [set() for _ in range(size)]
+        self._position = 0
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"pings": 0, "reaped": 0}
+
+    def schedule(self, connection: Connection):
+        # The bucket just behind the hand comes round last, a full interval from now
+        connection.slot = (self._position - 1) % len(self._buckets)
+        self._buckets[connection.slot].add(connection.id)
+
+    def unschedule(self, connection: Connection):
+        if connection.slot is not None:
+            self._buckets[connection.slot].discard(connection.id)
+            connection.slot = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            next_tick += 1
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            self._position = (self._position + 1) % len(self._buckets)
+            try:
+                await self._tick(self._buckets[self._position])
+            except Exception as e:
+                logger.error(f"WebSocket heartbeat tick failed: {e}")
+
+    async def _tick(self, bucket: Set[int]):
+        if not bucket:
+            return
+        now = time.monotonic()
+        to_ping, to_reap = [], []
+        for connection_id in list(bucket):
+            connection = connection_registry.get(connection_id)
+            if connection is None:
+                bucket.discard(connection_id)
+            elif now - connection.last_seen > settings.WS_PONG_TIMEOUT_SECONDS:
+                to_reap.append(connection)
+            else:
+                to_ping.append(connection)
+
+        await asyncio.gather(
+            *[self._ping(connection) for connection in to_ping],
+            *[self._reap(connection) for connection in to_reap]
+        )
+
+    async def _ping(self, connection: Connection):
+        # Through the send queue, so a ping never interleaves with another write;
+        # a failed send closes the connection from the writer
+        if connection.send("ping", kind="ping"):
+            self.counters["pings"] += 1
+
+    async def _reap(self, connection: Connection):
+        if connection.closing:
+            return
+        self.counters["reaped"] += 1
+        logger.info(f"Closing unresponsive WebSocket for user {connection.user_id}")
+        await connection.close(status.WS_1001_GOING_AWAY, "Heartbeat timeout")
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "connections": len(connection_registry),
+            "users": connection_registry.user_count()
+        }
+
+# Global registry and heartbeat for this worker; the wheel is started at application startup
+heartbeat_wheel = HeartbeatWheel(settings.WS_PING_INTERVAL_SECONDS)
+connection_registry = ConnectionRegistry()
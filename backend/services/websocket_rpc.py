@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from jose import jwt
+from pydantic import ValidationError
+from config.settings import settings
+from models.goal import GoalCreate, GoalStatus
+from models.task import TaskCreate, TaskStatus
+from services.auth_service import account_status_cache
+from services.goal_service import create_goal, get_goals_by_user, get_goal_by_id_and_user, update_goal, delete_goal
+from services.task_service import create_task, get_tasks_by_user, update_task, delete_task, filter_tasks
+from services.token_revocation_service import token_revocations
+from services.websocket_connections import RPC_REPLY_KIND, Connection, encode_message
+
+logger = logging.getLogger(__name__)
+
+def _param(params: dict, name: str) -> Any:
+    if params.get(name) is None:
+        raise ValueError(f"Missing parameter: {name}")
+    return params[name]
+
+def _not_found(entity: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{entity} not found or not authorized")
+
+async def _goal_list(user_id: str, params: dict):
+    status_filter = GoalStatus(params["status"]) if params.get("status") else None
+    return await get_goals_by_user(user_id, status_filter=status_filter)
+
+async def _goal_get(user_id: str, params: dict):
+    goal = await get_goal_by_id_and_user(_param(params, "id"), user_id)
+    if not goal:
+        raise _not_found("Goal")
+    return goal
+
+async def _goal_create(user_id: str, params: dict):
+    return await create_goal(GoalCreate(**params), user_id)
+
+async def _goal_update(user_id: str, params: dict):
+    return await update_goal(_param(params, "id"), user_id, dict(_param(params, "changes")))
+
+async def _goal_delete(user_id: str, params: dict):
+    if not await delete_goal(_param(params, "id"), user_id):
+        raise _not_found("Goal")
+    return None
+
+async def _task_list(user_id: str, params: dict):
+    task_status = TaskStatus(params["status"]) if params.get("status") else None
+    return filter_tasks(await get_tasks_by_user(user_id), task_status, params.get("filter"))
+
+async def _task_get(user_id: str, params: dict):
+    task_id = _param(params, "id")
+    task = next((task for task in await get_tasks_by_user(user_id) if task.id == task_id), None)
+    if not task:
+        raise _not_found("Task")
+    return task
+
+async def _task_create(user_id: str, params: dict):
+    return await create_task(TaskCreate(**params), user_id)
+
+async def _task_update(user_id: str, params: dict):
+    task = await update_task(_param(params, "id"), user_id, dict(_param(params, "changes")))
+    if not task:
+        raise _not_found("Task")
+    return task
+
+async def _task_delete(user_id: str, params: dict):
+    if not await delete_task(_param(params, "id"), user_id):
+        raise _not_found("Task")
+    return None
+
+# Operation name -> handler(user_id, params); each mirrors the HTTP route of the same name
+RPC_OPERATIONS: Dict[str, Callable[[str, dict], Awaitable[Any]]] = {
+    "goal.list": _goal_list,
+    "goal.get": _goal_get,
+    "goal.create": _goal_create,
+    "goal.update": _goal_update,
+    "goal.delete": _goal_delete,
+    "task.list": _task_list,
+    "task.get": _task_get,
+    "task.create": _task_create,
+    "task.update": _task_update,
+    "task.delete": _task_delete,
+}
+
+
+class RpcSession:
+    """
+    Request/response calls over an accepted WebSocket.
+
+    A call is {"type": "rpc", "id": <correlation id>, "op": "task.update",
+    "params": {"id": "...", "changes": {...}}}. The reply is
+    {"type": "rpc_result", "id": ..., "ok": true, "result": ...} or, on
+    failure, "ok": false with "error": {"status": ..., "detail": ...} using
+    the status codes of the equivalent HTTP route.
+
+    The socket's token was verified when it was accepted, so calls skip
+    decoding it again, but every call is checked like an HTTP request with
+    claims-based auth: it is refused with 401 once the token has expired or
+    been revoked, or the account is disabled or deleted. Calls are
+    pipelined: up to WS_RPC_MAX_IN_FLIGHT run concurrently and each reply is
+    sent as soon as it is ready, so replies can arrive out of order and a
+    call that depends on another should wait for that call's reply. At most
+    WS_RPC_MAX_PENDING calls may be running or waiting; further calls are
+    answered with 429 at once. Replies go through the socket's send queue,
+    which never drops them.
+    """
+
+    def __init__(self, connection: Connection, token: str):
+        self.connection = connection
+        self.user_id = connection.user_id
+        # The signature was checked on accept; the claims are kept for the per-call checks
+        self.claims: dict = jwt.get_unverified_claims(token)
+        self.expires_at: Optional[int] = self.claims.get("exp")
+        self._in_flight = asyncio.Semaphore(settings.WS_RPC_MAX_IN_FLIGHT)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, request: dict):
+        """Run a call in the background; its reply is queued on the socket when done"""
+        if len(self._tasks) >= settings.WS_RPC_MAX_PENDING:
+            # Refused at once so a flooding client cannot pile up waiting tasks
+            self._reply(self._error(request.get("id"), status.HTTP_429_TOO_MANY_REQUESTS, "Too many pending calls"))
+            return
+        task = asyncio.create_task(self._run(request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def cancel(self):
+        """Abandon calls still running when the socket goes away"""
+        for task in self._tasks:
+            task.cancel()
+
+    async def _authorize(self):
+        if self.expires_at is not None and time.time() >= self.expires_at:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
+        if await token_revocations.is_revoked(self.claims):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+        if await account_status_cache.role(self.user_id) is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+    async def _run(self, request: dict):
+        call_id = request.get("id")
+        async with self._in_flight:
+            try:
+                await self._authorize()
+                operation = RPC_OPERATIONS.get(request.get("op"))
+                if operation is None:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown operation: {request.get('op')}")
+                params = request.get("params") or {}
+                if not isinstance(params, dict):
+                    raise ValueError("params must be an object")
+                result = await operation(self.user_id, params)
+                reply = {"type": "rpc_result", "id": call_id, "ok": True, "result": jsonable_encoder(result)}
+            except HTTPException as e:
+                reply = self._error(call_id, e.status_code, e.detail)
+            except ValidationError as e:
+                reply = self._error(call_id, status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                    jsonable_encoder(e.errors(include_url=False, include_context=False)))
+            except ValueError as e:
+                reply = self._error(call_id, status.HTTP_400_BAD_REQUEST, str(e))
+            except Exception as e:
+                logger.error(f"RPC {request.get('op')} failed for user {self.user_id}: {e}")
+                reply = self._error(call_id, status.HTTP_500_INTERNAL_SERVER_ERROR, "Internal server error")
+        self._reply(reply)
+
+    def _reply(self, reply: dict):
+        self.connection.send(encode_message(reply, self.connection.encoding), RPC_REPLY_KIND)
+
+    @staticmethod
+    def _error(call_id: Any, status_code: int, detail: Any) -> dict:
+        return {"type": "rpc_result", "id": call_id, "ok": False, "error": {"status": status_code, "detail": detail}}
@@ -0,0 +1,46 @@
+import asyncio
+import inspect
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Settings are read at import time; point them at a throwaway database first
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017/los_test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("REFRESH_SECRET_KEY", "test-refresh-secret")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run `async def` tests on a fresh event loop"""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """An empty in-memory database behind get_db() and the service singletons"""
+    from services import goal_service, task_service
+    from services.auth_service import account_status_cache
+    from services.token_revocation_service import token_revocations
+
+    client = AsyncMongoMockClient()
+    test_db = client["los_test"]
+    monkeypatch.setattr(database, "client", client)
+    monkeypatch.setattr(database, "db", test_db)
+    monkeypatch.setattr(goal_service._goal_service, "collection", test_db.goals)
+    monkeypatch.setattr(task_service._task_service, "collection", test_db.tasks)
+    # Per-worker caches would otherwise carry state from one test into the next
+    account_status_cache.invalidate()
+    token_revocations.__init__()
+    return test_db
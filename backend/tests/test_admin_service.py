@@ -0,0 +1,116 @@
+import pytest
+from bson import ObjectId
+
+from config.settings import settings
+from models.user import BulkUserChanges, BulkUserFilter, BulkUserUpdate
+from services.admin_service import AdminService
+from services.user_search_service import UserSearchService
+
+
+async def create_users(db, count, role="User"):
+    ids = []
+    for index in range(count):
+        email, name = f"user{index:03}@example.com", f"User {index}"
+        result = await db.users.insert_one({
+            "email": email, "name": name, "role": role,
+            **UserSearchService.search_fields(email, name, role)
+        })
+        ids.append(result.inserted_id)
+    return ids
+
+
+def test_cursor_round_trip():
+    user_id = ObjectId()
+
+    assert AdminService.decode_cursor(AdminService.encode_cursor("before", user_id)) == ("before", user_id)
+
+
+@pytest.mark.parametrize("cursor", ["garbage", AdminService.encode_cursor("sideways", ObjectId())])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        AdminService.decode_cursor(cursor)
+
+
+async def test_pages_forward_and_back(db):
+    ids = [str(user_id) for user_id in await create_users(db, 5)]
+
+    first = await AdminService.list_users(limit=2)
+    assert [user["id"] for user in first["users"]] == ids[:2]
+    assert first["prev_cursor"] is None
+
+    second = await AdminService.list_users(limit=2, cursor=first["next_cursor"])
+    third = await AdminService.list_users(limit=2, cursor=second["next_cursor"])
+    assert [user["id"] for user in second["users"]] == ids[2:4]
+    assert [user["id"] for user in third["users"]] == ids[4:]
+    assert third["next_cursor"] is None
+
+    back = await AdminService.list_users(limit=2, cursor=third["prev_cursor"])
+    assert [user["id"] for user in back["users"]] == ids[2:4]
+    assert back["next_cursor"] is not None
+
+
+async def test_pages_do_not_shift_when_earlier_users_are_removed(db):
+    ids = [str(user_id) for user_id in await create_users(db, 4)]
+    first = await AdminService.list_users(limit=2)
+
+    await db.users.delete_one({"_id": ObjectId(ids[0])})
+    second = await AdminService.list_users(limit=2, cursor=first["next_cursor"])
+
+    assert [user["id"] for user in second["users"]] == ids[2:]
+
+
+async def test_list_hides_deleted_and_filters_by_role(db):
+    users = await create_users(db, 3)
+    admins = await create_users(db, 2, role="Admin")
+    await db.users.update_one({"_id": users[0]}, {"$set": {"deleted_at": users[0].generation_time}})
+
+    everyone = await AdminService.list_users(limit=10)
+    only_admins = await AdminService.list_users(limit=10, role_filter="admin")
+
+    assert len(everyone["users"]) == 4
+    assert [user["id"] for user in only_admins["users"]] == [str(user_id) for user_id in admins]
+
+
+async def test_bulk_update_refuses_too_many_ids(db, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_BULK_MAX_USERS", 2)
+    request = BulkUserUpdate(ids=[str(ObjectId()) for _ in range(3)], changes=BulkUserChanges(disabled=True))
+
+    with pytest.raises(ValueError, match="At most 2 ids"):
+        await AdminService.bulk_update(request, actor_id="admin")
+
+
+async def test_bulk_update_refuses_too_broad_filter(db, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_BULK_MAX_USERS", 2)
+    await create_users(db, 3)
+    request = BulkUserUpdate(filter=BulkUserFilter(role="User"), changes=BulkUserChanges(disabled=True))
+
+    with pytest.raises(ValueError, match="more than 2 users"):
+        await AdminService.bulk_update(request, actor_id="admin")
+    assert await db.users.count_documents({"disabled": True}) == 0
+
+
+async def test_bulk_update_reports_each_user(db):
+    users = await create_users(db, 2)
+    actor = (await create_users(db, 1, role="Admin"))[0]
+    await db.users.update_one({"_id": users[1]}, {"$set": {"disabled": True}})
+    request = BulkUserUpdate(
+        ids=[str(users[0]), str(users[1]), str(actor), "not-an-id", str(ObjectId())],
+        changes=BulkUserChanges(disabled=True)
+    )
+
+    result = await AdminService.bulk_update(request, actor_id=str(actor))
+
+    assert result["summary"] == {"invalid_id": 1, "not_found": 1, "updated": 1, "unchanged": 1, "skipped": 1}
+    assert (await db.users.find_one({"_id": users[0]}))["disabled"] is True
+    assert (await db.users.find_one({"_id": actor})).get("disabled") is None
+    assert await db.admin_audit.count_documents({}) == 1
+
+
+async def test_bulk_delete_queues_users(db):
+    users = await create_users(db, 2)
+
+    result = await AdminService.bulk_delete([str(user_id) for user_id in users], None, actor_id="admin")
+
+    assert result["summary"] == {"queued": 2}
+    assert await db.user_deletions.count_documents({}) == 2
+    assert await db.users.count_documents({"deleted_at": {"$exists": True}}) == 2
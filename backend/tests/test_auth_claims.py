@@ -0,0 +1,79 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from services.auth_service import account_status_cache, create_access_token, get_token_user, require_role
+from services.token_revocation_service import token_revocations
+
+
+async def create_user(db, role="User", **fields):
+    return str((await db.users.insert_one({"email": "user@example.com", "role": role, **fields})).inserted_id)
+
+
+def token_for(user_id, role="User"):
+    return create_access_token({"sub": user_id, "role": role})
+
+
+async def test_token_user_comes_from_claims(db):
+    user_id = await create_user(db)
+
+    user = await get_token_user(token_for(user_id))
+
+    assert (user.id, user.role) == (user_id, "User")
+
+
+@pytest.mark.parametrize("fields", [{"disabled": True}, {"deleted_at": "2026-01-01"}])
+async def test_inactive_account_is_refused(db, fields):
+    user_id = await create_user(db, **fields)
+
+    with pytest.raises(HTTPException) as error:
+        await get_token_user(token_for(user_id))
+    assert error.value.status_code == 401
+
+
+async def test_token_with_outdated_role_is_refused(db):
+    user_id = await create_user(db, role="Admin")
+    token = token_for(user_id, role="Admin")
+    await get_token_user(token)
+
+    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"role": "User"}})
+    account_status_cache.invalidate(user_id)
+
+    with pytest.raises(HTTPException) as error:
+        await get_token_user(token)
+    assert error.value.detail == "Token role is out of date"
+
+
+async def test_revoked_token_is_refused(db):
+    user_id = await create_user(db)
+    token = token_for(user_id)
+
+    await token_revocations.revoke_user(user_id)
+
+    with pytest.raises(HTTPException) as error:
+        await get_token_user(token)
+    assert error.value.detail == "Token has been revoked"
+    assert (await get_token_user(token_for(user_id))).id == user_id
+
+
+async def test_account_status_is_cached(db):
+    user_id = await create_user(db)
+    await get_token_user(token_for(user_id))
+
+    # Not seen until the entry expires or this worker invalidates it
+    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"disabled": True}})
+    assert (await get_token_user(token_for(user_id))).id == user_id
+
+    account_status_cache.invalidate(user_id)
+    with pytest.raises(HTTPException):
+        await get_token_user(token_for(user_id))
+
+
+async def test_require_role(db):
+    check_admin = require_role("Admin")
+    admin_id, user_id = await create_user(db, role="Admin"), await create_user(db)
+
+    assert (await check_admin(await get_token_user(token_for(admin_id, "Admin")))).id == admin_id
+    with pytest.raises(HTTPException) as error:
+        await check_admin(await get_token_user(token_for(user_id)))
+    assert error.value.status_code == 403
@@ -0,0 +1,38 @@
+from bson import ObjectId
+
+from models.user import UserInDB
+from models.user_deletion import UserDeletionStatus
+from routes import auth
+from services.websocket_bus import websocket_bus
+
+
+def route(path, method):
+    return next(r for r in auth.router.routes if r.path == path and method in r.methods)
+
+
+async def create_user(db):
+    user_id = str((await db.users.insert_one({"email": "user@example.com", "hashed_password": "x"})).inserted_id)
+    return UserInDB(id=user_id, email="user@example.com", hashed_password="x")
+
+
+async def test_delete_account_is_accepted_with_job_progress(db):
+    user = await create_user(db)
+
+    deletion = await auth.delete_account(current_user=user)
+
+    assert route("/auth/account", "DELETE").status_code == 202
+    assert deletion.user_id == user.id
+    assert deletion.status == UserDeletionStatus.PENDING
+    assert "deleted_at" in await db.users.find_one({"_id": ObjectId(user.id)})
+
+
+async def test_failed_broadcast_does_not_fail_the_request(db, monkeypatch):
+    async def publish(user_id, payload):
+        raise RuntimeError("bus unavailable")
+
+    monkeypatch.setattr(websocket_bus, "publish", publish)
+    user = await create_user(db)
+
+    deletion = await auth.delete_account(current_user=user)
+
+    assert deletion.user_id == user.id
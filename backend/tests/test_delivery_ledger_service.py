@@ -0,0 +1,33 @@
+import asyncio
+
+from services.delivery_ledger_service import DeliveryLedgerService
+
+
+async def test_each_reminder_is_claimed_once(db):
+    await DeliveryLedgerService.ensure_indexes()
+
+    results = await asyncio.gather(*[
+        DeliveryLedgerService.claim("u1", "morning", "2026-01-01") for _ in range(5)
+    ])
+
+    assert results.count(True) == 1
+    assert await DeliveryLedgerService.claim("u1", "evening", "2026-01-01")
+    assert await DeliveryLedgerService.claim("u1", "morning", "2026-01-02")
+
+
+async def test_released_claim_can_be_retried(db):
+    await DeliveryLedgerService.ensure_indexes()
+    await DeliveryLedgerService.claim("u1", "morning", "2026-01-01")
+
+    await DeliveryLedgerService.release("u1", "morning", "2026-01-01")
+
+    assert await DeliveryLedgerService.claim("u1", "morning", "2026-01-01")
+
+
+async def test_job_is_attached_to_entry(db):
+    await DeliveryLedgerService.claim("u1", "morning", "2026-01-01")
+
+    await DeliveryLedgerService.attach_job("u1", "morning", "2026-01-01", "job-1")
+
+    entry = await db.reminder_deliveries.find_one({"user_id": "u1"})
+    assert entry["job_id"] == "job-1"
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from config.settings import settings
+from services.export_service import EXPORT_FIELDS, ExportService
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+async def test_csv_export_has_header_and_rows(db):
+    await db.goals.insert_many([
+        {"user_id": "u1", "title": f"Goal {i}", "status": "active", "created_at": datetime(2026, 1, 1)}
+        for i in range(3)
+    ])
+
+    chunks = await collect(ExportService.stream("goals", "csv"))
+
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert list(rows[0]) == EXPORT_FIELDS["goals"]
+    assert [row["title"] for row in rows] == ["Goal 0", "Goal 1", "Goal 2"]
+    assert rows[0]["created_at"] == "2026-01-01T00:00:00"
+
+
+async def test_export_is_streamed_in_chunks(db, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_CHUNK_BYTES", 200)
+    await db.tasks.insert_many([{"user_id": "u1", "goal_id": "g1", "title": "x" * 50} for _ in range(20)])
+
+    chunks = await collect(ExportService.stream("tasks", "ndjson"))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) < 400 for chunk in chunks)
+    assert len("".join(chunks).splitlines()) == 20
+
+
+async def test_user_export_contains_only_their_data(db):
+    user_id = str((await db.users.insert_one({"email": "a@example.com", "hashed_password": "secret"})).inserted_id)
+    await db.goals.insert_many([{"user_id": user_id, "title": "Mine"}, {"user_id": "other", "title": "Theirs"}])
+    await db.tasks.insert_one({"user_id": user_id, "goal_id": "g1", "title": "Task"})
+
+    lines = [json.loads(line) for line in "".join(await collect(ExportService.stream_user_data(user_id))).splitlines()]
+
+    assert [line["type"] for line in lines] == ["user", "goal", "task"]
+    assert lines[0]["id"] == user_id and "hashed_password" not in lines[0]
+    assert lines[1]["title"] == "Mine"
+
+
+async def test_csv_cells_cannot_become_formulas(db):
+    titles = ["=HYPERLINK(\"http://evil\")", "+1", "-2", "@SUM(A1)", "\tTab", "\rReturn", "Plain - title"]
+    await db.tasks.insert_many([{"user_id": "u1", "goal_id": "g1", "title": title} for title in titles])
+
+    csv_rows = list(csv.DictReader(io.StringIO("".join(await collect(ExportService.stream("tasks", "csv"))))))
+    ndjson_lines = "".join(await collect(ExportService.stream("tasks", "ndjson"))).splitlines()
+
+    assert [row["title"] for row in csv_rows] == ["'" + title for title in titles[:-1]] + ["Plain - title"]
+    # NDJSON is read by programs, not spreadsheets, and keeps the values as written
+    assert [json.loads(line)["title"] for line in ndjson_lines] == titles
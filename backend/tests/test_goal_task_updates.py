@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.goal import GoalCreate
+from models.task import TaskCreate
+from services.change_event_service import ChangeEventService
+from services.goal_service import create_goal, update_goal
+from services.task_service import create_task, update_task
+from utils.constants import CATEGORIES
+
+FORGED = {"version": 1000, "_id": "forged", "id": "forged", "user_id": "someone-else", "created_at": datetime(2000, 1, 1)}
+
+
+@pytest.fixture
+def events(monkeypatch):
+    published = []
+
+    async def publish(user_id, entity, entity_id, op, version, fields=None):
+        published.append({"user_id": user_id, "op": op, "version": version, "fields": fields})
+
+    monkeypatch.setattr(ChangeEventService, "publish", staticmethod(publish))
+    return published
+
+
+async def make_goal(user_id="u1"):
+    return await create_goal(GoalCreate(
+        title="Run", category=CATEGORIES[0], target_date=datetime.utcnow() + timedelta(days=30)
+    ), user_id)
+
+
+async def test_goal_update_ignores_server_fields(db, events):
+    goal = await make_goal()
+
+    updated = await update_goal(goal.id, "u1", {"title": "Run more", **FORGED})
+
+    assert updated.title == "Run more"
+    assert updated.version == goal.version + 1
+    assert updated.user_id == "u1"
+    assert updated.created_at != FORGED["created_at"]
+    assert await db.goals.count_documents({"user_id": "u1"}) == 1
+    assert not set(FORGED) & set(events[-1]["fields"])
+
+
+async def test_task_update_ignores_server_fields(db, events):
+    goal = await make_goal()
+    task = await create_task(TaskCreate(goal_id=goal.id, title="Lace up"), "u1")
+
+    updated = await update_task(task.id, "u1", {"title": "Lace up fast", **FORGED})
+
+    assert updated.title == "Lace up fast"
+    assert updated.version == task.version + 1
+    assert updated.user_id == "u1"
+    assert not set(FORGED) & set(events[-1]["fields"])
+
+
+async def test_task_update_with_only_server_fields_is_a_no_op(db, events):
+    goal = await make_goal()
+    task = await create_task(TaskCreate(goal_id=goal.id, title="Lace up"), "u1")
+
+    unchanged = await update_task(task.id, "u1", dict(FORGED))
+
+    assert unchanged.version == task.version
+    assert events[-1]["op"] == "created"
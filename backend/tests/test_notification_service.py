@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from services.notification_service import NotificationService
+
+NOW = datetime(2026, 1, 1, 8, 0)
+
+
+def subscription(user_id, endpoint, updated_at):
+    return {"user_id": user_id, "endpoint": endpoint, "p256dh": "key", "auth": "auth",
+            "created_at": updated_at, "updated_at": updated_at}
+
+
+async def test_ensure_indexes_removes_duplicate_endpoints_first(db):
+    await db.push_subscriptions.insert_many([
+        subscription("u1", "https://push.example/a", NOW - timedelta(days=2)),
+        subscription("u2", "https://push.example/a", NOW),
+        subscription("u3", "https://push.example/a", NOW - timedelta(days=1)),
+        subscription("u1", "https://push.example/b", NOW),
+    ])
+
+    await NotificationService.ensure_indexes()
+
+    remaining = await db.push_subscriptions.find({}, {"_id": 0, "user_id": 1, "endpoint": 1}).to_list(length=None)
+    assert sorted((s["endpoint"], s["user_id"]) for s in remaining) == [
+        ("https://push.example/a", "u2"), ("https://push.example/b", "u1")
+    ]
+    assert (await db.push_subscriptions.index_information())["endpoint_1"]["unique"]
+
+
+async def test_ensure_indexes_is_repeatable(db):
+    await NotificationService.ensure_indexes()
+    await db.push_subscriptions.insert_one(subscription("u1", "https://push.example/a", NOW))
+
+    await NotificationService.ensure_indexes()
+
+    assert await db.push_subscriptions.count_documents({}) == 1
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from config.settings import settings
+from models.notification import NotificationRequest, OutboxStatus, PushResult
+from services import outbox_service
+from services.outbox_service import OutboxService
+
+NOW = datetime(2026, 1, 1, 8, 0)
+LEASE = timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+
+
+async def enqueue(now=NOW):
+    return await OutboxService.enqueue(NotificationRequest(user_id="u1", title="Hi", body="Body"), now)
+
+
+async def test_claim_leases_due_job_once(db):
+    await enqueue()
+
+    job = await OutboxService.claim_job("a", NOW)
+    assert job["status"] == OutboxStatus.PROCESSING.value
+    assert job["lease_owner"] == "a"
+    assert job["attempts"] == 1
+    assert await OutboxService.claim_job("b", NOW) is None
+
+
+async def test_pending_job_not_claimed_before_due(db):
+    await enqueue(NOW + timedelta(minutes=5))
+
+    assert await OutboxService.claim_job("a", NOW) is None
+
+
+async def test_expired_lease_is_reclaimed(db):
+    await enqueue()
+    await OutboxService.claim_job("a", NOW)
+
+    assert await OutboxService.claim_job("b", NOW + LEASE - timedelta(seconds=1)) is None
+    job = await OutboxService.claim_job("b", NOW + LEASE)
+    assert job["lease_owner"] == "b"
+    assert job["attempts"] == 2
+
+
+async def test_stale_consumer_cannot_overwrite_outcome(db):
+    await enqueue()
+    first = await OutboxService.claim_job("a", NOW)
+    await OutboxService.claim_job("b", NOW + LEASE)
+
+    await OutboxService.complete_job(first, "a", PushResult(success=True), NOW + LEASE)
+
+    stored = await db.notification_outbox.find_one({"_id": first["_id"]})
+    assert stored["status"] == OutboxStatus.PROCESSING.value
+    assert stored["lease_owner"] == "b"
+
+
+async def test_retryable_failure_backs_off(db, monkeypatch):
+    monkeypatch.setattr(outbox_service.random, "uniform", lambda low, high: high)
+    await enqueue()
+    job = await OutboxService.claim_job("a", NOW)
+
+    status = await OutboxService.complete_job(
+        job, "a", PushResult(success=False, retryable=True, retry_endpoints=["e1"]), NOW
+    )
+
+    assert status == OutboxStatus.PENDING.value
+    stored = await db.notification_outbox.find_one({"_id": job["_id"]})
+    assert stored["next_attempt_at"] == NOW + timedelta(seconds=settings.OUTBOX_BACKOFF_BASE_SECONDS)
+    assert stored["endpoints"] == ["e1"]
+    assert stored["lease_owner"] is None
+
+
+def test_backoff_grows_and_respects_retry_after(monkeypatch):
+    monkeypatch.setattr(outbox_service.random, "uniform", lambda low, high: high)
+
+    assert OutboxService.compute_backoff(3) == min(
+        settings.OUTBOX_BACKOFF_MAX_SECONDS, settings.OUTBOX_BACKOFF_BASE_SECONDS * 4
+    )
+    assert OutboxService.compute_backoff(1, retry_after=10 ** 6) == 10 ** 6
+
+
+async def test_retryable_failure_on_last_attempt_is_dead(db):
+    await enqueue()
+    job = await OutboxService.claim_job("a", NOW)
+    await db.notification_outbox.update_one({"_id": job["_id"]}, {"$set": {"attempts": settings.OUTBOX_MAX_ATTEMPTS}})
+    job["attempts"] = settings.OUTBOX_MAX_ATTEMPTS
+
+    status = await OutboxService.complete_job(job, "a", PushResult(success=False, retryable=True), NOW)
+
+    assert status == OutboxStatus.DEAD.value
+
+
+async def test_poison_job_is_not_released_after_final_attempt(db):
+    job_id = await enqueue()
+    now = NOW
+    for _ in range(settings.OUTBOX_MAX_ATTEMPTS):
+        # The consumer crashes every time, so its lease just runs out
+        assert await OutboxService.claim_job("a", now) is not None
+        now += LEASE
+
+    assert await OutboxService.claim_job("a", now) is None
+    assert await OutboxService.dead_letter_expired(now) == 1
+    stored = await db.notification_outbox.find_one({"_id": ObjectId(job_id)})
+    assert stored["status"] == OutboxStatus.DEAD.value
+    assert stored["lease_owner"] is None
+
+
+async def test_dead_letter_sweep_leaves_live_leases(db):
+    await enqueue()
+    job = await OutboxService.claim_job("a", NOW)
+    await db.notification_outbox.update_one({"_id": job["_id"]}, {"$set": {"attempts": settings.OUTBOX_MAX_ATTEMPTS}})
+
+    assert await OutboxService.dead_letter_expired(NOW + LEASE - timedelta(seconds=1)) == 0
+
+
+
+
+async def test_dead_letters_are_logged(db, monkeypatch, caplog):
+    async def deliver(request, endpoints):
+        return PushResult(success=False, error="Gone", status_code=410)
+
+    monkeypatch.setattr(outbox_service.NotificationService, "deliver", deliver)
+    await enqueue(datetime.utcnow() - timedelta(minutes=1))
+
+    with caplog.at_level("WARNING", logger="services.outbox_service"):
+        stats = await OutboxService.process_outbox(consumers=1)
+
+    assert stats == {OutboxStatus.DEAD.value: 1}
+    assert "moved to dead-letter: Gone" in caplog.text
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config.settings import settings
+from services.partition_service import ReminderPartitionManager
+from services.reminder_service import REMINDER_SLOTS, ReminderService
+
+# Heartbeats carry a TTL index, which the in-memory database applies against the real clock
+NOW = datetime.utcnow().replace(microsecond=0)
+LEASE = timedelta(seconds=settings.REMINDER_PARTITION_LEASE_SECONDS)
+
+
+@pytest.fixture
+def partitions(monkeypatch):
+    monkeypatch.setattr(settings, "REMINDER_PARTITIONS", 4)
+    return 4
+
+
+def test_slot_ranges_cover_every_slot_once():
+    ranges = [ReminderPartitionManager.partition_slots(p, 3) for p in range(3)]
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == REMINDER_SLOTS
+    assert all(ranges[i][1] == ranges[i + 1][0] for i in range(2))
+
+
+def test_partitioning_off_handles_everyone(monkeypatch):
+    monkeypatch.setattr(settings, "REMINDER_PARTITIONS", 0)
+
+    assert ReminderPartitionManager("a").slot_ranges() is None
+
+
+async def test_workers_split_partitions_and_take_over(db, partitions):
+    a, b = ReminderPartitionManager("a"), ReminderPartitionManager("b")
+    await a.ensure_partitions()
+
+    await a.rebalance(NOW)
+    assert a.owned == [0, 1, 2, 3]
+    assert a.slot_ranges() == [(0, REMINDER_SLOTS)]
+
+    await b.rebalance(NOW)
+    assert b.owned == []
+    assert b.slot_ranges() == []
+    await a.rebalance(NOW + timedelta(seconds=1))
+    await b.rebalance(NOW + timedelta(seconds=1))
+    assert a.owned == [0, 1] and b.owned == [2, 3]
+
+    # a stops renewing; once its heartbeat and leases lapse b owns everything
+    later = NOW + timedelta(seconds=1) + LEASE
+    await b.rebalance(later)
+    assert b.owned == [0, 1, 2, 3]
+
+
+async def test_release_all_frees_partitions_at_once(db, partitions):
+    a, b = ReminderPartitionManager("a"), ReminderPartitionManager("b")
+    await a.ensure_partitions()
+    await a.rebalance(NOW)
+
+    await a.release_all()
+    await b.rebalance(NOW)
+
+    assert b.owned == [0, 1, 2, 3]
+
+
+async def test_worker_without_partitions_sends_nothing(db):
+    await db.users.insert_one({"email": "user@example.com", "notifications_enabled": True})
+
+    stats = await ReminderService.send_due_reminders(now=NOW, slot_ranges=[])
+
+    assert stats == {"eligible": 0, "queued": 0, "skipped": 0, "failed": 0}
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+from config.settings import settings
+from services.auth_service import create_access_token
+from services.token_revocation_service import BloomFilter, TokenRevocationList, token_revocations
+
+
+def claims(user_id="u1"):
+    return jwt.get_unverified_claims(create_access_token({"sub": user_id, "role": "User"}))
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1 << 12, 5)
+    keys = [f"jti-{i}" for i in range(200)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    assert sum(f"other-{i}" in bloom for i in range(1000)) < 50
+
+
+async def test_revoked_token_is_rejected(db):
+    revocations = TokenRevocationList()
+    revoked, other = claims(), claims()
+
+    await revocations.revoke_token(revoked["jti"], datetime.utcnow() + timedelta(minutes=5), "u1")
+
+    assert await revocations.is_revoked(revoked)
+    assert not await revocations.is_revoked(other)
+
+
+async def test_filter_hit_is_confirmed_in_database(db):
+    revocations = TokenRevocationList()
+    token = claims()
+    revocations._filter.add(token["jti"])  # A false positive
+
+    assert not await revocations.is_revoked(token)
+    assert revocations.counters["false_positives"] == 1
+
+
+async def test_user_revocation_covers_tokens_from_the_same_second(db):
+    # claims() stamps iat with the global list's clock
+    before = claims()
+
+    await token_revocations.revoke_user("u1")
+    after = claims()
+
+    assert await token_revocations.is_revoked(before)
+    assert not await token_revocations.is_revoked(after)
+    assert not await token_revocations.is_revoked(claims("u2"))
+
+
+async def test_user_revocation_is_immune_to_local_clock_skew(db, monkeypatch):
+    real_time = time.time
+    # This worker's clock runs 10 s behind the database's
+    monkeypatch.setattr(time, "time", lambda: real_time() - 10)
+    await token_revocations.rebuild()
+    assert abs(token_revocations.now() - real_time()) < 1
+    before = claims()
+
+    # Revoked by a worker whose clock is right
+    monkeypatch.setattr(time, "time", real_time)
+    other = TokenRevocationList()
+    await other.revoke_user("u1")
+    await asyncio.sleep(0.005)  # Past the millisecond the cut-off is rounded up to
+    monkeypatch.setattr(time, "time", lambda: real_time() - 10)
+    after = claims()
+
+    await token_revocations.sync()
+    assert await token_revocations.is_revoked(before)
+    assert not await token_revocations.is_revoked(after)
+
+
+async def test_other_worker_picks_up_revocations_on_sync(db):
+    here, there = TokenRevocationList(), TokenRevocationList()
+    await there.rebuild()
+    token, user_token = claims(), claims("u2")
+
+    await here.revoke_token(token["jti"], datetime.utcnow() + timedelta(minutes=5))
+    await here.revoke_user("u2")
+    assert not await there.is_revoked(token)
+
+    await there.sync()
+    assert await there.is_revoked(token)
+    assert await there.is_revoked(user_token)
+
+
+async def test_rebuild_drops_expired_tokens(db):
+    revocations = TokenRevocationList()
+    token = claims()
+    await revocations.revoke_token(token["jti"], datetime.utcnow() - timedelta(seconds=1))
+    revocations._confirmed.clear()
+
+    await revocations.rebuild()
+
+    assert token["jti"] not in revocations._filter
+    assert not await revocations.is_revoked(token)
+
+
+async def test_sync_rebuilds_when_due(db, monkeypatch):
+    revocations = TokenRevocationList()
+    await revocations.rebuild()
+    monkeypatch.setattr(settings, "TOKEN_REVOCATION_REBUILD_MINUTES", 0)
+    rebuilt_at = revocations._rebuilt_at
+    time.sleep(0.01)
+
+    await revocations.sync()
+
+    assert revocations._rebuilt_at > rebuilt_at
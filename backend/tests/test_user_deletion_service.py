@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from config.settings import settings
+from models.user_deletion import UserDeletionStatus
+from services.user_deletion_service import UserDeletionService
+
+LEASE = timedelta(seconds=settings.USER_DELETION_LEASE_SECONDS)
+
+
+@pytest.fixture(autouse=True)
+def no_batch_pause(monkeypatch):
+    monkeypatch.setattr(settings, "USER_DELETION_BATCH_PAUSE_SECONDS", 0)
+
+
+async def create_user(db, tasks=0):
+    result = await db.users.insert_one({"email": "user@example.com", "name": "User"})
+    user_id = str(result.inserted_id)
+    if tasks:
+        await db.tasks.insert_many([{"user_id": user_id, "title": f"Task {i}"} for i in range(tasks)])
+    await db.goals.insert_one({"user_id": user_id, "title": "Goal"})
+    return user_id
+
+
+async def test_request_tombstones_and_queues(db):
+    user_id = await create_user(db)
+
+    job = await UserDeletionService.request(user_id, requested_by="admin")
+
+    assert job.status == UserDeletionStatus.PENDING
+    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    assert user["disabled"] is True and "deleted_at" in user
+    assert (await UserDeletionService.request(user_id)).requested_by == "admin"
+
+
+async def test_request_unknown_user(db):
+    with pytest.raises(ValueError, match="User not found"):
+        await UserDeletionService.request(str(ObjectId()))
+
+
+async def test_retry_creates_job_missing_after_crash(db):
+    user_id = await create_user(db)
+    # A request that died after the tombstone but before its job was written
+    await db.users.update_one({"_id": ObjectId(user_id)}, UserDeletionService._tombstone(datetime.utcnow()))
+
+    job = await UserDeletionService.request(user_id)
+
+    assert job.status == UserDeletionStatus.PENDING
+    assert await db.user_deletions.count_documents({"_id": user_id}) == 1
+
+
+async def test_worker_applies_tombstone_missing_after_crash(db):
+    user_id = await create_user(db, tasks=2)
+    # A request that died after writing its job but before the tombstone
+    await db.user_deletions.update_one(
+        {"_id": user_id}, UserDeletionService._new_job(datetime.utcnow(), None), upsert=True
+    )
+
+    stats = await UserDeletionService.process_deletions("worker")
+
+    assert stats["users"] == 1
+    assert await db.users.count_documents({}) == 0
+
+
+async def test_process_removes_data_in_batches(db, monkeypatch):
+    monkeypatch.setattr(settings, "USER_DELETION_BATCH_SIZE", 2)
+    user_id = await create_user(db, tasks=5)
+    await UserDeletionService.request(user_id)
+
+    stats = await UserDeletionService.process_deletions("worker")
+
+    assert stats == {"users": 1, "documents": 7, "failed": 0}
+    progress = await UserDeletionService.get_progress(user_id)
+    assert progress.status == UserDeletionStatus.DONE
+    assert progress.deleted == {"tasks": 5, "goals": 1, "users": 1}
+
+
+async def test_expired_lease_resumes_from_saved_stage(db):
+    user_id = await create_user(db, tasks=3)
+    await UserDeletionService.request(user_id)
+    now = datetime.utcnow()
+    job = await UserDeletionService.claim_job("a", now)
+    # Worker a cleared tasks, then died
+    await db.tasks.delete_many({"user_id": user_id})
+    await db.user_deletions.update_one({"_id": user_id}, {"$set": {"stage": 1, "deleted.tasks": 3}})
+
+    assert await UserDeletionService.claim_job("b", now + LEASE - timedelta(seconds=1)) is None
+    job = await UserDeletionService.claim_job("b", now + LEASE)
+    assert job["lease_owner"] == "b" and job["attempts"] == 2
+    assert await UserDeletionService._run(job, "b") == 2
+
+    progress = await UserDeletionService.get_progress(user_id)
+    assert progress.deleted == {"tasks": 3, "goals": 1, "users": 1}
+
+
+async def test_lost_lease_stops_worker(db):
+    user_id = await create_user(db, tasks=1)
+    await UserDeletionService.request(user_id)
+    now = datetime.utcnow()
+    job = await UserDeletionService.claim_job("a", now)
+    await UserDeletionService.claim_job("b", now + LEASE)
+
+    assert await UserDeletionService._run(job, "a") is None
+
+
+async def test_job_fails_after_max_attempts(db):
+    user_id = await create_user(db)
+    await UserDeletionService.request(user_id)
+    now = datetime.utcnow()
+    for _ in range(settings.USER_DELETION_MAX_ATTEMPTS):
+        assert await UserDeletionService.claim_job("a", now) is not None
+        now += LEASE
+
+    assert await UserDeletionService.claim_job("a", now) is None
+    assert await UserDeletionService.fail_expired(now) == 1
+    progress = await UserDeletionService.get_progress(user_id)
+    assert progress.status == UserDeletionStatus.FAILED
+
+    retried = await UserDeletionService.request(user_id)
+    assert retried.status == UserDeletionStatus.PENDING
+    assert retried.attempts == 0
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from services import websocket_bus as bus_module
+from services.websocket_bus import WebSocketBus
+
+
+@pytest.fixture(autouse=True)
+def fast_reopen(monkeypatch):
+    monkeypatch.setattr(bus_module, "RETAIL_DELAY_SECONDS", 0.01)
+
+
+def message(user_id, text, message_id=None):
+    document = {"user_id": user_id, "payload": {"text": text}, "origin": "other-worker",
+                "published_at": datetime.utcnow()}
+    if message_id is not None:
+        document["_id"] = message_id
+    return document
+
+
+async def follow(bus):
+    delivered = []
+
+    async def deliver_local(user_id, payload):
+        delivered.append(payload["text"])
+        return 1
+
+    bus.start(deliver_local)
+    await asyncio.sleep(0.05)
+    return delivered
+
+
+async def test_messages_from_before_start_are_not_replayed(db):
+    await db.ws_bus.insert_one(message("u1", "old"))
+    bus = WebSocketBus()
+
+    delivered = await follow(bus)
+    bus.stop()
+
+    assert delivered == []
+
+
+async def test_reopened_tail_delivers_each_message_once(db):
+    bus = WebSocketBus()
+    delivered = await follow(bus)
+
+    await db.ws_bus.insert_one(message("u1", "first"))
+    await asyncio.sleep(0.05)
+    # Another worker's ObjectId can sort before ids this worker has already seen
+    await db.ws_bus.insert_one(message("u1", "late", ObjectId.from_datetime(datetime(2020, 1, 1))))
+    await asyncio.sleep(0.05)
+    bus.stop()
+
+    assert delivered == ["first", "late"]
+
+
+async def test_own_messages_are_not_delivered_twice(db):
+    bus = WebSocketBus()
+    delivered = await follow(bus)
+
+    await bus.publish("u1", {"text": "mine"})
+    await asyncio.sleep(0.05)
+    bus.stop()
+
+    assert delivered == ["mine"]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from config.settings import settings
+from services.websocket_connections import RPC_REPLY_KIND, Connection
+
+
+class StalledSocket:
+    """A client that never reads, so everything stays in the send queue"""
+
+    def __init__(self):
+        self.closed = None
+
+    async def send_text(self, message):
+        await asyncio.Event().wait()
+
+    async def close(self, code, reason):
+        self.closed = (code, reason)
+
+
+@pytest.fixture(autouse=True)
+def small_queue(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 3)
+
+
+def queued(connection):
+    return [message for _, message in connection._queue]
+
+
+async def open_connection():
+    connection = Connection(1, "u1", StalledSocket())
+    connection.send("in flight")  # Taken by the writer, which then stalls
+    await asyncio.sleep(0)
+    return connection
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "coalesce"])
+async def test_rpc_replies_are_never_dropped(monkeypatch, policy):
+    monkeypatch.setattr(settings, "WS_SEND_OVERFLOW_POLICY", policy)
+    connection = await open_connection()
+    connection.send("reply 1", RPC_REPLY_KIND)
+    connection.send("change", "change:task:1")
+    connection.send("reply 2", RPC_REPLY_KIND)
+
+    assert connection.send("reply 3", RPC_REPLY_KIND)
+    assert queued(connection) == ["reply 1", "reply 2", "reply 3"]
+
+    # Other messages find no room among the replies
+    assert not connection.send("change", "change:task:1")
+    assert queued(connection) == ["reply 1", "reply 2", "reply 3"]
+    assert not connection.closing
+
+
+async def test_reply_without_room_closes_the_socket(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_OVERFLOW_POLICY", "drop_oldest")
+    connection = await open_connection()
+    for index in range(3):
+        connection.send(f"reply {index}", RPC_REPLY_KIND)
+
+    assert not connection.send("reply 3", RPC_REPLY_KIND)
+    await asyncio.sleep(0.01)
+
+    assert connection.closing
+    assert connection.websocket.closed[1] == "Send queue overflow"
+
+
+async def test_drop_oldest_drops_other_messages(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_OVERFLOW_POLICY", "drop_oldest")
+    connection = await open_connection()
+    for index in range(3):
+        connection.send(f"message {index}")
+
+    assert connection.send("message 3")
+    assert queued(connection) == ["message 1", "message 2", "message 3"]
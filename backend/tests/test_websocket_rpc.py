@@ -0,0 +1,111 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from config.settings import settings
+
+from services.auth_service import account_status_cache, create_access_token
+from services.token_revocation_service import token_revocations
+from services.websocket_connections import JSON_SUBPROTOCOL, RPC_REPLY_KIND
+from services.websocket_rpc import RpcSession
+
+
+class FakeConnection:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.encoding = JSON_SUBPROTOCOL
+        self.sent = []
+        self.kinds = []
+
+    def send(self, message, kind=None):
+        self.kinds.append(kind)
+        self.sent.append(json.loads(message))
+        return True
+
+
+async def open_session(db, expires=timedelta(minutes=5)):
+    user_id = str((await db.users.insert_one({"email": "user@example.com", "role": "User"})).inserted_id)
+    token = create_access_token({"sub": user_id, "role": "User"}, expires)
+    connection = FakeConnection(user_id)
+    return RpcSession(connection, token), connection, user_id
+
+
+async def call(session, connection, op="goal.list", params=None):
+    await session._run({"type": "rpc", "id": len(connection.sent), "op": op, "params": params or {}})
+    return connection.sent[-1]
+
+
+async def test_call_succeeds_for_active_user(db):
+    session, connection, _ = await open_session(db)
+
+    reply = await call(session, connection)
+
+    assert reply["ok"] is True
+    assert reply["result"] == []
+
+
+async def test_call_refused_after_token_revoked(db):
+    session, connection, _ = await open_session(db)
+    assert (await call(session, connection))["ok"] is True
+
+    await token_revocations.revoke_token(session.claims["jti"], datetime.utcnow() + timedelta(minutes=5))
+
+    reply = await call(session, connection)
+    assert reply["ok"] is False
+    assert reply["error"]["status"] == 401
+
+
+async def test_call_refused_after_user_tokens_revoked(db):
+    session, connection, user_id = await open_session(db)
+    assert (await call(session, connection))["ok"] is True
+
+    await token_revocations.revoke_user(user_id)
+
+    assert (await call(session, connection))["error"]["status"] == 401
+
+
+async def test_call_refused_after_account_disabled(db):
+    session, connection, user_id = await open_session(db)
+    assert (await call(session, connection))["ok"] is True
+
+    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"disabled": True}})
+    account_status_cache.invalidate(user_id)
+
+    assert (await call(session, connection))["error"]["status"] == 401
+
+
+async def test_call_refused_after_token_expired(db):
+    session, connection, _ = await open_session(db, expires=timedelta(seconds=-1))
+
+    reply = await call(session, connection)
+
+    assert reply["error"] == {"status": 401, "detail": "Token has expired"}
+
+
+async def test_unknown_operation(db):
+    session, connection, _ = await open_session(db)
+
+    assert (await call(session, connection, op="goal.explode"))["error"]["status"] == 400
+
+
+async def test_replies_are_queued_as_rpc_results(db):
+    session, connection, _ = await open_session(db)
+
+    await call(session, connection)
+
+    assert connection.kinds == [RPC_REPLY_KIND]
+
+
+async def test_calls_beyond_pending_limit_are_refused(db, monkeypatch):
+    monkeypatch.setattr(settings, "WS_RPC_MAX_PENDING", 2)
+    session, connection, _ = await open_session(db)
+
+    for call_id in range(3):
+        session.submit({"type": "rpc", "id": call_id, "op": "goal.list"})
+    assert connection.sent == [{"type": "rpc_result", "id": 2, "ok": False,
+                                "error": {"status": 429, "detail": "Too many pending calls"}}]
+
+    await asyncio.gather(*session._tasks)
+    assert sorted(reply["id"] for reply in connection.sent if reply["ok"]) == [0, 1]
@@ -37,7 +37,7 @@ export function UserManagement() {
   const [loading, setLoading] = useState(true); // UI spinner while first query loads
   const [searchQuery, setSearchQuery] = useState('');
   const [roleFilter, setRoleFilter] = useState<string>('all');
-  const [currentPage, setCurrentPage] = useState(1);
+  const [pageCursor, setPageCursor] = useState<string | undefined>(undefined);
   const [isDeleteDialogOpen, setIsDeleteDialogOpen] = useState(false);
   const [userToDelete, setUserToDelete] = useState<User | null>(null);
   const [isDeleting, setIsDeleting] = useState(false);
@@ -47,7 +47,7 @@ export function UserManagement() {
   const [userDetailsId, setUserDetailsId] = useState<string | undefined>(undefined);
 
   // Queries & Mutations
-  const usersQuery = useAdminUsers({ page: currentPage, limit: ITEMS_PER_PAGE, search: searchQuery || undefined, role: roleFilter });
+  const usersQuery = useAdminUsers({ cursor: pageCursor, limit: ITEMS_PER_PAGE, search: searchQuery || undefined, role: roleFilter });
   const users: User[] = usersQuery.data?.users ?? [];
   const deleteUserMutation = useDeleteAdminUser();
   const updateUserRoleMutation = useUpdateAdminUserRole();
@@ -224,7 +224,7 @@ export function UserManagement() {
               value={searchQuery}
               onChange={(e: React.ChangeEvent<HTMLInputElement>) => {
                 setSearchQuery(e.target.value);
-                setCurrentPage(1);
+                setPageCursor(undefined);
               }}
             />
           </div>
@@ -233,7 +233,10 @@ export function UserManagement() {
             variant="subtle"
             size="sm"
             value={roleFilter}
-            onChange={(e: React.ChangeEvent<HTMLSelectElement>) => setRoleFilter(e.target.value)}
+            onChange={(e: React.ChangeEvent<HTMLSelectElement>) => {
+              setRoleFilter(e.target.value);
+              setPageCursor(undefined);
+            }}
             className="min-w-[120px]"
           >
             <SelectItem value="all">All Roles</SelectItem>
@@ -299,6 +302,28 @@ export function UserManagement() {
           </div>
         )}
 
+        <div className="flex justify-between items-center mt-4 text-sm">
+          <span className="text-gray-500">
+            {usersQuery.data?.total !== undefined ? `${usersQuery.data.total} users` : ''}
+          </span>
+          <div className="flex space-x-2">
+            <button
+              className="px-3 py-1 border rounded disabled:opacity-50"
+              disabled={!usersQuery.data?.prev_cursor}
+              onClick={() => setPageCursor(usersQuery.data?.prev_cursor ?? undefined)}
+            >
+              Previous
+            </button>
+            <button
+              className="px-3 py-1 border rounded disabled:opacity-50"
+              disabled={!usersQuery.data?.next_cursor}
+              onClick={() => setPageCursor(usersQuery.data?.next_cursor ?? undefined)}
+            >
+              Next
+            </button>
+          </div>
+        </div>
+
         <ConfirmDeleteDialog
           isOpen={isDeleteDialogOpen}
           itemName={userToDelete?.email || ''}
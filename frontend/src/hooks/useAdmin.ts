@@ -16,16 +16,25 @@ export interface AdminUser {
   }
 }
 
-export function useAdminUsers(params: { page: number; limit: number; search?: string; role?: string }) {
-  const { page, limit, search, role } = params
-  return useQuery<{ users: AdminUser[]; total?: number }>({
-    queryKey: ['admin', 'users', { page, limit, search: search ?? '', role: role ?? 'all' }],
+export interface AdminUsersPage {
+  users: AdminUser[]
+  total?: number
+  // Opaque cursors for the neighbouring pages; null at either end
+  next_cursor?: string | null
+  prev_cursor?: string | null
+}
+
+export function useAdminUsers(params: { cursor?: string; limit: number; search?: string; role?: string }) {
+  const { cursor, limit, search, role } = params
+  return useQuery<AdminUsersPage>({
+    queryKey: ['admin', 'users', { cursor: cursor ?? '', limit, search: search ?? '', role: role ?? 'all' }],
     queryFn: async () => {
-      const query = new URLSearchParams({ page: String(page), limit: String(limit) })
+      const query = new URLSearchParams({ limit: String(limit) })
+      if (cursor) query.append('cursor', cursor)
       if (search) query.append('search', search)
       if (role && role !== 'all') query.append('role', role)
       const { data } = await api.get(`/admin/users?${query.toString()}`)
-      return data as { users: AdminUser[]; total?: number }
+      return data as AdminUsersPage
     },
     staleTime: 10_000,
     placeholderData: keepPreviousData,
@@ -8,6 +8,7 @@ import { refreshToken } from './auth';
 import type { Goal, GoalStatus, CreateGoalPayload, UpdateGoalPayload } from '../types/goals'; // Added Goal types
 import type { Task, CreateTaskPayload, UpdateTaskPayload } from '../types/tasks'; // Added Task types
 import { AUTH_ROUTE } from '../routes/constants';
+import { RpcError, reconnectSocket, socketRpc } from './websocket';
 
 
 export const api = axios.create({
@@ -79,31 +80,75 @@ api.interceptors.response.use(
 );
 
 
-export async function getGoals(status?: GoalStatus): Promise<Goal[]> {
-  let url = `/goals/`;
-  if (status) {
-    url += `?status=${status}`;
+/**
+ * Goal and task calls go over the open WebSocket when there is one, skipping
+ * per-request HTTP auth, and over HTTP otherwise. Calls whose reply was lost
+ * with the socket are retried over HTTP unless they would not be safe to
+ * repeat (creates).
+ */
+async function overSocket<T>(op: string, params: object, http: () => Promise<T>, retryable = true): Promise<T> {
+  const call = socketRpc<T>(op, params);
+  if (!call) {
+    return http();
+  }
+  try {
+    return await call;
+  } catch (error) {
+    if (error instanceof RpcError && error.status === 401) {
+      // The socket's token expired: HTTP refreshes it, then the socket reconnects with the new one
+      const result = await http();
+      reconnectSocket();
+      return result;
+    }
+    if (error instanceof RpcError && error.status === 0 && retryable) {
+      return http();
+    }
+    throw error;
   }
-  const response = await api.get(url);
-  return response.data as Goal[];
+}
+
+export async function getGoals(status?: GoalStatus): Promise<Goal[]> {
+  return overSocket('goal.list', { status }, async () => {
+    let url = `/goals/`;
+    if (status) {
+      url += `?status=${status}`;
+    }
+    const response = await api.get(url);
+    return response.data as Goal[];
+  });
 }
 
 export async function createGoal(goalData: CreateGoalPayload): Promise<Goal> {
-  const response = await api.post('/goals/', goalData);
-  return response.data as Goal;
+  return overSocket('goal.create', goalData, async () => {
+    const response = await api.post('/goals/', goalData);
+    return response.data as Goal;
+  }, false);
 }
 
 export async function updateGoal(goalId: string, goalData: UpdateGoalPayload): Promise<Goal> {
-  const response = await api.put(`/goals/${goalId}`, goalData);
-  return response.data as Goal;
+  return overSocket('goal.update', { id: goalId, changes: goalData }, async () => {
+    const response = await api.put(`/goals/${goalId}`, goalData);
+    return response.data as Goal;
+  });
 }
 
 export async function deleteGoal(goalId: string): Promise<void> {
-  await api.delete(`/goals/${goalId}`);
+  return overSocket('goal.delete', { id: goalId }, async () => {
+    await api.delete(`/goals/${goalId}`);
+  });
 }
 
 // Task-related API endpoints
 export async function getTasks(status?: 'completed' | 'incomplete', filter?: 'today' | 'all'): Promise<Task[]> {
+  const rawData = await overSocket('task.list', { status, filter }, async () => fetchTasks(status, filter));
+  const tasks = rawData.map((task: { _id?: string; id?: string; [key: string]: unknown }) => ({
+    ...task,
+    id: task._id || task.id
+  })) as Task[];
+  return tasks;
+}
+
+async function fetchTasks(status?: 'completed' | 'incomplete', filter?: 'today' | 'all') {
   let url = `/tasks/`;
   const params = new URLSearchParams();
   if (status) {
@@ -116,23 +161,24 @@ export async function getTasks(status?: 'completed' | 'incomplete', filter?: 'to
     url += `?${params.toString()}`;
   }
   const response = await api.get(url);
-  const rawData = response.data;
-  const tasks = rawData.map((task: { _id?: string; id?: string; [key: string]: unknown }) => ({
-    ...task,
-    id: task._id || task.id
-  })) as Task[];
-  return tasks;
+  return response.data as { _id?: string; id?: string; [key: string]: unknown }[];
 }
 
 export async function createTask(taskData: CreateTaskPayload): Promise<Task> {
-  const response = await api.post('/tasks/', taskData);
-  return response.data as Task;
+  return overSocket('task.create', taskData, async () => {
+    const response = await api.post('/tasks/', taskData);
+    return response.data as Task;
+  }, false);
 }
 export async function updateTask(taskId: string, taskData: UpdateTaskPayload): Promise<Task> {
-  const response = await api.put(`/tasks/${taskId}`, taskData);
-  return response.data as Task;
+  return overSocket('task.update', { id: taskId, changes: taskData }, async () => {
+    const response = await api.put(`/tasks/${taskId}`, taskData);
+    return response.data as Task;
+  });
 }
 
 export async function deleteTask(taskId: string): Promise<void> {
-  await api.delete(`/tasks/${taskId}`);
+  return overSocket('task.delete', { id: taskId }, async () => {
+    await api.delete(`/tasks/${taskId}`);
+  });
 }
\ No newline at end of file
@@ -0,0 +1,64 @@
+import { queryClient } from '../lib/queryClient';
+
+export type ChangeEntity = 'goal' | 'task';
+export type ChangeOp = 'created' | 'updated' | 'deleted';
+
+export interface ChangeEvent {
+  type: 'change';
+  entity: ChangeEntity;
+  id: string;
+  op: ChangeOp;
+  version: number;
+  fields?: Record<string, unknown>;
+}
+
+interface Versioned {
+  id: string;
+  version?: number;
+}
+
+// Lists are filtered (and sorted) on the server, so changes that can move an
+// item between lists are refetched rather than patched
+const LIST_MEMBERSHIP_FIELDS = ['status', 'goal_id', 'created_at'];
+
+const isEntityQuery = (entity: ChangeEntity) => (q: { queryKey: readonly unknown[] }) =>
+  Array.isArray(q.queryKey) && q.queryKey[0] === `${entity}s`;
+
+/**
+ * Apply a goal/task change pushed by the server to every cached list, so
+ * other tabs and devices stay current without refetching whole lists.
+ */
+export function applyChangeEvent(event: ChangeEvent) {
+  const predicate = isEntityQuery(event.entity);
+  const fields = event.fields ?? {};
+
+  if (event.op === 'created' || Object.keys(fields).some((f) => LIST_MEMBERSHIP_FIELDS.includes(f))) {
+    queryClient.invalidateQueries({ predicate });
+    return;
+  }
+
+  queryClient
+    .getQueryCache()
+    .getAll()
+    .filter(predicate)
+    .forEach((q) => {
+      const key = q.queryKey as unknown[];
+      const items = queryClient.getQueryData<Versioned[]>(key);
+      if (!Array.isArray(items)) {
+        return;
+      }
+      if (event.op === 'deleted') {
+        queryClient.setQueryData<Versioned[]>(key, items.filter((item) => item.id !== event.id));
+        return;
+      }
+      queryClient.setQueryData<Versioned[]>(
+        key,
+        items.map((item) =>
+          // Skip events older than what this list already has
+          item.id === event.id && (item.version ?? 0) < event.version
+            ? { ...item, ...fields, version: event.version }
+            : item
+        )
+      );
+    });
+}
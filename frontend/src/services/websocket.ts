@@ -1,12 +1,39 @@
 import { refreshToken } from './auth';
+import { applyChangeEvent } from './realtimeSync';
 
 type AuthUpdateCallback = (authenticated: boolean) => void;
 
+const RPC_TIMEOUT_MS = 15000;
+
+/** A failed call over the socket; status 0 means the reply never arrived. */
+export class RpcError extends Error {
+  status: number;
+  detail: unknown;
+
+  constructor(status: number, detail: unknown) {
+    super(typeof detail === 'string' ? detail : `RPC failed with status ${status}`);
+    this.status = status;
+    this.detail = detail;
+  }
+}
+
+interface PendingCall {
+  resolve: (result: unknown) => void;
+  reject: (error: RpcError) => void;
+  timeoutId: number;
+}
+
+// The service whose socket is open, for socketRpc()
+let openService: WebSocketService | null = null;
+
 export class WebSocketService {
   private socket: WebSocket | null = null;
   private onAuthUpdate: AuthUpdateCallback;
   private intentionalDisconnect: boolean = false;
+  private reconnectImmediately: boolean = false;
   private reconnectTimeoutId: number | null = null;
+  private pendingCalls = new Map<number, PendingCall>();
+  private nextCallId = 1;
 
   constructor(onAuthUpdate: AuthUpdateCallback) {
     this.onAuthUpdate = onAuthUpdate;
@@ -41,6 +68,7 @@ export class WebSocketService {
     this.socket = new WebSocket(wsUrl);
     
     this.socket.onopen = () => {
+      openService = this;
       if (userEmail) {
         console.log(`WebSocket connection established for user: ${userEmail} (ID: ${userId})`);
       } else {
@@ -59,8 +87,13 @@ export class WebSocketService {
         // Attempt to parse other string messages as JSON
         try {
           const data = JSON.parse(event.data);
-          if (data.type === 'auth_update') {
+          if (data.type === 'rpc_result') {
+            this.settleCall(data);
+          } else if (data.type === 'auth_update') {
             this.onAuthUpdate(data.authenticated);
+          } else if (data.type === 'change') {
+            // Goal/task written elsewhere: patch cached lists instead of refetching
+            applyChangeEvent(data);
           }
           // Handle other structured JSON messages here
         } catch (e) {
@@ -79,12 +112,22 @@ export class WebSocketService {
     this.socket.onclose = async (event) => {
       console.log('WebSocket connection closed:', event.code, event.reason);
       this.socket = null; // Clear the socket reference
+      if (openService === this) {
+        openService = null;
+      }
+      this.failPendingCalls();
 
       if (this.reconnectTimeoutId) {
         clearTimeout(this.reconnectTimeoutId);
         this.reconnectTimeoutId = null;
       }
 
+      if (this.reconnectImmediately) {
+        this.reconnectImmediately = false;
+        this.connect(userId, userEmail);
+        return;
+      }
+
       if (this.intentionalDisconnect) {
         this.intentionalDisconnect = false; // Reset flag for future connections
         console.log('Intentional WebSocket disconnect. Not attempting to reconnect.');
@@ -111,6 +154,56 @@ export class WebSocketService {
     };
   }
 
+  /**
+   * Call a goal/task operation over the socket. The socket was authenticated
+   * when it connected, so calls skip per-request auth; several calls can be
+   * in flight at once and replies are matched by id.
+   */
+  call<T>(op: string, params: object = {}): Promise<T> {
+    if (!this.socket || this.socket.readyState !== WebSocket.OPEN) {
+      return Promise.reject(new RpcError(0, 'WebSocket is not open'));
+    }
+    const id = this.nextCallId++;
+    return new Promise<T>((resolve, reject) => {
+      const timeoutId = window.setTimeout(() => {
+        this.pendingCalls.delete(id);
+        reject(new RpcError(0, `${op} timed out`));
+      }, RPC_TIMEOUT_MS);
+      this.pendingCalls.set(id, { resolve: resolve as (result: unknown) => void, reject, timeoutId });
+      this.socket!.send(JSON.stringify({ type: 'rpc', id, op, params }));
+    });
+  }
+
+  /** Reconnect now, picking up a refreshed access token. */
+  reconnect() {
+    if (this.socket) {
+      this.reconnectImmediately = true;
+      this.socket.close();
+    }
+  }
+
+  private settleCall(data: { id: number; ok: boolean; result?: unknown; error?: { status: number; detail: unknown } }) {
+    const call = this.pendingCalls.get(data.id);
+    if (!call) {
+      return; // Timed out already
+    }
+    this.pendingCalls.delete(data.id);
+    clearTimeout(call.timeoutId);
+    if (data.ok) {
+      call.resolve(data.result);
+    } else {
+      call.reject(new RpcError(data.error?.status ?? 500, data.error?.detail));
+    }
+  }
+
+  private failPendingCalls() {
+    this.pendingCalls.forEach((call) => {
+      clearTimeout(call.timeoutId);
+      call.reject(new RpcError(0, 'WebSocket closed before the reply arrived'));
+    });
+    this.pendingCalls.clear();
+  }
+
   disconnect() {
     if (this.reconnectTimeoutId) {
       clearTimeout(this.reconnectTimeoutId);
@@ -122,4 +215,14 @@ export class WebSocketService {
       // this.socket = null; // Let onclose handle this
     }
   }
-}
\ No newline at end of file
+}
+
+/** Call over the open socket, or null when there is none and HTTP should be used. */
+export function socketRpc<T>(op: string, params: object = {}): Promise<T> | null {
+  return openService ? openService.call<T>(op, params) : null;
+}
+
+/** Reconnect the open socket, e.g. after its token expired and HTTP refreshed it. */
+export function reconnectSocket() {
+  openService?.reconnect();
+}
@@ -13,16 +13,19 @@ describe('useAdmin hooks', () => {
     const qc = createTestQueryClient()
     const wrapper = withQueryClient(qc)
 
-    const { result, rerender } = renderHook(({ page }) => useAdminUsers({ page, limit: 2 }), {
-      initialProps: { page: 1 },
-      wrapper,
-    })
+    const { result, rerender } = renderHook(
+      ({ cursor }: { cursor?: string }) => useAdminUsers({ cursor, limit: 2 }),
+      { initialProps: {} as { cursor?: string }, wrapper }
+    )
 
     await waitFor(() => expect(result.current.isSuccess).toBe(true))
     const firstPageUserIds = (result.current.data?.users ?? []).map((u) => u.id)
+    const nextCursor = result.current.data?.next_cursor
+    expect(nextCursor).toBeTruthy()
+    expect(result.current.data?.prev_cursor).toBeNull()
 
     // Move to page 2, placeholderData should keep previous page content until fetch resolves
-    rerender({ page: 2 })
+    rerender({ cursor: nextCursor! })
     expect((result.current.data?.users ?? []).map((u) => u.id)).toEqual(firstPageUserIds)
 
     // Wait until the fetched page replaces the placeholder
@@ -30,13 +33,15 @@ describe('useAdmin hooks', () => {
       const ids = (result.current.data?.users ?? []).map((u) => u.id)
       expect(ids).not.toEqual(firstPageUserIds)
     })
+    expect(result.current.data?.next_cursor).toBeNull()
+    expect(result.current.data?.prev_cursor).toBeTruthy()
   })
 
   it('deletes a user and invalidates the list', async () => {
     const qc = createTestQueryClient()
     const wrapper = withQueryClient(qc)
 
-    const { result: list } = renderHook(() => useAdminUsers({ page: 1, limit: 10 }), { wrapper })
+    const { result: list } = renderHook(() => useAdminUsers({ limit: 10 }), { wrapper })
     await waitFor(() => expect(list.current.isSuccess).toBe(true))
     const initialCount = list.current.data?.users.length ?? 0
 
@@ -52,7 +57,7 @@ describe('useAdmin hooks', () => {
     const qc = createTestQueryClient()
     const wrapper = withQueryClient(qc)
 
-    const { result: list } = renderHook(() => useAdminUsers({ page: 1, limit: 10 }), { wrapper })
+    const { result: list } = renderHook(() => useAdminUsers({ limit: 10 }), { wrapper })
     await waitFor(() => expect(list.current.isSuccess).toBe(true))
     const user = list.current.data!.users.find((u) => u.id === 'u1')!
     expect(user.role).toBe('user')
@@ -44,21 +44,38 @@ export const handlers = [
     return HttpResponse.json(preferences)
   }),
 
-  // Admin: list users with pagination (2 per page) and optional role/search filters
+  // Admin: list users with keyset pagination by id (cursors are "after:<id>" / "before:<id>") and optional role/search filters
   http.get('*/admin/users', async ({ request }) => {
     const url = new URL(request.url)
-    const page = Number(url.searchParams.get('page') ?? '1')
+    const cursor = url.searchParams.get('cursor')
     const limit = Number(url.searchParams.get('limit') ?? '10')
     const role = url.searchParams.get('role') ?? 'all'
     const search = url.searchParams.get('search') ?? ''
-    let filtered = adminUsers
+    let filtered = [...adminUsers].sort((a, b) => a.id.localeCompare(b.id))
     if (role !== 'all') filtered = filtered.filter((u) => u.role === role)
     if (search) filtered = filtered.filter((u) => u.email.includes(search) || (u.name ?? '').includes(search))
-    const start = (page - 1) * limit
-    const slice = filtered.slice(start, start + limit)
+    const [direction, anchor] = cursor ? cursor.split(':') : ['after', '']
+    let slice: typeof filtered
+    let hasMore: boolean
+    if (direction === 'after') {
+      const rest = filtered.filter((u) => !anchor || u.id > anchor)
+      slice = rest.slice(0, limit)
+      hasMore = rest.length > limit
+    } else {
+      const rest = filtered.filter((u) => u.id < anchor)
+      slice = rest.slice(-limit)
+      hasMore = rest.length > limit
+    }
+    const hasNext = direction === 'after' ? hasMore : true
+    const hasPrev = direction === 'after' ? !!anchor : hasMore
     // Add small delay to simulate loading
     await delay(50)
-    return HttpResponse.json({ users: slice, total: filtered.length })
+    return HttpResponse.json({
+      users: slice,
+      total: filtered.length,
+      next_cursor: slice.length && hasNext ? `after:${slice[slice.length - 1].id}` : null,
+      prev_cursor: slice.length && hasPrev ? `before:${slice[0].id}` : null,
+    })
   }),
   http.delete('*/admin/users/:id', async ({ params }) => {
     const id = params.id as string
@@ -13,6 +13,7 @@ export interface Goal {
   completed_at?: string; // ISO string from API
   created_at: string; // ISO string from API
   updated_at: string; // ISO string from API
+  version?: number; // Incremented by the server on every write
   days_remaining?: number; // To be calculated client-side
 }
 
@@ -5,6 +5,7 @@ export interface Task {
   title: string;
   status: 'completed' | 'incomplete';
   created_at: string; // ISO string
+  version?: number; // Incremented by the server on every write
 }
 
 export interface CreateTaskPayload {